@@ -5,29 +5,28 @@ Created on Sat Sep 27 15:55:27 2025
 
 @author: sachinkalahasti
 """
-import sqlite3
-import numpy as np
 import streamlit as stl
-import pandas as pd
-from datetime import datetime
-import cv2 
-from pyzbar.pyzbar import decode 
 import os
-from streamlit_drawable_canvas import st_canvas
-from PIL import Image
+import base64
 import io
-import tempfile
-
-# PDF + Email
-from fpdf import FPDF          # <- install package: fpdf2
-import ssl
-import certifi
-import smtplib
-from email.utils import formataddr
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
+import sqlite3
+import sys
+import time
+
+# The barcode scanner (cv2, pyzbar), the signature canvas and bulk.py are
+# imported by the pages that use them, so a cold start only loads what the
+# first page needs.
+import activeset
+import changefeed
+import datacache
+import kiosk
+import outbox
+import service
+import tracing
+from database import asset_history_cursor, page_cursor
+from signatures import encode_signature
+from receipts import confirmation_code
+from storage import get_storage
 
 logo_path = os.path.join(
     os.path.dirname(os.path.abspath(__file__)), 'static', 'logo.png'
@@ -46,339 +45,291 @@ stl.markdown(
     unsafe_allow_html=True
 )
 
+@stl.cache_resource
+def logo_html():
+    """The logo as an inline <img>: stl.image would load PIL and numpy and resize it every rerun."""
+    with open(logo_path, "rb") as f:
+        data = base64.b64encode(f.read()).decode()
+    return f'<img src="data:image/png;base64,{data}" width="200" alt="SLAC logo">'  # adjust width as needed
+
 with stl.sidebar:
-    stl.image(logo_path, width=200)  # adjust width as needed
+    stl.markdown(logo_html(), unsafe_allow_html=True)
     stl.markdown("---")  # optional separator line.
 
-# ---------------- Safe secrets helpers ----------------
-def _get_secret(key, default=None):
-    """Return a secret or default without crashing if secrets.toml is missing."""
+def show_cache_stats(before):
+    """Sidebar note on how much this rerun got from the read cache."""
+    rerun = datacache.stats_since(before)
+    total = datacache.cache_stats()
+    lookups = total["hits"] + total["misses"]
+    with stl.sidebar.expander("Cache"):
+        stl.caption(f"This rerun: {rerun['hits']} hits, {rerun['misses']} misses, "
+                    f"{rerun['saved'] * 1000:.1f} ms saved, {rerun['spent'] * 1000:.1f} ms querying")
+        if lookups:
+            stl.caption(f"Since start: {total['hits'] / lookups:.0%} hit rate, "
+                        f"{total['saved']:.2f} s saved")
+
+# ---------------- Cached reads ----------------
+# Reruns reuse these results until a write bumps the data version (see datacache.py)
+storage = get_storage()
+view_active_transactions = datacache.cached(storage.view_active_transactions)
+search_transactions = datacache.cached(storage.search_transactions)
+page_transactions = datacache.cached(storage.page_transactions)
+count_transactions = datacache.cached(storage.count_transactions)
+checkins_per_hour = datacache.cached(storage.checkins_per_hour)
+checkins_per_day = datacache.cached(storage.checkins_per_day)
+turnaround_by_issue = datacache.cached(storage.turnaround_by_issue)
+repeat_assets = datacache.cached(storage.repeat_assets)
+asset_history = datacache.cached(service.asset_history)
+
+# Ids and asset tags stay int64 (activeset.py); this shows them without digit
+# grouping.  Asset tags are shown as text: a tag may be 'SLAC-00123'.
+ID_COLUMN_CONFIG = {
+    **{name: stl.column_config.NumberColumn(format="%d")
+       for name in ("transaction_id", "employee_id", "Tx ID", "Employee ID")},
+    **{name: stl.column_config.TextColumn() for name in ("asset_tag", "Asset Tag")},
+}
+
+# ---------------- Barcode scanner ----------------
+def scan_asset_tags(source=0, on_tag=None):
+    """Continuous scanner window for a webcam index, video file or image folder.
+
+    Each new tag is printed and passed to `on_tag`; returns the tags seen.
+    """
+    found = []
+
+    def report(tag):
+        print(f"Detected: {tag}")
+        found.append(tag)
+        if on_tag is not None:
+            on_tag(tag)
+
+    from scanner import ScannerEngine
+    engine = ScannerEngine(source, on_tag=report, display=True)
     try:
-        return stl.secrets.get(key, default)
-    except Exception:
-        return default
-
-def _bool_secret(name, default=False):
-    v = _get_secret(name, default)
-    if isinstance(v, bool): return v
-    if isinstance(v, (int, float)): return bool(v)
-    if isinstance(v, str): return v.strip().lower() in ("1", "true", "yes", "on")
-    return bool(v)
-
-# ---------------- DB helpers ----------------
-def database_connection():
-    connect = sqlite3.connect('checkin_system.db')
-    return connect
-
-def tables():
-    connect = database_connection()
-    cursor = connect.cursor()
-    cursor.executescript("""
-        CREATE TABLE IF NOT EXISTS Employees (
-            employee_id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL,
-            email TEXT NOT NULL
-        );
-
-        CREATE TABLE IF NOT EXISTS Laptops (
-            asset_tag INTEGER NOT NULL,
-            model TEXT NOT NULL,
-            description TEXT NOT NULL
-        );
-
-        CREATE TABLE IF NOT EXISTS Transactions (
-            transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            employee_id INTEGER NOT NULL,
-            asset_tag INTEGER NOT NULL,
-            issue TEXT NOT NULL,
-            check_in_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-            check_out_time DATETIME,
-            status TEXT CHECK(status IN ('Checked-In', 'Checked-Out')) DEFAULT 'Checked-In',
-            FOREIGN KEY (employee_id) REFERENCES Employees(employee_id),
-            FOREIGN KEY (asset_tag) REFERENCES Laptops(asset_tag)
-        );
-    """)
-    connect.commit()
-    connect.close()
-
-def ensure_laptop_exists(asset_tag: str):
-    conn = database_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT OR IGNORE INTO Laptops (asset_tag, model, description) VALUES (?, '', '')",
-        (str(asset_tag),)
-    )
-    conn.commit()
-    conn.close()
-
-def ensure_employee_exists(employee_id: int, name: str = "", email: str = ""):
-    """Create a minimal employee row if it doesn't exist (name/email can be empty strings)."""
-    conn = database_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT OR IGNORE INTO Employees (employee_id, name, email) VALUES (?, ?, ?)",
-        (int(employee_id), name or "", email or "")
-    )
-    conn.commit()
-    conn.close()
-
-def upsert_employee(employee_id: int, name: str, email: str):
-    """Update name/email if provided; create row if missing."""
-    name = (name or "").strip()
-    email = (email or "").strip()
-    if not email:
-        return
-    conn = database_connection()
-    cur = conn.cursor()
-    cur.execute("UPDATE Employees SET name=?, email=? WHERE employee_id=?", (name, email, int(employee_id)))
-    if cur.rowcount == 0:
-        cur.execute("INSERT INTO Employees (employee_id, name, email) VALUES (?, ?, ?)", (int(employee_id), name, email))
-    conn.commit()
-    conn.close()    
-
-def check_in(employee_id, asset_tag, issue):
-    ensure_laptop_exists(asset_tag)
-    ensure_employee_exists(employee_id)  
-    connect = database_connection()
-    cur = connect.cursor()
-    cur.execute("""
-        INSERT INTO Transactions (employee_id, asset_tag, issue)
-        VALUES (?, ?, ?)
-    """, (int(employee_id), str(asset_tag), issue))
-    new_id = cur.lastrowid
-    connect.commit()
-    connect.close()
-    return new_id
-
-
-def check_out(transaction_id):
-    connect = database_connection()
-    now = datetime.now().isoformat(sep=" ", timespec="seconds")
-    connect.execute("""
-        UPDATE Transactions
-        SET check_out_time=?, status='Checked-Out'
-        WHERE transaction_id=? AND status='Checked-In'
-    """, (now, transaction_id))
-    connect.commit()
-    connect.close()
-
-
-def view_active_transactions():
-    connect = database_connection()
-    df = pd.read_sql("""
-        SELECT transaction_id, employee_id, asset_tag, issue, check_in_time
-        FROM Transactions
-        WHERE status='Checked-In'
-        ORDER BY check_in_time DESC
-    """, connect)
-    connect.close()
-    return df
-
-
-def view_completed_transactions():
-    connect = database_connection()
-    df = pd.read_sql("""
-        SELECT transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time
-        FROM Transactions
-        WHERE status='Checked-Out'
-        ORDER BY check_out_time DESC
-    """, connect)
-    connect.close()
-    return df
-
-def get_transaction_details(transaction_id):
-    conn = database_connection()
-    row = conn.execute("""
-        SELECT transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time, status
-        FROM Transactions WHERE transaction_id = ?
-    """, (int(transaction_id),)).fetchone()
-    conn.close()
-    return row
-
-def get_employee_meta(employee_id: int):
-    conn = database_connection()
-    row = conn.execute("SELECT name, email FROM Employees WHERE employee_id=?", (int(employee_id),)).fetchone()
-    conn.close()
-    if row:
-        return row[0], row[1]
-    return None, None
-
-def scan_asset_tags():
-    # Open the default camera (index 0)
-    # Use cv2.CAP_DSHOW on Windows if you experience issues
-    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW) 
-
-    if not cap.isOpened():
+        engine.start()
+    except OSError:
         print("Error: Could not open camera.")
-        return
+        return found
 
     print("Camera opened successfully. Point the camera at an asset tag.")
     print("Press 'q' or 'Esc' to exit.")
-
-    while True:
-        # Read a frame from the camera
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Failed to capture image.")
-            break
-
-        # Decode any barcodes/QR codes present in the frame
-        decoded_objects = decode(frame)
-
-        # Process detected objects
-        for obj in decoded_objects:
-            # Print the decoded data and type
-            print(f"Detected Type: {obj.type}, Data: {obj.data.decode('utf-8')}")
-            
-            # Optionally draw a rectangle around the detected code
-            points = obj.polygon
-            if points:
-                # If the points are not a list of lists, convert to numpy array for cv2.polylines
-                if len(points) > 4: 
-                    hull = cv2.convexHull(np.array([point for point in points], dtype=np.int32))
-                    cv2.polylines(frame, [hull], True, (0, 255, 0), 2)
-                else:
-                    for i in range(len(points)):
-                        cv2.line(frame, points[i], points[(i+1) % len(points)], (0, 255, 0), 2)
-
-            # Put the data text near the barcode
-            cv2.putText(frame, obj.data.decode('utf-8'), (obj.rect.left, obj.rect.top - 10), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-
-        # Display the frame
-        cv2.imshow("Asset Tag Scanner", frame)
-
-        # Break the loop when 'q' or 'Esc' key is pressed
-        key = cv2.waitKey(1)
-        if key & 0xFF == ord('q') or key == 27:
-            break
-
-    # Release the camera and close all windows
-    cap.release()
-    cv2.destroyAllWindows()
-
-# ---------------- Email & PDF ----------------
-def confirmation_code(tx_id: int) -> str:
-    return f"CN-{tx_id:06d}"
-
-def parse_issue_type(issue_text: str) -> str:
-    return (issue_text.split(":", 1)[0] or "Issue").strip()
-
-def create_pdf_receipt(tx_tuple, emp_name, emp_email, kind="Check-In"):
-    tx_id, employee_id, asset_tag, issue, check_in, check_out, _ = tx_tuple
-    cn = confirmation_code(tx_id)
-
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=14)
-    pdf.cell(190, 10, txt=f"SLAC Service Desk - {kind} Receipt", ln=True, align='C')
-    pdf.set_font("Arial", size=11)
-    pdf.ln(6)
-    pdf.cell(190, 8, txt=f"Confirmation Number: {cn}", ln=True)
-    pdf.cell(190, 8, txt=f"Transaction ID: {tx_id}", ln=True)
-    pdf.cell(190, 8, txt=f"Employee: {emp_name or ''} (ID: {employee_id})", ln=True)
-    pdf.cell(190, 8, txt=f"Employee Email: {emp_email or '—'}", ln=True)
-    pdf.cell(190, 8, txt=f"Asset Tag: {asset_tag}", ln=True)
-    pdf.cell(190, 8, txt=f"Issue Type: {parse_issue_type(issue)}", ln=True)
-    pdf.multi_cell(190, 8, txt=f"Issue Details: {issue}", align='L')
-    pdf.cell(190, 8, txt=f"Check-In Time: {check_in}", ln=True)
-    if kind == "Check-Out" and check_out:
-        pdf.cell(190, 8, txt=f"Check-Out Time: {check_out}", ln=True)
-
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=f"_tx{tx_id}.pdf")
-    tmp.close()
-    pdf.output(tmp.name)
-    return tmp.name, cn
-
-def send_email_with_attachment_smtp(to_addr, subject, html_body, attachment_path):
-    host        = _get_secret("SMTP_HOST")
-    port        = int(_get_secret("SMTP_PORT", 587))
-    use_tls     = _bool_secret("SMTP_USE_TLS", True)
-    username    = _get_secret("SMTP_USERNAME")
-    password    = _get_secret("SMTP_PASSWORD")
-    sender_addr = _get_secret("SMTP_FROM", username or "no-reply@example.com")
-
-    if not host:
-        stl.warning("SMTP not configured (missing SMTP_HOST). Skipping email send.")
-        return False
-
-    msg = MIMEMultipart()
-    msg["From"] = formataddr(("Service Desk General Inbox", sender_addr))
-    msg["To"] = to_addr
-    msg["Subject"] = subject
-
-    cc_list = _get_secret("CC_RECIPIENTS", [])
-    if cc_list:
-        msg["Cc"] = ", ".join(cc_list)
-    recipients = [to_addr] + cc_list
-
-    msg.attach(MIMEText(html_body, "html"))
-
-    with open(attachment_path, "rb") as f:
-        part = MIMEBase("application", "pdf")
-        part.set_payload(f.read())
-    encoders.encode_base64(part)
-    part.add_header("Content-Disposition", f'attachment; filename="{os.path.basename(attachment_path)}"')
-    msg.attach(part)
-
+    engine.run_display()
+    return found
+
+@stl.fragment(run_every=1.0)
+def poll_scanner(engine):
+    """Copy a newly scanned tag into the Check-In form."""
+    tag = engine.poll()
+    if tag and tag != stl.session_state.scanned_asset_tag:
+        stl.session_state.scanned_asset_tag = tag
+        stl.session_state.asset_tag_input_key += 1
+        stl.rerun(scope="app")
+    if engine.running():
+        stl.caption("Scanner running. Hold the asset tag up to the camera.")
+    else:
+        stl.warning(f"Scanner stopped: {engine.error or 'end of video'}. Toggle it off and on to restart.")
+
+def stop_kiosk_scanner():
+    """Stop the kiosk scanner if this process ever started one (without importing cv2 otherwise)."""
+    scanner = sys.modules.get("scanner")
+    if scanner is not None:
+        scanner.stop_scanner()
+
+# ---------------- Assets ----------------
+def show_asset_status(asset_tag):
+    """Where the asset is now, from AssetState; a warning if it is still checked in.
+
+    One primary-key read, deliberately not cached, so a check-in made at
+    another desk shows up at once.
+    """
     try:
-        # Use certifi CA bundle for TLS so macOS trust works reliably
-        tls_ctx = ssl.create_default_context(cafile=certifi.where())
-
-        server = smtplib.SMTP(host, port, timeout=20)
-        if use_tls:
-            server.starttls(context=tls_ctx)
-        if username and password:
-            server.login(username, password)
-        server.sendmail(sender_addr, recipients, msg.as_string())
-        server.quit()
-        return True
+        status = service.asset_status(asset_tag)
     except Exception as e:
-        stl.warning(f"SMTP send failed: {e}")
-        return False
-
-def build_email_html(emp_name, employee_id, asset_tag, issue, check_in, check_out, cn, kind):
-    return f"""
-    <p>Hi {emp_name or 'there'},</p>
-    <p>This is a confirmation that your device was <b>{kind.lower()}</b> at the Service Desk.</p>
-    <table cellspacing="0" cellpadding="4" border="0">
-      <tr><td><b>Employee</b></td><td>{emp_name or ''} (ID: {employee_id})</td></tr>
-      <tr><td><b>Asset Tag</b></td><td>{asset_tag}</td></tr>
-      <tr><td><b>Issue Type</b></td><td>{parse_issue_type(issue)}</td></tr>
-      <tr><td><b>Check-In Time</b></td><td>{check_in}</td></tr>
-      {f'<tr><td><b>Check-Out Time</b></td><td>{check_out}</td></tr>' if (kind=='Check-Out' and check_out) else ''}
-      <tr><td><b>Confirmation #</b></td><td>{cn}</td></tr>
-    </table>
-    <p>The PDF receipt is attached for your records.</p>
-    <p>— Service Desk</p>
+        if not kiosk_offline(e):
+            raise
+        stl.caption("Asset status is unavailable while the service desk database is unreachable.")
+        return
+    if status is None:
+        stl.caption(f"Asset {asset_tag} has not been checked in before.")
+        return
+    holder = f"Employee {status.employee_id}" + (f" ({status.name})" if status.name else "")
+    if status.status == "Checked-In":
+        stl.warning(f"Asset {status.asset_tag} is still checked in: Tx#{status.transaction_id}, {holder}, "
+                    f"since {status.last_seen}. Check it out before checking it in again.")
+    else:
+        stl.caption(f"Asset {status.asset_tag} was last checked out {status.last_seen} "
+                    f"(Tx#{status.transaction_id}, {holder}).")
+
+# ---------------- Kiosk ----------------
+# With SLAC_KIOSK_JOURNAL set, check-ins and check-outs go through the local
+# journal (kiosk.py).  A submit waits this long for its sync, so a connected
+# kiosk still shows the transaction number and receipt status.
+KIOSK_CONFIRM_WAIT = 1.0
+
+def kiosk_offline(error):
+    """Whether a failed read is a kiosk losing the store, which its pages can work around."""
+    return kiosk.enabled() and kiosk.unreachable(error)
+
+def show_kiosk_status():
+    """Sidebar panel of the kiosk journal: connection, entries waiting to sync and conflicts."""
+    status = kiosk.sync_status()
+    with stl.sidebar.expander("Kiosk sync", expanded=bool(status.pending or status.conflicts)):
+        state = {True: "Connected", False: "Service desk unreachable", None: "Nothing synced yet"}[status.online]
+        oldest = f", the oldest from {time.strftime('%H:%M', time.localtime(status.oldest))}" if status.oldest else ""
+        stl.caption(f"{state}. {status.pending} waiting to sync{oldest}.")
+        if status.last_error:
+            stl.caption(f"Last error: {status.last_error}")
+        if status.synced:
+            stl.caption(f"Synced {status.synced} since start, {status.synced / status.seconds:,.0f} per second.")
+        conflicts = kiosk.get_journal().conflicts()
+        if conflicts:
+            stl.caption("Not applied by the service desk; please resolve at the desk:")
+            stl.dataframe([{
+                "At": time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.recorded_at)),
+                "Kind": "Check-In" if entry.kind == "check_in" else "Check-Out",
+                "Employee ID": entry.employee_id,
+                "Asset Tag": entry.asset_tag,
+                "Tx ID": entry.transaction_id,
+                "Reason": entry.message,
+            } for entry in conflicts], hide_index=True, column_config=ID_COLUMN_CONFIG)
+
+def show_pending(pending, what):
+    """Confirmation of a submit that is saved on the kiosk but not synced yet."""
+    stl.success(what)
+    stl.info(pending.message)
+    stl.markdown(f"**Kiosk reference:** `{', '.join(key[:8] for key in pending.keys)}`")
+
+def show_offline_check_out():
+    """Check-Out while the store is unreachable: this kiosk's own check-ins, or a number from a receipt."""
+    stl.warning("The service desk database is unreachable. Devices checked in on this kiosk are listed; "
+                "for any other, enter the transaction number from its check-in receipt.")
+    search = stl.text_input("Search this kiosk's check-ins, or enter a transaction number", key="offline_search")
+    devices = kiosk.offline_devices(search)
+    if not devices:
+        stl.info("No devices checked in on this kiosk match.")
+        return
+    chosen = stl.multiselect("Select the device(s) to Check-Out", range(len(devices)),
+                             format_func=lambda i: devices[i].label, placeholder="Select devices from the list...")
+    if not chosen:
+        return
+    from streamlit_drawable_canvas import st_canvas
+    stl.markdown("### Please sign below to confirm the check-out:")
+    canvas_result = st_canvas(fill_color="white", stroke_width=2, stroke_color="black", background_color="white",
+                              width=400, height=150, drawing_mode="freedraw", key="signature_canvas")
+    if stl.button("Confirm Check-Out"):
+        signature = encode_signature(canvas_result.json_data, canvas_result.image_data)
+        if signature is None:
+            stl.warning("Please provide your signature before confirming check-out.")
+            return
+        selected = [devices[i] for i in chosen]
+        try:
+            pending = kiosk.check_out_many([d.transaction_id for d in selected if not d.ref], signature,
+                                           refs=[d.ref for d in selected if d.ref])
+        except ValueError as e:
+            stl.error(str(e))
+            return
+        show_pending(pending, f"{len(pending.keys)} device(s) checked out on this kiosk.")
+
+# ---------------- Receipts ----------------
+def show_receipt_status(receipt):
+    """Tell the user whether the receipt email was queued (see service.queue_receipt)."""
+    if receipt.queued:
+        stl.info(receipt.message)
+    else:
+        stl.warning(receipt.message)
+
+# ---------------- Dashboard ----------------
+LIVE_REFRESH_SECONDS = 2.0
+
+def active_transactions(search_query):
+    """Checked-in devices for the Dashboard, from the change feed when there is no search.
+
+    The feed follower is shared by every session and applies only the
+    changes since its last refresh (changefeed.py), so it also sees check-ins
+    made by the API or another process.  PostgreSQL has no feed and re-queries.
     """
-
-def email_receipt(tx_tuple, kind="Check-In"):
-    tx_id, employee_id, asset_tag, issue, check_in, check_out, _ = tx_tuple
-    emp_name, emp_email = get_employee_meta(employee_id)
-    if not emp_email:
-        stl.warning(f"No email on file for employee {employee_id}. Skipping {kind} email.")
-        return False
-    pdf_path, cn = create_pdf_receipt(tx_tuple, emp_name, emp_email, kind)
-    try:
-        subject = "From the Service Desk General Inbox"
-        html = build_email_html(emp_name, employee_id, asset_tag, issue, check_in, check_out, cn, kind)
-        ok = send_email_with_attachment_smtp(emp_email, subject, html, pdf_path)
-        if ok:
-            stl.info(f"{kind} confirmation emailed to {emp_email}.")
-        return ok
-    finally:
-        try: os.remove(pdf_path)
-        except Exception: pass
+    if search_query:
+        return search_transactions(search_query, "Checked-In", columns=("employee_id", "asset_tag"), limit=None)
+    if storage.name == "sqlite":
+        return changefeed.active_follower().refresh()
+    return view_active_transactions()
+
+def show_active_transactions(search_query):
+    """Count and table of the active transactions; a fragment, rerun on its own when Live is on."""
+    active_df = activeset.active_frame(active_transactions(search_query))
+    stl.metric("Active Items at Service Desk", len(active_df))
+    stl.subheader("Active Transactions")
+    if active_df.empty:
+        stl.info("No active check-ins match your search.")
+    else:
+        stl.dataframe(active_df.rename(columns={
+            'transaction_id': 'Tx ID',
+            'employee_id': 'Employee ID',
+            'asset_tag': 'Asset Tag',
+            'issue': 'Issue Description',
+            'check_in_time': 'Check-In Time'
+        }), use_container_width=True, column_config=ID_COLUMN_CONFIG)
 
 # ---------------- App UI ----------------
+@stl.cache_resource
+def start_backend():
+    """Schema setup and the receipt worker, once per process rather than per rerun."""
+    if os.environ.get("SLAC_METRICS_PORT"):
+        tracing.serve_metrics(int(os.environ["SLAC_METRICS_PORT"]))
+    if kiosk.enabled():
+        kiosk.start_sync()
+    return service.start_backend()
+
+def show_admin():
+    """Hidden page (?admin=1): the slowest recent operations and the raw span data."""
+    stl.subheader("Slowest Recent Operations")
+    stl.toggle("Record timing spans", value=tracing.enabled(), key="tracing_on",
+               on_change=lambda: tracing.enable(stl.session_state.tracing_on))
+    sources = {"Everything": None, "Pages": "page.", "API requests": "api.",
+               "Scanner": "scan.", "Receipt emails": "receipt."}
+    source = stl.selectbox("Spans from", list(sources))
+    slowest = tracing.slowest(50, root=sources[source])
+    if not slowest:
+        stl.info("No spans recorded yet." if tracing.enabled() else "Tracing is off.")
+    else:
+        stl.dataframe([
+            {"operation": row["name"], "ms": row["ms"], "within": row["root"],
+             "at": time.strftime("%H:%M:%S", time.localtime(row["started_at"])),
+             "error": row["error"] or "", "details": ", ".join(f"{k}={v}" for k, v in row["attrs"].items())}
+            for row in slowest
+        ], hide_index=True, use_container_width=True)
+
+    stl.subheader("Totals by Operation")
+    stl.dataframe(tracing.summary(), hide_index=True, use_container_width=True)
+
+    last_page = next((tree for tree in tracing.recent() if tree["name"].startswith("page.")), None)
+    if last_page is not None:
+        with stl.expander(f"Last rerun: {last_page['name']} ({last_page['ms']:.1f} ms)"):
+            stl.json(last_page)
+    with stl.expander("Prometheus metrics"):
+        stl.code(tracing.prometheus_text(), language="text")
+    stl.button("Clear recorded spans", on_click=tracing.reset)
+
+@tracing.traced("page")
 def system():
-    tables()
+    cache_before = datacache.cache_stats()
+    try:
+        start_backend()
+    except Exception as e:
+        if not kiosk_offline(e):
+            raise
+        # Not cached, so the next rerun tries again
+        stl.warning("The service desk database is unreachable. This kiosk saves check-ins and "
+                    "check-outs and sends them once it is back.")
     stl.title("SLAC Service Desk System")
+    if kiosk.enabled():
+        show_kiosk_status()
 
     menu = ["Check-In", "Check-Out", "Dashboard"]
-    choice = stl.sidebar.selectbox("Menu", menu)
+    if stl.query_params.get("admin") == "1":
+        menu.append("Admin")
+    choice = stl.sidebar.selectbox("Menu", menu, key="menu")
+    tracing.annotate("page." + choice)
 
     if choice == "Check-In":
         stl.subheader("Laptop Check-In")
@@ -399,15 +350,12 @@ def system():
         picture = stl.camera_input("Take a picture of the asset tag")
         
         if picture:
+            from scanner import decode_asset_tag
             bytes_data = picture.getvalue()
-            img = cv2.imdecode(np.frombuffer(bytes_data, np.uint8), cv2.IMREAD_COLOR)
-            decoded = decode(img)
+            # staged grayscale decode; cached, so reruns with the same photo are free
+            value = decode_asset_tag(bytes_data).value
 
             found_new_tag = False
-            value = None
-
-            if decoded:
-                value = decoded[0].data.decode('utf-8')
 
             if value != stl.session_state.scanned_asset_tag:
                 stl.session_state.scanned_asset_tag = value
@@ -416,9 +364,24 @@ def system():
                 found_new_tag = True
                 stl.rerun() 
             
-            if not found_new_tag and not decoded:
+            if not found_new_tag and value is None:
                 stl.warning("No barcode detected. Try again.")
 
+        # Kiosk mode: a camera attached to the machine running the app scans continuously
+        if stl.toggle("Continuous scanner (kiosk camera)", key="kiosk_scanner"):
+            from scanner import start_scanner
+            try:
+                engine = start_scanner(os.environ.get("SLAC_SCANNER_SOURCE", "0"))
+            except OSError as e:
+                stl.error(str(e))
+            else:
+                poll_scanner(engine)
+        else:
+            stop_kiosk_scanner()
+
+        if asset_tag:
+            show_asset_status(asset_tag)
+
         issue_type = stl.selectbox(
             "Issue Type",
             ["Hardware Failure", "Software Request", "Performance Issue", "Account Lockout", "Other"]
@@ -426,6 +389,7 @@ def system():
         issue_details = stl.text_area("Provide more details about the issue")
         full_issue_description = f"{issue_type}: {issue_details}"
 
+        from streamlit_drawable_canvas import st_canvas
         stl.write("Please provide your digital signature below:")
         canvas_result = st_canvas(
             fill_color="rgba(255, 255, 255, 0)",
@@ -438,19 +402,6 @@ def system():
             key="signature_canvas",
         )
 
-        signature_data = None
-        if canvas_result is not None and canvas_result.image_data is not None:
-            arr = canvas_result.image_data
-            if arr.max() <= 1.0:
-                arr = (arr * 255.0)
-            rgb = arr[:, :, :3].astype("uint8")
-
-            if (rgb != 255).any():
-                img = Image.fromarray(rgb)
-                buf = io.BytesIO()
-                img.save(buf, format="PNG")
-                signature_data = buf.getvalue()
-
         if stl.button("Confirm Check-In"):
             if not (employee_id and asset_tag and issue_details):
                 stl.error("Employee ID, Asset Tag, and Issue Details are required.")
@@ -465,25 +416,26 @@ def system():
                 stl.error("Signature is required. Please sign in the box above.")
                 stl.stop()
                 
-            ensure_employee_exists(emp_id_int, employee_name or "", employee_email or "")
-            ensure_laptop_exists(asset_tag)
-
-            new_tx_id = check_in(emp_id_int, asset_tag, full_issue_description)
-
-            os.makedirs("signatures", exist_ok=True)
-            file_path = f"signatures/signature_{employee_id}_{asset_tag}.png"
-            with open(file_path, "wb") as f:
-                f.write(signature_data)
-
-            details = get_transaction_details(new_tx_id)
-
-            # Update name/email if provided (optional)
-            if employee_email:
-                upsert_employee(emp_id_int, employee_name, employee_email)
+            # Pen strokes only; the image is drawn when a receipt needs it
+            signature = encode_signature(canvas_result.json_data, canvas_result.image_data)
+            try:
+                if kiosk.enabled():
+                    outcome = kiosk.check_in(emp_id_int, asset_tag, full_issue_description,
+                                             employee_name, employee_email, signature, wait=KIOSK_CONFIRM_WAIT)
+                else:
+                    # Same path as the HTTP API: transaction, signature, then the queued receipt
+                    outcome = service.check_in(emp_id_int, asset_tag, full_issue_description,
+                                               employee_name, employee_email, signature)
+            except ValueError as e:
+                stl.error(str(e))
+                stl.stop()
+            if isinstance(outcome, kiosk.Pending):
+                show_pending(outcome, f"Laptop {asset_tag} checked in for Employee {emp_id_int}")
+                stl.stop()
+            details = outcome.transaction
 
             # Email + PDF
-            if details:
-                email_receipt(details, "Check-In")
+            show_receipt_status(outcome.receipt)
     
             # On-screen receipt
             stl.success(f"Laptop {asset_tag} checked in for Employee {emp_id_int}")
@@ -500,50 +452,44 @@ def system():
 
     elif choice == "Check-Out":
         stl.subheader("Laptop Check-Out")
-        active = view_active_transactions()
-        
-        if active.empty:
+        try:
+            active_count = count_transactions("Checked-In")
+        except Exception as e:
+            if not kiosk_offline(e):
+                raise
+            active_count = None
+
+        if active_count is None:
+            show_offline_check_out()
+        elif active_count == 0:
             stl.info("No laptops currently checked in.")
         else:
             search = stl.text_input(
-                "Search for a device (by Asset Tag, Employee ID, or Issue)",
+                "Search for a device (by Asset Tag, Employee ID, Name, or Issue)",
                 placeholder="Type here and press Enter..."
             )
 
-            filtered = active
+            filtered = None
             if search:
-                filtered = active[
-                    active.apply(
-                        lambda row: search.lower() in str(row["transaction_id"]).lower()
-                        or search.lower() in str(row["asset_tag"]).lower()
-                        or search.lower() in str(row["employee_id"]).lower()
-                        or search.lower() in str(row["issue"]).lower()
-                        or search.lower() in str(row["check_in_time"]).lower(),
-                        axis=1
-                    )
-                ]
+                filtered = search_transactions(search, "Checked-In")
 
             if search and filtered.empty:
                 stl.warning("No matching devices found.")
             elif search:
+                devices = activeset.active_frame(filtered)
                 stl.write("### Matching Devices")
-                stl.dataframe(filtered, use_container_width=True)
-
-                filtered["label"] = filtered.apply(
-                    lambda r: f"Tx#{r['transaction_id']} - {r['asset_tag']} (Employee {r['employee_id']})",
-                    axis=1
-                )
-
-                selected = stl.selectbox(
-                    "Select the device to Check-Out",
-                    filtered["label"].tolist(),
-                    index=None,
-                    placeholder="Select a device from the list..."
+                stl.dataframe(devices, use_container_width=True, column_config=ID_COLUMN_CONFIG)
+
+                labels = activeset.device_labels(devices)
+                tx_ids = stl.multiselect(
+                    "Select the device(s) to Check-Out",
+                    list(labels),
+                    format_func=labels.__getitem__,
+                    placeholder="Select devices from the list..."
                 )
 
-                if selected:
-                    tx_id = filtered.loc[filtered["label"] == selected, "transaction_id"].values[0]
-
+                if tx_ids:
+                    from streamlit_drawable_canvas import st_canvas
                     stl.markdown("### Please sign below to confirm the check-out:")
                     canvas_result = st_canvas(
                        fill_color="white",
@@ -558,67 +504,123 @@ def system():
 
                     if stl.button("Confirm Check-Out"):
                        if canvas_result.json_data and any(obj.get("path") for obj in canvas_result.json_data.get("objects", [])):
-                           check_out(int(tx_id))
-                           details = get_transaction_details(int(tx_id))
-
-                           if details:
-                                email_receipt(details, "Check-Out")
-
-                           stl.success(f"Transaction {tx_id} checked out successfully.")
+                           signature = encode_signature(canvas_result.json_data, canvas_result.image_data)
+                           try:
+                               # One statement and one signature for every selected device,
+                               # one receipt email per employee
+                               if kiosk.enabled():
+                                   outcome = kiosk.check_out_many(tx_ids, signature, wait=KIOSK_CONFIRM_WAIT)
+                               else:
+                                   outcome = service.check_out_many(tx_ids, signature)
+                           except (LookupError, ValueError) as e:
+                               stl.error(str(e))
+                               stl.stop()
+                           if isinstance(outcome, kiosk.Pending):
+                               show_pending(outcome, f"{len(outcome.keys)} device(s) checked out on this kiosk.")
+                               stl.stop()
+                           closed = outcome.transactions
+
+                           for receipt in outcome.receipts:
+                               show_receipt_status(receipt)
+                           if outcome.skipped:
+                               stl.warning("Already checked out, skipped: "
+                                           + ", ".join(str(tx) for tx in outcome.skipped))
+
+                           if len(closed) == 1:
+                               stl.success(f"Transaction {closed[0].transaction_id} checked out successfully.")
+                           else:
+                               stl.success(f"{len(closed)} transactions checked out successfully.")
                            stl.balloons()
 
                            stl.markdown("---")
                            stl.subheader("Check-Out Confirmation Receipt")
-                           
-                           if details:
+
+                           if len(closed) == 1:
+                                details = closed[0]
                                 stl.markdown(f"**Confirmation #:** `{confirmation_code(details[0])}`")
                                 stl.markdown(f"**Transaction ID:** `{details[0]}`")
                                 stl.markdown(f"**Employee ID:** `{details[1]}`")
                                 stl.markdown(f"**Asset Tag:** `{details[2]}`")
                                 stl.markdown(f"**Check-In Time:** {details[4]}")
                                 stl.markdown(f"**Check-Out Time:** {details[5]}")
+                           else:
+                                stl.dataframe([{
+                                    "Confirmation #": confirmation_code(t.transaction_id),
+                                    "Tx ID": t.transaction_id,
+                                    "Employee ID": t.employee_id,
+                                    "Asset Tag": t.asset_tag,
+                                    "Check-In Time": t.check_in_time,
+                                    "Check-Out Time": t.check_out_time,
+                                } for t in closed], use_container_width=True, hide_index=True,
+                                    column_config=ID_COLUMN_CONFIG)
                     else:
                         stl.warning("Please provide your signature before confirming check-out.")
             
     elif choice == "Dashboard":
-        active_df = view_active_transactions()
-        completed_df = view_completed_transactions()
+        s1, s2 = stl.columns([4, 1])
+        search_query = s1.text_input("Search Active Check-Ins by Employee ID or Asset Tag")
+        live = s2.toggle("Live", key="dashboard_live",
+                         help=f"Update the active transactions every {LIVE_REFRESH_SECONDS:g} seconds")
+        stl.fragment(show_active_transactions, run_every=LIVE_REFRESH_SECONDS if live else None)(search_query)
+        stl.markdown("---")
 
-        search_query = stl.text_input("Search Active Check-Ins by Employee ID or Asset Tag")
-        active_df['employee_id'] = active_df['employee_id'].astype(str)
-        active_df['asset_tag'] = active_df['asset_tag'].astype(str)
-        
-        if not active_df.empty:
-            active_df = active_df.copy()
-            active_df['employee_id'] = active_df['employee_id'].astype(str)
-            active_df['asset_tag'] = active_df['asset_tag'].astype(str)
-
-            if search_query:
-                active_df = active_df[
-                    active_df['employee_id'].str.contains(search_query, case=False, na=False) |
-                    active_df['asset_tag'].str.contains(search_query, case=False, na=False)
-                ]
-
-        stl.metric("Active Items at Service Desk", len(active_df))
+        # Summary tables kept by triggers: constant cost however long the history
+        stl.subheader("Service Desk Analytics")
+        per_hour = checkins_per_hour(24)
+        per_day = checkins_per_day(30)
+        m1, m2, m3 = stl.columns(3)
+        m1.metric("Checked in now", count_transactions("Checked-In"))
+        m2.metric("Check-ins (last 24h)", int(per_hour["checkins"].sum()))
+        m3.metric("Check-ins (last 7 days)", int(per_day["checkins"].tail(7).sum()))
+        c1, c2 = stl.columns(2)
+        c1.caption("Check-ins per hour (UTC)")
+        c1.bar_chart(per_hour.set_index("hour"))
+        c2.caption("Check-ins per day")
+        c2.bar_chart(per_day.set_index("day"))
+
+        t1, t2 = stl.columns([3, 2])
+        t1.caption("Turnaround by issue type (hours)")
+        t1.dataframe(turnaround_by_issue().rename(columns={
+            'issue_type': 'Issue Type',
+            'completed': 'Completed',
+            'mean_hours': 'Mean',
+            'p90_hours': 'p90'
+        }).round(1), use_container_width=True, hide_index=True)
+        repeats = repeat_assets(10)
+        repeats['asset_tag'] = repeats['asset_tag'].astype(str)
+        t2.caption("Most frequent assets")
+        t2.dataframe(repeats.rename(columns={
+            'asset_tag': 'Asset Tag',
+            'visits': 'Visits',
+            'last_check_in': 'Last Check-In'
+        }), use_container_width=True, hide_index=True)
         stl.markdown("---")
-        
-        stl.subheader("Active Transactions")
-        if active_df.empty:
-            stl.info("No active check-ins match your search.")
-        else:
-            active_df.rename(columns={
-                'transaction_id': 'Tx ID',
-                'employee_id': 'Employee ID',
-                'asset_tag': 'Asset Tag',
-                'issue': 'Issue Description',
-                'check_in_time': 'Check-In Time'
-            }, inplace=True)
-            stl.dataframe(active_df, use_container_width=True)
 
-        stl.subheader("Completed Transactions")
+        stl.subheader("Transaction History")
+        f1, f2, f3 = stl.columns([1, 2, 1])
+        history_status = f1.selectbox("Status", ["Checked-Out", "Checked-In"], key="history_status")
+        history_dates = f2.date_input("Date range", value=(), key="history_dates")
+        page_size = f3.selectbox("Rows per page", [25, 50, 100, 250], index=1, key="history_page_size")
+        start_date = history_dates[0] if len(history_dates) > 0 else None
+        end_date = history_dates[1] if len(history_dates) > 1 else None
+
+        # Keyset cursors of the pages visited so far; reset when a filter changes
+        history_filters = (history_status, start_date, end_date, page_size)
+        if stl.session_state.get("history_filters") != history_filters:
+            stl.session_state.history_filters = history_filters
+            stl.session_state.history_cursors = [None]
+        cursors = stl.session_state.history_cursors
+        first_row = (len(cursors) - 1) * page_size
+
+        completed_df = page_transactions(history_status, start_date, end_date, cursors[-1], page_size)
+        total = count_transactions(history_status, start_date, end_date)
+        next_cursor = page_cursor(completed_df, history_status)
+
         if completed_df.empty:
-            stl.info("No completed transactions yet.")
+            stl.info("No transactions match these filters.")
         else:
+            if history_status != "Checked-Out":
+                completed_df = completed_df.drop(columns=["check_out_time"])
             completed_df.rename(columns={
                 'transaction_id': 'Tx ID',
                 'employee_id': 'Employee ID',
@@ -632,7 +634,98 @@ def system():
             completed_df["Employee ID"] = completed_df["Employee ID"].astype(str)
             completed_df["Asset Tag"] = completed_df["Asset Tag"].astype(str)
             stl.dataframe(completed_df, use_container_width=True)
+            stl.caption(f"Rows {first_row + 1}-{first_row + len(completed_df)} of {total}")
+
+        def _prev_page():
+            stl.session_state.history_cursors.pop()
+
+        def _next_page(cursor):
+            stl.session_state.history_cursors.append(cursor)
+
+        p1, p2 = stl.columns(2)
+        p1.button("Previous page", on_click=_prev_page, disabled=len(cursors) == 1)
+        p2.button("Next page", on_click=_next_page, args=(next_cursor,),
+                  disabled=first_row + len(completed_df) >= total)
 
+        # bulk.py reads and writes the SQLite file directly
+        if storage.name == "sqlite":
+            import bulk
+
+            def _export_history():
+                buf = io.BytesIO()
+                bulk.export_file("transactions", buf, "csv", history_status, start_date, end_date)
+                return buf.getvalue()
+
+            # Runs only when clicked; large exports are better done with `python bulk.py export`
+            stl.download_button("Export filtered history (CSV)", data=_export_history,
+                                file_name=f"transactions_{history_status.lower()}.csv", mime="text/csv")
+
+            with stl.expander("Bulk import (HR roster, asset inventory, history)"):
+                import_table = stl.selectbox("Import into", ["employees", "laptops", "transactions"])
+                stl.caption("Columns: " + ", ".join(bulk.TABLES[import_table].columns)
+                            + ". Required: " + ", ".join(bulk.TABLES[import_table].required) + ".")
+                upload = stl.file_uploader("CSV or Parquet file", type=["csv", "parquet"], key="bulk_upload")
+                if upload is not None and stl.button("Import file"):
+                    try:
+                        with stl.spinner("Importing..."):
+                            result = bulk.import_file(import_table, upload, bulk.file_format(upload.name))
+                    except (ValueError, RuntimeError, sqlite3.Error) as e:
+                        stl.error(f"Import failed: {e}")
+                    else:
+                        stl.success(f"Imported {result.rows:,} rows in {result.seconds:.1f}s"
+                                    + (f"; skipped {result.skipped:,} incomplete or conflicting rows." if result.skipped else "."))
+        else:
+            stl.caption("Bulk import/export works on the SQLite database only.")
+
+        stl.subheader("Asset History")
+        lookup_tag = stl.text_input("Asset Tag", key="asset_lookup").strip()
+        if lookup_tag:
+            show_asset_status(lookup_tag)
+            if stl.session_state.get("asset_lookup_tag") != lookup_tag:
+                stl.session_state.asset_lookup_tag = lookup_tag
+                stl.session_state.asset_cursors = [None]
+            asset_cursors = stl.session_state.asset_cursors
+            asset_page = 25
+            # One row more than shown: it says whether an older page exists
+            asset_df = asset_history(lookup_tag, asset_cursors[-1], asset_page + 1)
+            has_older = len(asset_df) > asset_page
+            asset_df = asset_df.head(asset_page)
+            if not asset_df.empty:
+                stl.dataframe(asset_df.rename(columns={
+                    'transaction_id': 'Tx ID',
+                    'employee_id': 'Employee ID',
+                    'asset_tag': 'Asset Tag',
+                    'issue': 'Issue Description',
+                    'check_in_time': 'Check-In Time',
+                    'check_out_time': 'Check-Out Time',
+                    'status': 'Status'
+                }), use_container_width=True, hide_index=True, column_config=ID_COLUMN_CONFIG)
+
+            def _newer_asset_page():
+                stl.session_state.asset_cursors.pop()
+
+            def _older_asset_page(cursor):
+                stl.session_state.asset_cursors.append(cursor)
+
+            a1, a2 = stl.columns(2)
+            a1.button("Newer", on_click=_newer_asset_page, disabled=len(asset_cursors) == 1)
+            a2.button("Older", on_click=_older_asset_page, args=(asset_history_cursor(asset_df),),
+                      disabled=not has_older)
+
+        stl.subheader("Email Receipts")
+        email_stats = outbox.outbox_stats()
+        e1, e2, e3 = stl.columns(3)
+        e1.metric("Queued", email_stats["pending"])
+        e2.metric("Failed", email_stats["failed"])
+        latency = email_stats["latency_p50"]
+        e3.metric("Median send time (1h)", f"{latency:.1f}s" if latency is not None else "—")
+        if email_stats["failed"]:
+            stl.button("Retry failed receipts", on_click=outbox.retry_failed)
+
+    elif choice == "Admin":
+        show_admin()
+
+    show_cache_stats(cache_before)
 
 if __name__ == '__main__':
     system()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP/JSON API over service.py for kiosks and scanner stations.
+
+A plain ASGI app with async handlers; the blocking SQLite calls run on a
+thread pool the size of the connection pool, so one process serves many
+kiosks at once.  Several API processes and the Streamlit app can share the
+same database file (WAL, BEGIN IMMEDIATE and busy_timeout serialise the
+writes).
+
+    python api.py --port 8600 --workers 2          # needs uvicorn
+    uvicorn api:app --port 8600
+
+    GET  /health
+    POST /check-ins                   {"employee_id", "asset_tag", "issue", "name"?, "email"?, "signature"?}
+    POST /check-outs                  {"transaction_id", "signature"?}
+                                      or {"transaction_ids": [...], "signature"?}: one signature,
+                                      one receipt per employee
+    GET  /transactions/{id}
+    GET  /assets/{tag}?limit=20       where the asset is now (holder, status, last seen) and its latest transactions
+    POST /transactions/{id}/receipt   {"kind": "Check-In" | "Check-Out"}
+    GET  /active                      checked-in devices and the change feed cursor they are current to
+    GET  /changes?after={cursor}      Server-Sent Events: one per change after the cursor (changefeed.py)
+    GET  /metrics                     span latencies, Prometheus text format
+    GET  /traces                      slowest recent spans and per-operation totals
+
+"signature" is st_canvas json_data ({"objects": [...]}).  Errors come back
+as {"error": message} with 400 (bad input), 404, 409 (already checked out,
+or a check-in of an asset that is still checked in).
+
+A wall display loads GET /active once, then applies the /changes events
+on top: each "transaction" event carries the whole row, so applying one
+twice is harmless.  A "reset" event means events were skipped; reload
+GET /active.  Browsers' EventSource reconnects with Last-Event-ID, which
+is honoured like ?after=.  One reader per process polls the feed every
+FEED_POLL_SECONDS and fans the events out to every open stream.
+"""
+import argparse
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import changefeed
+import database
+import service
+import tracing
+from signatures import encode_signature
+from storage import get_storage
+
+log = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1 << 20        # a signed canvas is a few KB of JSON
+FEED_POLL_SECONDS = 0.25
+KEEPALIVE_SECONDS = 15          # comment line on an idle stream, so proxies keep it open
+
+_executor = ThreadPoolExecutor(max_workers=database.POOL_SIZE, thread_name_prefix="api")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+async def _blocking(fn, *args):
+    # Run in a copy of this request's context so spans on the pool thread nest under it
+    call = functools.partial(contextvars.copy_context().run, fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(_executor, call)
+
+def _transaction(transaction):
+    return transaction._asdict()
+
+def _outcome(outcome):
+    return {"transaction": _transaction(outcome.transaction), "receipt": outcome.receipt._asdict()}
+
+def _signature(body):
+    json_data = body.get("signature")
+    return encode_signature(json_data) if isinstance(json_data, dict) else None
+
+# ---------------- Handlers ----------------
+async def health(body):
+    return 200, {"status": "ok", "schema_version": await _blocking(get_storage().schema_version)}
+
+async def post_check_in(body):
+    outcome = await _blocking(
+        service.check_in, body.get("employee_id"), body.get("asset_tag"), body.get("issue"),
+        body.get("name", ""), body.get("email", ""), _signature(body),
+    )
+    return 201, _outcome(outcome)
+
+async def post_check_out(body):
+    if isinstance(body.get("transaction_ids"), list):
+        outcome = await _blocking(service.check_out_many, body["transaction_ids"], _signature(body))
+        return 200, {"transactions": [_transaction(t) for t in outcome.transactions],
+                     "receipts": [r._asdict() for r in outcome.receipts], "skipped": outcome.skipped}
+    if body.get("transaction_id") is None:
+        raise ValueError("transaction_id is required.")
+    return 200, _outcome(await _blocking(service.check_out, body["transaction_id"], _signature(body)))
+
+async def get_transaction(body, transaction_id):
+    transaction = await _blocking(service.get_transaction_details, int(transaction_id))
+    if transaction is None:
+        raise LookupError(f"Transaction {transaction_id} not found")
+    return 200, _transaction(transaction)
+
+async def get_asset(body, asset_tag):
+    status = await _blocking(service.asset_status, asset_tag)
+    if status is None:
+        raise LookupError(f"Asset {asset_tag} has no transactions")
+    history = await _blocking(service.asset_history, asset_tag, None, int(body.get("limit", 20)))
+    history = history.astype(object).where(history.notna(), None)
+    return 200, dict(status._asdict(), history=history.to_dict("records"))
+
+async def post_receipt(body, transaction_id):
+    receipt = await _blocking(service.email_receipt, int(transaction_id), body.get("kind", "Check-In"))
+    return 202 if receipt.queued else 200, receipt._asdict()
+
+def _feed_storage():
+    if get_storage().name != "sqlite":
+        raise HTTPError(501, "The change feed needs the SQLite storage")
+
+async def get_active(body):
+    _feed_storage()
+    cursor, frame = await _blocking(changefeed.snapshot)
+    return 200, {"cursor": cursor, "transactions": frame.to_dict("records")}
+
+async def get_changes(body):
+    _feed_storage()
+    after = body.get("last_event_id") or body.get("after")
+    try:
+        after = None if after in (None, "") else int(after)
+    except ValueError:
+        raise ValueError("after must be a change feed cursor (an integer).") from None
+    return 200, EventStream(after)
+
+async def metrics(body):
+    return 200, tracing.prometheus_text()
+
+async def traces(body):
+    return 200, {"slowest": tracing.slowest(50), "summary": tracing.summary()}
+
+ROUTES = [
+    ("GET", re.compile(r"/health"), health),
+    ("POST", re.compile(r"/check-ins"), post_check_in),
+    ("POST", re.compile(r"/check-outs"), post_check_out),
+    ("GET", re.compile(r"/transactions/(\d+)"), get_transaction),
+    ("POST", re.compile(r"/transactions/(\d+)/receipt"), post_receipt),
+    ("GET", re.compile(r"/assets/([^/]+)"), get_asset),
+    ("GET", re.compile(r"/active"), get_active),
+    ("GET", re.compile(r"/changes"), get_changes),
+    ("GET", re.compile(r"/metrics"), metrics),
+    ("GET", re.compile(r"/traces"), traces),
+]
+
+def route(method, path):
+    """(handler, path arguments) for a request; raises HTTPError 404/405."""
+    allowed = False
+    for route_method, pattern, handler in ROUTES:
+        match = pattern.fullmatch(path.rstrip("/") or "/")
+        if match:
+            if route_method == method:
+                return handler, match.groups()
+            allowed = True
+    raise HTTPError(405 if allowed else 404, "Method not allowed" if allowed else "Not found")
+
+# ---------------- Change stream ----------------
+class _FeedHub:
+    """The process's one change feed reader, shared by every open stream.
+
+    Polls only while a stream is open and keeps the last MAX_EVENTS events,
+    so streams that are up to date are served from memory.
+    """
+
+    def __init__(self):
+        self.cursor = None
+        self.recent = deque(maxlen=changefeed.MAX_EVENTS)
+        self.streams = 0
+        self.advanced = asyncio.Event()
+        self._task = None
+
+    async def open(self):
+        self.streams += 1
+        if self.cursor is None:
+            self.cursor = await _blocking(changefeed.latest_seq)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._poll())
+
+    def close(self):
+        self.streams -= 1
+
+    def events_after(self, cursor):
+        """Events after cursor from memory, or None if some are no longer (or not yet) held."""
+        if cursor >= self.cursor:
+            return []
+        if self.recent and self.recent[0].seq <= cursor + 1:
+            return [event for event in self.recent if event.seq > cursor]
+        return None
+
+    async def _poll(self):
+        while self.streams > 0:
+            await asyncio.sleep(FEED_POLL_SECONDS)
+            try:
+                changes = await _blocking(changefeed.read_changes, self.cursor)
+            except Exception:
+                log.exception("Reading the change feed failed")
+                continue
+            if changes.reset:
+                self.recent.clear()     # streams behind this point get a reset event
+            self.recent.extend(changes.events)
+            if changes.cursor != self.cursor:
+                self.cursor = changes.cursor
+                self.advanced.set()
+                self.advanced = asyncio.Event()
+
+
+_hub = _FeedHub()
+
+
+class EventStream:
+    """A text/event-stream response: change feed events after a cursor."""
+
+    def __init__(self, after):
+        self.after = after
+
+    @staticmethod
+    def _format(event):
+        data = json.dumps({"seq": event.seq, "entity": event.entity, "op": event.op,
+                           "key": event.key, "row": event.row, "at": event.at})
+        name = "reset" if event.op == "reset" else event.entity
+        return f"id: {event.seq}\nevent: {name}\ndata: {data}\n\n"
+
+    async def _catch_up(self, cursor):
+        """(text, new cursor) for a stream at `cursor`; reads the feed itself if the hub cannot serve it."""
+        events = _hub.events_after(cursor)
+        if events is None:
+            changes = await _blocking(changefeed.read_changes, cursor)
+            if changes.reset:
+                return f"id: {_hub.cursor}\nevent: reset\ndata: {{}}\n\n", _hub.cursor
+            events = [event for event in changes.events if event.seq <= _hub.cursor]
+        return "".join(map(self._format, events)), events[-1].seq if events else cursor
+
+    async def serve(self, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+        ]})
+        disconnected = asyncio.ensure_future(receive())      # http.disconnect is the only message left
+        await _hub.open()
+        try:
+            cursor = _hub.cursor if self.after is None else self.after
+            await send({"type": "http.response.body", "body": f"retry: 1000\nid: {cursor}\n\n".encode(),
+                        "more_body": True})
+            while not disconnected.done():
+                advanced = _hub.advanced
+                text, cursor = await self._catch_up(cursor)
+                if text:
+                    await send({"type": "http.response.body", "body": text.encode(), "more_body": True})
+                if cursor < _hub.cursor:
+                    continue                # more to send before waiting
+                waiter = asyncio.ensure_future(advanced.wait())
+                done, _ = await asyncio.wait({disconnected, waiter}, timeout=KEEPALIVE_SECONDS,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if not done:
+                    await send({"type": "http.response.body", "body": b": keepalive\n\n", "more_body": True})
+        finally:
+            _hub.close()
+            disconnected.cancel()
+
+# ---------------- ASGI ----------------
+def _query(scope):
+    """GET parameters, plus the EventSource reconnect header as last_event_id."""
+    params = dict(parse_qsl(scope.get("query_string", b"").decode()))
+    for name, value in scope.get("headers", ()):
+        if name == b"last-event-id":
+            params["last_event_id"] = value.decode()
+    return params
+
+async def _read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        size += len(chunks[-1])
+        if size > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        if not message.get("more_body"):
+            break
+    raw = b"".join(chunks)
+    if not raw:
+        return {}
+    try:
+        body = json.loads(raw)
+    except ValueError:
+        raise HTTPError(400, "Body must be JSON") from None
+    if not isinstance(body, dict):
+        raise HTTPError(400, "Body must be a JSON object")
+    return body
+
+async def _send_json(send, status, payload):
+    data = json.dumps(payload, default=str).encode()
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(data)).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": data})
+
+async def _send_text(send, status, text):
+    data = text.encode()
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"text/plain; version=0.0.4; charset=utf-8"),
+        (b"content-length", str(len(data)).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": data})
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await _blocking(service.start_backend)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    with tracing.span("api.request", method=scope["method"], path=scope["path"]) as request_span:
+        try:
+            handler, args = route(scope["method"], scope["path"])
+            request_span.annotate("api." + handler.__name__)
+            body = await _read_body(receive)
+            if scope["method"] == "GET":
+                body.update(_query(scope))
+            status, payload = await handler(body, *args)
+        except HTTPError as e:
+            status, payload = e.status, {"error": str(e)}
+        except LookupError as e:
+            status, payload = 404, {"error": str(e)}
+        except (service.AlreadyCheckedOut, database.AlreadyCheckedIn) as e:
+            status, payload = 409, {"error": str(e)}
+        except ValueError as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception:
+            log.exception("%s %s failed", scope["method"], scope["path"])
+            status, payload = 500, {"error": "Internal server error"}
+        request_span.annotate(status=status)
+    if isinstance(payload, EventStream):
+        await payload.serve(receive, send)
+    elif isinstance(payload, str):
+        await _send_text(send, status, payload)
+    else:
+        await _send_json(send, status, payload)
+
+# ---------------- CLI ----------------
+def main():
+    parser = argparse.ArgumentParser(description="Check-in HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=1, help="processes sharing the database")
+    parser.add_argument("--db", help="database file (default: SLAC_DB_PATH or checkin_system.db)")
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("Serving the API needs uvicorn: pip install uvicorn") from None
+    if args.db:
+        os.environ["SLAC_DB_PATH"] = os.path.abspath(args.db)     # inherited by worker processes
+        database.configure_pool(args.db)
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers,
+                log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Archival of old completed transactions into monthly partition files.
+
+Checked-Out rows whose check-out is more than --days old move, one
+check-out month at a time, into <database name>_archive/transactions_YYYY_MM.db
+beside the database: a plain SQLite file with the same columns, catalogued
+in ArchivePartitions, with the asset tags it holds in ArchivedAssets.  view_completed_transactions(), page_transactions()
+and get_transaction_details() in database.py read the partitions too, so
+history pages and receipts do not change, and bulk.py exports include
+archived rows, and so do asset histories.  Only the search index forgets
+them, and the job merges it afterwards so that it shrinks.  The day
+counters, the Dashboard analytics and AssetState go on counting them.
+
+Each month is copied and committed into its partition first.  The rows are
+then deleted from Transactions in a second transaction, which only deletes
+rows already in the partition.  A crash in between leaves a row in both
+places, never in neither, and the next run finishes the move.  The
+receipt outbox and signatures keep their rows: they only refer to
+transaction ids, which AUTOINCREMENT never reuses.  Archiving is SQLite
+only, like bulk.py.
+
+    python archive.py --days 365
+    python archive.py --days 365 --vacuum
+"""
+import argparse
+import os
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import database
+from datacache import bump_data_version
+
+DEFAULT_DAYS = 365
+
+# Kept from firing while a partition's rows leave Transactions, so the day
+# counts, analytics and AssetState still include archived history
+KEEP_COUNTED = ("trg_transactions_count_delete", "trg_transactions_stats_delete", "trg_transactions_asset_delete")
+
+PARTITION_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS part.Transactions (
+        transaction_id INTEGER PRIMARY KEY,
+        employee_id INTEGER NOT NULL,
+        asset_tag INTEGER NOT NULL,
+        issue TEXT NOT NULL,
+        check_in_time DATETIME,
+        check_out_time DATETIME,
+        status TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS part.ix_transactions_completed ON Transactions(check_out_time, transaction_id)",
+    "CREATE INDEX IF NOT EXISTS part.ix_transactions_asset_history ON Transactions(asset_tag, check_in_time)",
+)
+
+ArchiveResult = namedtuple("ArchiveResult", "months rows seconds")
+
+
+def partition_file(month):
+    return f"transactions_{month.replace('-', '_')}.db"
+
+def _month_bounds(month):
+    """First day of `month` ('YYYY-MM') and of the month after it."""
+    first = datetime.strptime(month, "%Y-%m")
+    following = (first + timedelta(days=32)).replace(day=1)
+    return first.strftime("%Y-%m-%d"), following.strftime("%Y-%m-%d")
+
+def archivable_months(cutoff):
+    """'YYYY-MM' months with completed transactions checked out before cutoff, oldest first."""
+    with database.database_connection() as conn:
+        return [month for (month,) in conn.execute("""
+            SELECT DISTINCT substr(check_out_time, 1, 7) FROM Transactions
+            WHERE status = 'Checked-Out' AND check_out_time < ?
+            ORDER BY 1
+        """, (cutoff,))]
+
+def archive_month(month, cutoff):
+    """Move one month's completed transactions older than cutoff into its partition.
+
+    Returns the number of rows moved.  Uses its own connection, because
+    ATTACH is per connection and the pooled ones are shared.
+    """
+    folder = database.archive_dir()
+    os.makedirs(folder, exist_ok=True)
+    first, following = _month_bounds(month)
+    upper = min(following, cutoff)
+    selected = ("status = 'Checked-Out' AND check_out_time >= ? AND check_out_time < ?", (first, upper))
+    conn = database.open_connection(database.get_pool().path)
+    conn.isolation_level = None                 # explicit BEGIN/COMMIT; ATTACH needs autocommit
+    try:
+        conn.execute("ATTACH DATABASE ? AS part", (os.path.join(folder, partition_file(month)),))
+        conn.execute("BEGIN")
+        for statement in PARTITION_SCHEMA:
+            conn.execute(statement)
+        conn.execute(f"""
+            INSERT OR IGNORE INTO part.Transactions
+            SELECT transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time, status
+            FROM main.Transactions WHERE {selected[0]}
+            ORDER BY check_out_time, transaction_id
+        """, selected[1])
+        conn.execute("COMMIT")
+
+        # Same trick as bulk._insert_history: DDL is transactional and this
+        # transaction holds the write lock, so no other writer sees the
+        # triggers missing.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            triggers = dict(conn.execute(
+                f"SELECT name, sql FROM main.sqlite_master WHERE type='trigger' AND name IN "
+                f"({', '.join('?' * len(KEEP_COUNTED))})", KEEP_COUNTED).fetchall())
+            for name in triggers:
+                conn.execute(f"DROP TRIGGER main.{name}")
+            moved = conn.execute(f"""
+                DELETE FROM main.Transactions
+                WHERE {selected[0]} AND transaction_id IN (SELECT transaction_id FROM part.Transactions)
+            """, selected[1]).rowcount
+            for sql in triggers.values():
+                conn.execute(sql)
+            conn.execute("""
+                INSERT OR REPLACE INTO main.ArchivePartitions
+                    (month, file, n, first_id, last_id, first_check_out, last_check_out)
+                SELECT ?, ?, COUNT(*), MIN(transaction_id), MAX(transaction_id),
+                       MIN(check_out_time), MAX(check_out_time)
+                FROM part.Transactions
+            """, (month, partition_file(month)))
+            conn.execute("""
+                INSERT OR IGNORE INTO main.ArchivedAssets (asset_tag, month)
+                SELECT DISTINCT asset_tag, ? FROM part.Transactions
+            """, (month,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("DETACH DATABASE part")
+    finally:
+        conn.close()
+    bump_data_version()
+    return moved
+
+def archive_completed(days=DEFAULT_DAYS, now=None, progress=None):
+    """Archive every completed transaction checked out more than `days` days before now."""
+    started = time.perf_counter()
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)      # check-out times are UTC
+    cutoff = (now - timedelta(days=days)).isoformat(sep=" ", timespec="seconds")
+    rows = 0
+    months = archivable_months(cutoff)
+    for month in months:
+        rows += archive_month(month, cutoff)
+        if progress:
+            progress(month, rows)
+    if rows:
+        optimize_search()
+    return ArchiveResult(len(months), rows, time.perf_counter() - started)
+
+def optimize_search():
+    """Merge the search index's segments.
+
+    FTS5 deletes only add tombstones, so until a merge the index keeps
+    its full size however many rows were archived.
+    """
+    with database.unit_of_work() as conn:
+        conn.execute("INSERT INTO TransactionSearch (TransactionSearch) VALUES ('optimize')")
+
+def vacuum():
+    """Rebuild the hot database so the space archived rows used is returned to the disk.
+
+    Blocks writers for the duration and needs as much free space as the file.
+    """
+    conn = database.open_connection(database.get_pool().path)
+    try:
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+
+# ---------------- CLI ----------------
+def main():
+    parser = argparse.ArgumentParser(description="Move old completed transactions into monthly partitions")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS,
+                        help="archive transactions checked out more than this many days ago")
+    parser.add_argument("--vacuum", action="store_true", help="then shrink the database file")
+    args = parser.parse_args()
+
+    database.tables()
+    result = archive_completed(args.days, progress=lambda month, n: print(f"\r{month}: {n:,} rows", end="", flush=True))
+    print(f"\rArchived {result.rows:,} transactions from {result.months} month(s) into "
+          f"{database.archive_dir()} in {result.seconds:.1f}s")
+    if args.vacuum:
+        started = time.perf_counter()
+        vacuum()
+        print(f"Vacuumed {database.get_pool().path} in {time.perf_counter() - started:.1f}s "
+              f"({os.path.getsize(database.get_pool().path) / 2**20:,.1f}MB)")
+
+
+if __name__ == "__main__":
+    main()
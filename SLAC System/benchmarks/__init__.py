@@ -0,0 +1,10 @@
+"""
+Benchmarks for the check-in system.
+
+Run them from the ``SLAC System`` folder, e.g.::
+
+    python -m benchmarks.bench_connections
+
+``python -m benchmarks.suite`` times every hot helper on seeded data and
+compares the results with ``benchmarks/baseline.json``.
+"""
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard analytics panel: recompute from history vs trigger-kept summary tables.
+
+For each history size (multi-year seeded data), times one panel render the
+naive way (load every transaction, then pandas for per-hour/per-day counts,
+turnaround mean/p90 by issue type and repeat assets) and from the summary
+tables, and checks that both give the same numbers (p90 to within one
+histogram bucket).  "write cost" is check-in + check-out with and without
+the analytics triggers.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+
+import database
+from benchmarks.seed import seed
+from receipts import parse_issue_type
+
+
+def recompute():
+    """The panel from raw history, as it would be without summary tables."""
+    with database.database_connection() as conn:
+        df = pd.read_sql("SELECT asset_tag, issue, check_in_time, check_out_time, status FROM Transactions", conn)
+    check_in = pd.to_datetime(df["check_in_time"], format="ISO8601")
+    now = pd.Timestamp.now("UTC").tz_localize(None)
+    per_hour = check_in[check_in >= now.floor("h") - pd.Timedelta(hours=23)].dt.floor("h").value_counts()
+    per_day = check_in[check_in >= now.normalize() - pd.Timedelta(days=29)].dt.normalize().value_counts()
+    done = df[df["status"] == "Checked-Out"]
+    hours = ((pd.to_datetime(done["check_out_time"], format="ISO8601")
+              - pd.to_datetime(done["check_in_time"], format="ISO8601")).dt.total_seconds().clip(lower=0) / 3600)
+    turnaround = hours.groupby(done["issue"].map(parse_issue_type)).agg(
+        completed="count", mean_hours="mean", p90_hours=lambda h: h.quantile(0.9))
+    repeats = df["asset_tag"].value_counts().head(10)
+    active = int((df["status"] == "Checked-In").sum())
+    return active, per_hour, per_day, turnaround.sort_values("completed", ascending=False), repeats
+
+
+def summary():
+    return (database.count_transactions("Checked-In"), database.checkins_per_hour(24),
+            database.checkins_per_day(30), database.turnaround_by_issue(), database.repeat_assets(10))
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000, result
+
+
+def check(naive, fast):
+    active, per_hour, per_day, turnaround, repeats = naive
+    f_active, f_hour, f_day, f_turnaround, f_repeats = fast
+    f_turnaround = f_turnaround.set_index("issue_type")
+    problems = []
+    if active != f_active:
+        problems.append("active count")
+    if per_hour.sum() != f_hour["checkins"].sum() or per_day.sum() != f_day["checkins"].sum():
+        problems.append("check-in counts")
+    for issue_type, row in turnaround.iterrows():
+        mine = f_turnaround.loc[issue_type]
+        if mine["completed"] != row["completed"] or abs(mine["mean_hours"] - row["mean_hours"]) > 1e-6:
+            problems.append(f"turnaround {issue_type}")
+        bucket = database.TURNAROUND_BUCKET_GROWTH
+        if not row["p90_hours"] / bucket - 1e-9 <= mine["p90_hours"] <= max(row["p90_hours"] * bucket, 1 / 60) + 1e-9:
+            problems.append(f"p90 {issue_type}")
+    if list(repeats.values) != list(f_repeats["visits"]):
+        problems.append("repeat assets")
+    return "same numbers" if not problems else "MISMATCH: " + ", ".join(problems)
+
+
+def write_cost(path, target, writes):
+    database.configure_pool(path)
+    database.migrate(target)
+    start = time.perf_counter()
+    for i in range(writes):
+        row = database.record_check_in(1000 + i % 500, 900000 + i % 5000, "Hardware Failure: bench")
+        database.check_out(row[0])
+    return (time.perf_counter() - start) / writes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--writes", type=int, default=2000)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="slac_analytics_")
+    for n in args.sizes:
+        path = os.path.join(tmpdir, f"analytics_{n}.db")
+        database.configure_pool(path)
+        database.migrate()
+        seed(path, transactions=n, years=args.years)
+        naive_ms, naive = timed(recompute, max(1, args.repeat // 2))
+        fast_ms, fast = timed(summary, args.repeat * 4)
+        print(f"rows={n:>9,}  recompute={naive_ms:9.1f}ms  summary tables={fast_ms:6.2f}ms  "
+              f"({naive_ms / fast_ms:,.0f}x)  {check(naive, fast)}")
+
+    without = write_cost(os.path.join(tmpdir, "writes_v6.db"), 6, args.writes)
+    with_triggers = write_cost(os.path.join(tmpdir, "writes_v7.db"), None, args.writes)
+    print(f"write cost (check-in + check-out): {without:.3f}ms without analytics triggers, "
+          f"{with_triggers:.3f}ms with")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hot database size and read latency before and after archiving old history.
+
+Seeds a multi-year history and measures the file size (after VACUUM), the
+time to VACUUM it and to copy it with the backup API, and the median
+latency of the history reads.  It then archives everything checked out
+more than --days ago (archive.py), vacuums, and measures again.  The
+results are compared first: the same completed rows and pages, the same
+details for archived ids, and unchanged counters.
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import archive
+import database
+from benchmarks.seed import seed
+
+
+def median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def walk_pages(start, end, pages, page_size=50):
+    cursor, rows = None, []
+    for _ in range(pages):
+        page = database.page_transactions("Checked-Out", start, end, cursor, page_size)
+        rows.append(page)
+        cursor = database.page_cursor(page)
+    return rows
+
+
+def maintenance_ms(path, folder):
+    """VACUUM time and backup-API copy time of the database file."""
+    conn = database.open_connection(path)
+    try:
+        start = time.perf_counter()
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        vacuum_ms = (time.perf_counter() - start) * 1000
+        copy = sqlite3.connect(os.path.join(folder, "backup.db"))
+        start = time.perf_counter()
+        conn.backup(copy)
+        backup_ms = (time.perf_counter() - start) * 1000
+        copy.close()
+        os.remove(os.path.join(folder, "backup.db"))
+    finally:
+        conn.close()
+    return vacuum_ms, backup_ms
+
+
+def measure(ids, old_month, repeat):
+    return {
+        "view_active_transactions": median_ms(database.view_active_transactions, repeat),
+        "view_completed_transactions": median_ms(database.view_completed_transactions, max(3, repeat // 4)),
+        "history page 1": median_ms(lambda: walk_pages(None, None, 1), repeat),
+        "history pages 1-10": median_ms(lambda: walk_pages(None, None, 10), repeat),
+        f"history {old_month[0][:7]} page 1": median_ms(lambda: walk_pages(*old_month, 1), repeat),
+        "count_transactions": median_ms(lambda: database.count_transactions("Checked-Out"), repeat),
+        "get_transaction_details (recent)": median_ms(lambda: database.get_transaction_details(ids[1]), repeat),
+        "get_transaction_details (old)": median_ms(lambda: database.get_transaction_details(ids[0]), repeat),
+        "search_transactions": median_ms(lambda: database.search_transactions("wifi drops"), repeat),
+    }
+
+
+def snapshot(ids, old_month):
+    with database.database_connection() as conn:
+        counters = [conn.execute(sql).fetchall() for sql in (
+            "SELECT status, SUM(n) FROM TransactionDayCounts GROUP BY 1",
+            "SELECT SUM(n) FROM CheckInHourCounts",
+            "SELECT SUM(n), SUM(total_seconds) FROM TurnaroundStats",
+            "SELECT SUM(n) FROM AssetVisitCounts",
+        )]
+    completed = database.view_completed_transactions().sort_values("transaction_id", ignore_index=True)
+    pages = walk_pages(None, None, 10) + walk_pages(*old_month, 10)
+    return counters, completed, pages, [database.get_transaction_details(i) for i in ids]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--days", type=int, default=365, help="archive check-outs older than this")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="slac_archive_")
+    path = os.path.join(folder, "archive.db")
+    database.configure_pool(path)
+    database.migrate()
+    start = time.perf_counter()
+    seed(path, args.transactions, years=args.years)
+    print(f"seeded {args.transactions:,} transactions over {args.years} years "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    ids = (args.transactions // (2 * args.years), args.transactions - args.transactions // 100)
+    old_year = time.localtime().tm_year - args.years // 2
+    old_month = (f"{old_year}-03-01", f"{old_year}-03-31")
+
+    before_vacuum, before_backup = maintenance_ms(path, folder)
+    before_size = os.path.getsize(path)
+    before = measure(ids, old_month, args.repeat)
+    expected = snapshot(ids, old_month)
+
+    result = archive.archive_completed(args.days)
+    start = time.perf_counter()
+    archive.vacuum()
+    vacuum_seconds = time.perf_counter() - start
+    print(f"archived {result.rows:,} rows from {result.months} months in {result.seconds:.1f}s, "
+          f"then VACUUM {vacuum_seconds:.1f}s")
+
+    after_vacuum, after_backup = maintenance_ms(path, folder)
+    after_size = os.path.getsize(path)
+    after = measure(ids, old_month, args.repeat)
+    actual = snapshot(ids, old_month)
+    same = (expected[0] == actual[0] and expected[1].equals(actual[1])
+            and all(a.equals(b) for a, b in zip(expected[2], actual[2])) and expected[3] == actual[3])
+    print("results: " + ("identical (counters, completed rows, 20 pages, details)" if same else "DIFFER"))
+
+    partitions = os.path.join(folder, "archive_archive")
+    archived_size = sum(os.path.getsize(os.path.join(partitions, f)) for f in os.listdir(partitions))
+    print(f"{'':<36}{'before':>12}{'after':>12}")
+    print(f"{'hot database':<36}{before_size / 2**20:>10.1f}MB{after_size / 2**20:>10.1f}MB"
+          f"   (+{archived_size / 2**20:.1f}MB in {len(os.listdir(partitions))} partitions)")
+    print(f"{'VACUUM':<36}{before_vacuum:>10.0f}ms{after_vacuum:>10.0f}ms")
+    print(f"{'backup API copy':<36}{before_backup:>10.0f}ms{after_backup:>10.0f}ms")
+    for name in before:
+        print(f"{name:<36}{before[name]:>10.2f}ms{after[name]:>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Asset lookups before and after AssetState (migration 11), at 1M transactions.
+
+Seeds the schema as it was before (migration 10) and times the ways "where
+is laptop X now" and "what is its history" could be answered: the Check-Out
+search over checked-in devices, the latest row through the old asset_tag
+index, and a full table scan.  Then it migrates (timing the backfill) and
+times asset_status(), the same history query on the new index, and
+asset_history() pages, which also build a DataFrame and look at the
+archive partitions.  Each lookup runs for --lookups random asset tags.
+The answers are compared with the old ones, and check-in plus check-out
+is timed on both schemas to show the triggers' cost.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import database
+from benchmarks.seed import seed
+
+LATEST_SQL = """
+    SELECT transaction_id, employee_id, status FROM Transactions {hint}
+    WHERE asset_tag = ? ORDER BY check_in_time DESC, transaction_id DESC LIMIT 1
+"""
+HISTORY_SQL = """
+    SELECT transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time, status
+    FROM Transactions WHERE asset_tag = ? ORDER BY check_in_time DESC, transaction_id DESC LIMIT 50
+"""
+
+
+def median_ms(fn, tags):
+    times = []
+    for tag in tags:
+        start = time.perf_counter()
+        fn(tag)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def query(sql):
+    def run(tag):
+        with database.database_connection() as conn:
+            return conn.execute(sql, (tag,)).fetchall()
+    return run
+
+
+def plan(sql):
+    with database.database_connection() as conn:
+        return "; ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, (0,)))
+
+
+def unguarded_check_in(employee_id, asset_tag, issue):
+    """record_check_in() as it was before the AssetState guard."""
+    with database.unit_of_work() as conn:
+        conn.execute("INSERT OR IGNORE INTO Employees (employee_id, name, email) VALUES (?, '', '')", (employee_id,))
+        conn.execute("INSERT OR IGNORE INTO Laptops (asset_tag, model, description) VALUES (?, '', '')",
+                     (str(asset_tag),))
+        return conn.execute("INSERT INTO Transactions (employee_id, asset_tag, issue) VALUES (?, ?, ?) "
+                            "RETURNING transaction_id", (employee_id, str(asset_tag), issue)).fetchone()
+
+def check_in_out(record_check_in, n, first_tag):
+    """Median ms of a check-in followed by its check-out, on fresh asset tags."""
+    def run(i):
+        database.check_out(record_check_in(9000 + i % 50, first_tag + i, "Other: asset bench")[0])
+    return median_ms(run, range(n))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--laptops", type=int, default=20_000)
+    parser.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="slac_assets_"), "assets.db")
+    database.configure_pool(path)
+    database.migrate(10)                    # the schema before AssetState
+    start = time.perf_counter()
+    seed(path, transactions=args.transactions, laptops=args.laptops, active_ratio=0.05)
+    print(f"seeded {args.transactions:,} transactions over {args.laptops:,} laptops "
+          f"in {time.perf_counter() - start:.1f}s")
+    tags = random.Random(3).sample(range(100000, 100000 + args.laptops), args.lookups)
+
+    before = {
+        "search checked-in devices (Check-Out page)":
+            median_ms(lambda tag: database.search_transactions(str(tag), "Checked-In", columns=("asset_tag",)), tags),
+        "latest row, asset_tag index": median_ms(query(LATEST_SQL.format(hint="")), tags),
+        "latest row, table scan": median_ms(query(LATEST_SQL.format(hint="NOT INDEXED")), tags[:20]),
+        "history page 1 (50 rows)": median_ms(query(HISTORY_SQL), tags),
+    }
+    plans = {"latest row, asset_tag index": plan(LATEST_SQL.format(hint="")),
+             "history page 1 (50 rows)": plan(HISTORY_SQL)}
+    expected = [query(LATEST_SQL.format(hint=""))(tag) for tag in tags]
+    write_before = check_in_out(unguarded_check_in, 200, 990_000)
+
+    start = time.perf_counter()
+    database.migrate(11)
+    print(f"migration 11 (index + AssetState backfill) {time.perf_counter() - start:.1f}s")
+    database.migrate()                      # the later ones, untimed: asset_history() reads ArchivedAssets
+
+    after = {
+        "asset_status()": median_ms(database.asset_status, tags),
+        "history page 1 (50 rows), new index": median_ms(query(HISTORY_SQL), tags),
+        "asset_history() page 1 (50 rows)": median_ms(database.asset_history, tags),
+        "asset_history() page 2": median_ms(
+            lambda tag: database.asset_history(tag, database.asset_history_cursor(database.asset_history(tag))), tags),
+    }
+    plans["history page 1, new index"] = plan(HISTORY_SQL)
+    actual = [database.asset_status(tag) for tag in tags]
+    same = all((s and (s.transaction_id, s.employee_id, s.status)) == (e[0] if e else None)
+               for s, e in zip(actual, expected))
+    write_after = check_in_out(database.record_check_in, 200, 995_000)
+
+    print(f"{'lookup':<46}{'median':>10}")
+    for name, ms in list(before.items()) + list(after.items()):
+        print(f"{name:<46}{ms:>8.3f}ms")
+    print(f"asset_status() answers {'match' if same else 'DIFFER FROM'} the latest rows for {len(tags)} assets")
+    print(f"check-in + check-out: {write_before:.2f}ms before, {write_after:.2f}ms with AssetState and the guard")
+    for name, detail in plans.items():
+        print(f"plan, {name}: {detail}")
+
+
+if __name__ == "__main__":
+    main()
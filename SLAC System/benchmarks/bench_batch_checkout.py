@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-device cost of checking out one employee's devices, one at a time vs in a batch.
+
+For each batch size, one employee checks in that many devices.  "single"
+checks each one out with service.check_out() and sends its own receipt,
+as the Check-Out page did before.  "batch" closes them all with
+service.check_out_many() under one signature and sends one digest receipt.
+Check-out and delivery (PDF render plus SMTP send to a local sink) are timed
+separately and reported per device, with the messages and bytes the sink
+received.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import database
+import service
+from benchmarks.smtp_sink import SMTPSink
+from signatures import encode_signature
+
+SIGNATURE = encode_signature({"objects": [{"path": [["M", 20, 30], ["Q", 60, 90, 120, 40], ["L", 300, 110]]}]})
+
+
+def check_in_devices(employee_id, n, first_tag):
+    return [service.check_in(employee_id, first_tag + i, "Hardware Failure: batch bench",
+                             "Bench User", f"bench{employee_id}@example.com").transaction.transaction_id
+            for i in range(n)]
+
+
+def single(ids):
+    import receipts
+    start = time.perf_counter()
+    for tx_id in ids:
+        service.check_out(tx_id, SIGNATURE)
+    checked_out = time.perf_counter()
+    for tx_id in ids:
+        receipts.deliver_receipt(tx_id, "Check-Out")
+    return checked_out - start, time.perf_counter() - checked_out
+
+
+def batch(ids):
+    import receipts
+    start = time.perf_counter()
+    service.check_out_many(ids, SIGNATURE)
+    checked_out = time.perf_counter()
+    receipts.deliver_receipt(tuple(ids), "Check-Out")
+    return checked_out - start, time.perf_counter() - checked_out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 5, 10, 25, 50, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    database.configure_pool(os.path.join(tempfile.mkdtemp(prefix="slac_batch_"), "batch.db"))
+    service.start_backend()
+    service.outbox.stop_worker()           # receipts are delivered inline below, not by the worker
+    with SMTPSink() as sink:
+        os.environ.update({"SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(sink.address[1]), "SMTP_USE_TLS": "0"})
+        batch(check_in_devices(5000, 2, 100))          # warm up: templates, SMTP session, statements
+        single(check_in_devices(5000, 2, 200))
+
+        print(f"{'devices':>7}  {'mode':<6} {'check-out/device':>17} {'delivery/device':>16} "
+              f"{'total/device':>13} {'messages':>9} {'sent KB':>8}")
+        tag = 10_000
+        for n in args.sizes:
+            for label, run in (("single", single), ("batch", batch)):
+                out_times, delivery_times = [], []
+                messages, sent_bytes = sink.accepted, sink.bytes
+                for r in range(args.repeat):
+                    ids = check_in_devices(6000 + r, n, tag)
+                    tag += n
+                    checked_out, delivered = run(ids)
+                    out_times.append(checked_out / n)
+                    delivery_times.append(delivered / n)
+                out_ms = statistics.median(out_times) * 1000
+                delivery_ms = statistics.median(delivery_times) * 1000
+                print(f"{n:>7}  {label:<6} {out_ms:>15.2f}ms {delivery_ms:>14.2f}ms {out_ms + delivery_ms:>11.2f}ms "
+                      f"{(sink.accepted - messages) / args.repeat:>9.0f} "
+                      f"{(sink.bytes - sent_bytes) / args.repeat / 1024:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
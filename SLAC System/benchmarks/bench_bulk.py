@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk import/export throughput in rows/sec, with peak memory.
+
+Writes a synthetic HR roster, asset inventory and transaction history as
+CSV, imports them with bulk.import_file, exports the history back to CSV
+and Parquet, and re-imports the Parquet file into a fresh database.
+"row-at-a-time" is the old way in: one upsert_employee() call per row.
+Peak RSS is the process high-water mark after each step; with chunked
+streaming it should stop growing after the first import.
+"""
+import argparse
+import csv
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import bulk
+import database
+from benchmarks.seed import FIRST_NAMES, LAST_NAMES, generate_transactions
+
+
+def peak_rss_mib():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def write_csv(path, header, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def report(label, rows, seconds):
+    print(f"{label:<28} {rows:>10,} rows  {seconds:7.2f}s  {rows / seconds:>10,.0f} rows/s  "
+          f"peak RSS {peak_rss_mib():6.0f} MiB")
+
+
+def timed_import(label, table, path):
+    result = bulk.import_file(table, path)
+    report(label, result.rows, result.seconds)
+
+
+def timed_export(label, table, path):
+    start = time.perf_counter()
+    rows = bulk.export_file(table, path)
+    report(label, rows, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--employees", type=int, default=1_000_000)
+    parser.add_argument("--laptops", type=int, default=1_000_000)
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--row-at-a-time", type=int, default=20_000, help="rows for the old per-row path")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="slac_bulk_")
+    files = {name: os.path.join(folder, f"{name}.csv") for name in ("employees", "laptops", "transactions")}
+    write_csv(files["employees"], ("employee_id", "name", "email"), (
+        (1000 + i, f"{FIRST_NAMES[i % 10]} {LAST_NAMES[i // 10 % 10]}", f"user{1000 + i}@example.com")
+        for i in range(args.employees)
+    ))
+    write_csv(files["laptops"], ("asset_tag", "model", "description"), (
+        (100000 + i, "Latitude 7440", "") for i in range(args.laptops)
+    ))
+    write_csv(files["transactions"], bulk.TABLES["transactions"].columns,
+              generate_transactions(args.transactions, args.employees, args.laptops, 0.02, 3, 42))
+    print(f"files in {folder}; peak RSS {peak_rss_mib():.0f} MiB before importing")
+
+    database.configure_pool(os.path.join(folder, "bulk.db"))
+    database.tables()
+    start = time.perf_counter()
+    for i in range(args.row_at_a_time):
+        database.upsert_employee(9_000_000 + i, "Row At A Time", f"r{i}@example.com")
+    report("row-at-a-time employees", args.row_at_a_time, time.perf_counter() - start)
+
+    timed_import("import employees.csv", "employees", files["employees"])
+    timed_import("import laptops.csv", "laptops", files["laptops"])
+    timed_import("import transactions.csv", "transactions", files["transactions"])
+    timed_export("export transactions.csv", "transactions", os.path.join(folder, "export.csv"))
+    parquet = os.path.join(folder, "export.parquet")
+    try:
+        timed_export("export transactions.parquet", "transactions", parquet)
+    except RuntimeError as e:
+        print(e)
+        return
+    database.configure_pool(os.path.join(folder, "fresh.db"))
+    database.tables()
+    timed_import("import transactions.parquet", "transactions", parquet)
+
+
+if __name__ == "__main__":
+    main()
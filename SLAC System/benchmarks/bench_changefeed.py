@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard refresh cost and update latency: full re-query vs the change feed.
+
+Seeds a history with --active devices checked in.  Between refreshes a
+second connection (standing in for a kiosk or API process, whose writes
+the read cache cannot see) makes --writes check-ins and check-outs.  Each
+refresh then either re-runs view_active_transactions(), which a live
+Dashboard needs to do to see other processes' writes, or applies the new
+events with changefeed.ActiveFollower.  The statements and rows read per
+refresh are counted with a trace callback on the pool's connections, and
+both frames are compared at the end.
+
+End-to-end latency is commit to arrival at a GET /changes subscriber of
+an API served in this process (needs uvicorn), measured against each
+event's own commit timestamp.  The Dashboard's Live view adds the wait for
+its next rerun (up to LIVE_REFRESH_SECONDS) to its refresh cost.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import urllib.request
+
+import changefeed
+import database
+from activeset import active_frame
+from datacache import DEFAULT_TTL
+from benchmarks.seed import seed
+
+LIVE_REFRESH_SECONDS = 2.0     # as in SLAC_System.py
+
+_reads = {"statements": 0}
+
+
+def counting_connection(path=None):
+    conn = open_connection(path)
+
+    def trace(sql):
+        if sql.lstrip().upper().startswith("SELECT"):
+            _reads["statements"] += 1
+    conn.set_trace_callback(trace)
+    return conn
+
+open_connection = database.open_connection
+database.open_connection = counting_connection     # the pool opens its connections through this
+
+
+class Writer:
+    """Check-ins and check-outs on a connection of its own, like another process."""
+
+    def __init__(self, path, rng):
+        self.conn = open_connection(path)
+        self.rng = rng
+        self.tag = 900_000
+
+    def write(self, n):
+        for _ in range(n):
+            with self.conn:
+                if self.rng.random() < 0.5:
+                    self.tag += 1
+                    self.conn.execute("INSERT INTO Transactions (employee_id, asset_tag, issue) VALUES (?, ?, ?)",
+                                      (1000 + self.rng.randrange(5000), self.tag, "Hardware Failure: feed bench"))
+                else:
+                    self.conn.execute("""
+                        UPDATE Transactions SET status = 'Checked-Out', check_out_time = datetime('now')
+                        WHERE transaction_id = (SELECT transaction_id FROM Transactions
+                                                WHERE status = 'Checked-In' ORDER BY random() LIMIT 1)
+                    """)
+
+
+def refreshes(writer, refresh, writes, repeat):
+    """Median ms, SELECT statements and rows read per refresh after `writes` writes each."""
+    times, statements, rows = [], [], []
+    refresh()                       # catch up with the writes made for the other mode
+    for _ in range(repeat):
+        writer.write(writes)
+        before = _reads["statements"]
+        start = time.perf_counter()
+        n = refresh()
+        times.append(time.perf_counter() - start)
+        statements.append(_reads["statements"] - before)
+        rows.append(n)
+    return statistics.median(times) * 1000, statistics.mean(statements), statistics.mean(rows)
+
+
+def requery():
+    return len(database.view_active_transactions())
+
+
+def follow(follower):
+    def refresh():
+        before = follower.cursor
+        follower.refresh()
+        return follower.cursor - before          # events read
+    return refresh
+
+
+def stream_latency(path, writer, events, port):
+    """Seconds from commit to arrival for `events` writes streamed over GET /changes."""
+    try:
+        import uvicorn
+    except ImportError:
+        return None
+    import api
+    server = uvicorn.Server(uvicorn.Config(api.app, port=port, log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    latencies = []
+    stream = urllib.request.urlopen(f"http://127.0.0.1:{port}/changes")
+    try:
+        def send():
+            for _ in range(events):
+                time.sleep(writer.rng.uniform(0, 2 * api.FEED_POLL_SECONDS))
+                writer.write(1)
+        threading.Thread(target=send, daemon=True).start()
+        for line in stream:
+            if line.startswith(b"data: "):
+                latencies.append(time.time() - json.loads(line[6:])["at"])
+                if len(latencies) == events:
+                    break
+    finally:
+        stream.close()
+        server.should_exit = True
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--transactions", type=int, default=120_000)
+    parser.add_argument("--active", type=int, default=55_000)
+    parser.add_argument("--writes", type=int, nargs="+", default=[0, 1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--events", type=int, default=200, help="writes timed through the event stream")
+    parser.add_argument("--port", type=int, default=8691)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="slac_feed_"), "feed.db")
+    os.environ["SLAC_DB_PATH"] = path
+    database.configure_pool(path)
+    database.migrate()
+    # generate_transactions keeps ~90% of the newest active_ratio share checked in
+    seed(path, transactions=args.transactions, active_ratio=min(1.0, args.active / args.transactions / 0.9))
+    print(f"{database.count_transactions('Checked-In'):,} devices checked in, {args.transactions:,} transactions")
+
+    writer = Writer(path, random.Random(7))
+    follower = changefeed.ActiveFollower(path)
+    follower.refresh()
+    print(f"{'writes/refresh':>14}  {'mode':<9} {'ms/refresh':>10} {'SELECTs':>8} {'rows read':>10}")
+    for writes in args.writes:
+        for label, refresh in (("re-query", requery), ("feed", follow(follower))):
+            ms, statements, rows = refreshes(writer, refresh, writes, args.repeat)
+            print(f"{writes:>14}  {label:<9} {ms:>10.2f} {statements:>8.1f} {rows:>10,.0f}")
+
+    fresh = database.view_active_transactions()
+    key = ["check_in_time", "transaction_id"]
+    same = follower.refresh().sort_values(key, ignore_index=True).equals(
+        active_frame(fresh).sort_values(key, ignore_index=True))
+    print(f"followed frame {'matches' if same else 'DIFFERS FROM'} a fresh query ({len(fresh):,} rows, "
+          f"{follower.reloads} load(s))")
+
+    latencies = stream_latency(path, writer, args.events, args.port)
+    if latencies is None:
+        print("stream latency: skipped (pip install uvicorn)")
+    else:
+        latencies.sort()
+        import api
+        print(f"commit -> /changes subscriber over {len(latencies)} writes (poll {api.FEED_POLL_SECONDS:g}s): "
+              f"p50={statistics.median(latencies) * 1000:.0f}ms "
+              f"p95={latencies[int(len(latencies) * 0.95)] * 1000:.0f}ms max={latencies[-1] * 1000:.0f}ms")
+    print(f"Dashboard Live: up to {LIVE_REFRESH_SECONDS:g}s until the next rerun (mean {LIVE_REFRESH_SECONDS / 2:g}s) "
+          f"plus the refresh above; without Live, other processes' writes waited for an interaction "
+          f"and the read cache's {DEFAULT_TTL:g}s TTL")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Check-Out and Dashboard per-keystroke cost with many devices checked in.
+
+Seeds a history where --active transactions are still checked in, then
+types each query in QUERIES one character at a time.  Every keystroke
+reruns the search (timed on its own), then "old" builds labels with
+DataFrame.apply(axis=1) and finds the chosen row by comparing label
+strings, while "new" converts the result with activeset.active_frame()
+and selects by transaction_id.  The
+Dashboard line is the full active table: the old double astype(str)
+against active_frame(), which keeps the int64 columns as they are.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import warnings
+
+import database
+from activeset import active_frame, device_labels
+from benchmarks.seed import seed
+
+QUERIES = ("1004", "Patel", "wifi drops", "1234")
+
+
+def old_checkout(filtered):
+    if filtered.empty:
+        return None
+    filtered["label"] = filtered.apply(
+        lambda r: f"Tx#{r['transaction_id']} - {r['asset_tag']} (Employee {r['employee_id']})",
+        axis=1
+    )
+    options = filtered["label"].tolist()
+    selected = options[len(options) // 2]
+    return filtered.loc[filtered["label"] == selected, "transaction_id"].values[0]
+
+
+def new_checkout(filtered):
+    devices = active_frame(filtered)
+    labels = device_labels(devices)
+    if not labels:
+        return None
+    options = list(labels)
+    [labels[tx_id] for tx_id in options]          # what format_func renders
+    return options[len(options) // 2]
+
+
+def old_dashboard(active_df):
+    active_df['employee_id'] = active_df['employee_id'].astype(str)
+    active_df['asset_tag'] = active_df['asset_tag'].astype(str)
+    if not active_df.empty:
+        active_df = active_df.copy()
+        active_df['employee_id'] = active_df['employee_id'].astype(str)
+        active_df['asset_tag'] = active_df['asset_tag'].astype(str)
+    return active_df
+
+
+def keystrokes(repeat):
+    """Median ms per keystroke for search, old model and new model over every prefix of every query."""
+    times = {"search": [], "old": [], "new": []}
+    same = True
+    for _ in range(repeat):
+        for query in QUERIES:
+            for end in range(1, len(query) + 1):
+                start = time.perf_counter()
+                filtered = database.search_transactions(query[:end], "Checked-In")
+                times["search"].append(time.perf_counter() - start)
+                start = time.perf_counter()
+                old = old_checkout(filtered.copy())
+                times["old"].append(time.perf_counter() - start)
+                start = time.perf_counter()
+                new = new_checkout(filtered)
+                times["new"].append(time.perf_counter() - start)
+                same = same and (None if old is None else int(old)) == new
+    return {name: statistics.median(t) * 1000 for name, t in times.items()}, same
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--transactions", type=int, default=120_000)
+    parser.add_argument("--active", type=int, default=55_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="slac_checkout_"), "checkout.db")
+    database.configure_pool(path)
+    database.migrate()
+    # generate_transactions keeps ~90% of the newest active_ratio share checked in
+    seed(path, transactions=args.transactions, active_ratio=min(1.0, args.active / args.transactions / 0.9))
+    print(f"{database.count_transactions('Checked-In'):,} devices checked in, "
+          f"{args.transactions:,} transactions")
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        ms, same = keystrokes(args.repeat)
+    print(f"Check-Out keystroke  search={ms['search']:6.2f}ms  labels+selection old={ms['old']:6.2f}ms "
+          f"new={ms['new']:6.2f}ms  ({'same selections' if same else 'SELECTIONS DIFFER'}, "
+          f"{len(caught)} pandas warnings)")
+
+    active = database.view_active_transactions()
+    old_times, new_times = [], []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        old_dashboard(active.copy())
+        old_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        active_frame(active)
+        new_times.append(time.perf_counter() - start)
+    print(f"Dashboard active table ({len(active):,} rows)  old={statistics.median(old_times) * 1000:7.2f}ms  "
+          f"new={statistics.median(new_times) * 1000:7.2f}ms  "
+          f"memory old={old_dashboard(active.copy()).memory_usage(deep=True).sum() / 2**20:.1f}MB "
+          f"new={active_frame(active).memory_usage(deep=True).sum() / 2**20:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cold start per page: first-run time, import time and memory of a fresh process.
+
+Each run is a new `python -X importtime` process that loads Streamlit's
+test harness (the server has Streamlit loaded before any script runs, so
+that part is not counted), then runs the app once with the page already
+selected.  Reported per page: median first-run time, time spent importing
+modules during that run, peak RSS, and the heaviest imports it pulled in.
+--app points at another copy of SLAC_System.py (e.g. an older checkout) to
+compare.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ("Check-In", "Check-Out", "Dashboard")
+MARK = "--- app run ---"
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+CHILD = r"""
+import json, resource, sys, time
+from streamlit.testing.v1 import AppTest
+
+def rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+at = AppTest.from_file(sys.argv[1], default_timeout=300)
+at.session_state["menu"] = sys.argv[2]
+harness_mb = rss_mb()
+print("%s", file=sys.stderr, flush=True)
+start = time.perf_counter()
+at.run()
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "rss_mb": rss_mb(), "harness_mb": harness_mb,
+                  "errors": [str(e.value) for e in at.exception]}))
+""" % MARK
+
+
+def run_page(app, page, env):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD, app, page],
+                          cwd=os.path.dirname(app), env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"{page}: child process failed\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    imports = {}
+    _, _, after = proc.stderr.partition(MARK)
+    for line in after.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match and not match.group(3):            # top-level imports only
+            imports[match.group(4)] = int(match.group(2)) / 1000
+    result["imports"] = imports
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--app", default=os.path.join(APP_DIR, "SLAC_System.py"))
+    parser.add_argument("--pages", nargs="+", default=list(PAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=6, help="heaviest imports listed per page")
+    args = parser.parse_args()
+
+    app = os.path.abspath(args.app)
+    env = dict(os.environ, SLAC_DB_PATH=os.path.join(tempfile.mkdtemp(prefix="slac_coldstart_"), "cold.db"))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(app), env.get("PYTHONPATH")]))
+    run_page(app, args.pages[0], env)                  # creates the schema and warms the disk cache
+
+    for page in args.pages:
+        runs = [run_page(app, page, env) for _ in range(args.repeat)]
+        if runs[0]["errors"]:
+            print(f"{page}: the page raised {runs[0]['errors']}")
+        imports = runs[0]["imports"]
+        heaviest = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        print(f"{page:<10} first run={statistics.median(r['seconds'] for r in runs) * 1000:7.0f}ms  "
+              f"importing={statistics.median(sum(r['imports'].values()) for r in runs):7.0f}ms  "
+              f"peak RSS={statistics.median(r['rss_mb'] for r in runs):6.0f}MB "
+              f"(+{statistics.median(r['rss_mb'] - r['harness_mb'] for r in runs):.0f}MB over Streamlit)")
+        print(f"{'':<10} heaviest: " + ", ".join(f"{name} {ms:.0f}ms" for name, ms in heaviest))
+
+
+if __name__ == "__main__":
+    main()
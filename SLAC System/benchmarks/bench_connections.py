@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Connections and commits per check-in: per-call connections vs the shared pool.
+
+Replays the "Confirm Check-In" helper sequence N times against a scratch
+database and counts how many connections were opened and how many COMMITs
+(sync points) were issued.  With the default rollback journal and
+synchronous=FULL every COMMIT is at least one fsync; in WAL mode with
+synchronous=NORMAL commits are not fsynced, only checkpoints are.
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+tmpdir = tempfile.mkdtemp(prefix="slac_bench_")
+os.environ["SLAC_DB_PATH"] = os.path.join(tmpdir, "pooled.db")
+
+import database  # noqa: E402
+
+LEGACY_PATH = os.path.join(tmpdir, "legacy.db")
+
+
+class Counters:
+    def __init__(self):
+        self.connections = 0
+        self.commits = 0
+
+    def trace(self, statement):
+        if statement.strip().upper().startswith("COMMIT"):
+            self.commits += 1
+
+
+# ---------------- Legacy: one connection per helper ----------------
+def legacy_flow(counters, employee_id, asset_tag, issue):
+    def connect():
+        counters.connections += 1
+        conn = sqlite3.connect(LEGACY_PATH)
+        conn.set_trace_callback(counters.trace)
+        return conn
+
+    def run(sql, params=(), fetch=False):
+        conn = connect()
+        cur = conn.execute(sql, params)
+        row = cur.fetchone() if fetch else cur.lastrowid
+        conn.commit()
+        conn.close()
+        return row
+
+    # ensure_employee_exists + ensure_laptop_exists from system()
+    run("INSERT OR IGNORE INTO Employees (employee_id, name, email) VALUES (?, ?, ?)", (employee_id, "Bench", "b@example.com"))
+    run("INSERT OR IGNORE INTO Laptops (asset_tag, model, description) VALUES (?, '', '')", (str(asset_tag),))
+    # check_in() repeats both ensures before the insert
+    run("INSERT OR IGNORE INTO Laptops (asset_tag, model, description) VALUES (?, '', '')", (str(asset_tag),))
+    run("INSERT OR IGNORE INTO Employees (employee_id, name, email) VALUES (?, ?, ?)", (employee_id, "", ""))
+    tx_id = run("INSERT INTO Transactions (employee_id, asset_tag, issue) VALUES (?, ?, ?)", (employee_id, str(asset_tag), issue))
+    run("SELECT * FROM Transactions WHERE transaction_id = ?", (tx_id,), fetch=True)
+    run("UPDATE Employees SET name=?, email=? WHERE employee_id=?", ("Bench", "b@example.com", employee_id))
+    run("SELECT name, email FROM Employees WHERE employee_id=?", (employee_id,), fetch=True)
+
+
+# ---------------- Pooled: shared long-lived connections ----------------
+def pooled_flow(employee_id, asset_tag, issue):
+    database.ensure_employee_exists(employee_id, "Bench", "b@example.com")
+    database.ensure_laptop_exists(asset_tag)
+    tx_id = database.check_in(employee_id, asset_tag, issue)
+    database.get_transaction_details(tx_id)
+    database.upsert_employee(employee_id, "Bench", "b@example.com")
+    database.get_employee_meta(employee_id)
+
+
+def instrument_pool(counters):
+    opener = database.open_connection
+
+    def counting_open(path=None):
+        counters.connections += 1
+        conn = opener(path)
+        conn.set_trace_callback(counters.trace)
+        return conn
+
+    database.open_connection = counting_open
+
+
+def report(name, counters, n, elapsed, mode):
+    print(f"{name:<8} connections={counters.connections:<6} "
+          f"connections/check-in={counters.connections / n:6.2f}  "
+          f"commits/check-in={counters.commits / n:6.2f}  "
+          f"ms/check-in={elapsed * 1000 / n:7.3f}  journal={mode}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--check-ins", type=int, default=500)
+    args = parser.parse_args()
+    n = args.check_ins
+
+    database.tables()
+    with sqlite3.connect(LEGACY_PATH) as conn:
+        conn.executescript("""
+            CREATE TABLE Employees (employee_id INTEGER PRIMARY KEY, name TEXT NOT NULL, email TEXT NOT NULL);
+            CREATE TABLE Laptops (asset_tag INTEGER NOT NULL, model TEXT NOT NULL, description TEXT NOT NULL);
+            CREATE TABLE Transactions (
+                transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_id INTEGER NOT NULL, asset_tag INTEGER NOT NULL, issue TEXT NOT NULL,
+                check_in_time DATETIME DEFAULT CURRENT_TIMESTAMP, check_out_time DATETIME,
+                status TEXT DEFAULT 'Checked-In'
+            );
+        """)
+
+    legacy = Counters()
+    start = time.perf_counter()
+    for i in range(n):
+        legacy_flow(legacy, 1000 + i % 50, 50000 + i, "Hardware Failure: bench")
+    report("legacy", legacy, n, time.perf_counter() - start, "delete/FULL")
+
+    pooled = Counters()
+    database.get_pool().close()
+    instrument_pool(pooled)
+    start = time.perf_counter()
+    for i in range(n):
+        pooled_flow(1000 + i % 50, 50000 + i, "Hardware Failure: bench")
+    report("pooled", pooled, n, time.perf_counter() - start, "wal/NORMAL")
+
+
+if __name__ == "__main__":
+    main()
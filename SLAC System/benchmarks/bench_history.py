@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard history render cost: full completed-transactions load vs keyset pages.
+
+For each history size, times one render of the old path (load every completed
+row, cast to str, len(df)) and of the new one (one page plus the counter
+total), and reports the peak Python memory of each.  "pages 1-20" walks
+twenty pages to show that deep pages cost the same as the first.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import database
+from benchmarks.seed import seed
+
+
+def full_render():
+    df = database.view_completed_transactions()
+    for column in ("transaction_id", "employee_id", "asset_tag"):
+        df[column] = df[column].astype(str)
+    return len(df)
+
+
+def page_render(page_size, start=None, end=None, depth=1):
+    cursor = None
+    for _ in range(depth):
+        page = database.page_transactions("Checked-Out", start, end, cursor, page_size)
+        cursor = database.page_cursor(page)
+    return database.count_transactions("Checked-Out", start, end)
+
+
+def measure(fn, *args):
+    """Wall time of one call, then peak allocations of a second traced call."""
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="slac_history_")
+    last_month = (date.today() - timedelta(days=30), date.today())
+    for n in args.sizes:
+        path = os.path.join(tmpdir, f"history_{n}.db")
+        database.configure_pool(path)
+        database.migrate()
+        seed(path, transactions=n)
+        print(f"\n== {n} transactions ==")
+        cases = [
+            ("full load", full_render),
+            ("first page", page_render, args.page_size),
+            ("pages 1-20", page_render, args.page_size, None, None, 20),
+            ("last 30 days", page_render, args.page_size, *last_month),
+        ]
+        for name, fn, *fn_args in cases:
+            ms, mb = measure(fn, *fn_args)
+            print(f"{name:<14} {ms:9.2f}ms  peak={mb:8.2f}MB")
+
+
+if __name__ == "__main__":
+    main()
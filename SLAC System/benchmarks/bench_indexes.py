@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard query plans and timings before and after the index migration.
+
+Seeds a scratch database on the original schema (version 1, duplicate Laptops
+rows included), times the hot queries, then migrates to the latest version
+and times them again.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import database
+from benchmarks.seed import seed
+
+QUERIES = {
+    "active": """
+        SELECT transaction_id, employee_id, asset_tag, issue, check_in_time
+        FROM Transactions WHERE status='Checked-In' ORDER BY check_in_time DESC
+    """,
+    "completed": """
+        SELECT transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time
+        FROM Transactions WHERE status='Checked-Out' ORDER BY check_out_time DESC
+    """,
+    "completed first 50": """
+        SELECT transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time
+        FROM Transactions WHERE status='Checked-Out' ORDER BY check_out_time DESC LIMIT 50
+    """,
+    "asset history": "SELECT * FROM Transactions WHERE asset_tag = '100042'",
+    "employee history": "SELECT * FROM Transactions WHERE employee_id = 1042",
+}
+
+
+def measure(label, repeat):
+    print(f"\n== {label} (schema v{database.schema_version()}) ==")
+    with database.database_connection() as conn:
+        laptops = conn.execute("SELECT COUNT(*) FROM Laptops").fetchone()[0]
+        print(f"Laptops rows: {laptops}")
+        for name, sql in QUERIES.items():
+            plan = "; ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql))
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                rows = conn.execute(sql).fetchall()
+                best = min(best, time.perf_counter() - start)
+            print(f"{name:<20} rows={len(rows):<8} best={best * 1000:9.2f}ms  plan: {plan}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--transactions", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="slac_idx_"), "bench.db")
+    database.configure_pool(path)
+    database.migrate(target=1)
+    start = time.perf_counter()
+    seed(path, transactions=args.transactions, duplicate_laptops=True)
+    print(f"seeded {args.transactions} transactions in {time.perf_counter() - start:.1f}s")
+
+    measure("before", args.repeat)
+    start = time.perf_counter()
+    database.migrate()
+    print(f"\nmigration took {time.perf_counter() - start:.1f}s")
+    measure("after", args.repeat)
+    print(f"\ndatabase size: {os.path.getsize(path) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Kiosk submit latency, and journal sync throughput after a simulated outage.
+
+Seeds a shared store and times check-ins made straight through
+service.check_in(), as a desk does, against the same check-ins recorded in
+a kiosk journal (kiosk.py).  The store here is a local file, so the direct
+path is its best case; over a network share or to PostgreSQL every direct
+submit also pays the round trips.
+
+Then, for each --batches size, the store goes down (its apply_kiosk_ops
+raises sqlite3.OperationalError, as an unreachable file does) while the
+kiosk journals --entries entries: check-ins of new assets, check-outs of
+some of them, check-outs of transactions the store already had (a third of
+them checked out at another desk meanwhile), and check-ins of assets
+another desk holds.  The store comes back and the journal is synced; the
+first --lost-replies batches commit but their replies are dropped, so they
+are replayed.  Reported: entries per second (the store's transactions plus
+signatures and receipts), the outcomes, and whether the store holds exactly
+one transaction per applied check-in.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import database
+import kiosk
+import service
+from benchmarks.seed import seed
+from signatures import encode_signature
+from storage import get_storage
+
+SIGNATURE = encode_signature({"objects": [{"path": [["M", 20, 30], ["Q", 60, 90, 120, 40], ["L", 300, 110]]}]})
+
+
+class Outage:
+    """The store, unreachable while `down`; the next `lost_replies` batches commit but raise."""
+
+    def __init__(self, store):
+        self.store = store
+        self.down = False
+        self.lost_replies = 0
+        self.batches = 0
+
+    def apply_kiosk_ops(self, ops):
+        if self.down:
+            raise sqlite3.OperationalError("unable to open database file (simulated outage)")
+        results = self.store.apply_kiosk_ops(ops)
+        self.batches += 1
+        if self.lost_replies:
+            self.lost_replies -= 1
+            raise sqlite3.OperationalError("connection lost before the reply (simulated)")
+        return results
+
+
+def percentiles(times):
+    times = sorted(times)
+    return statistics.median(times) * 1000, times[int(len(times) * 0.95)] * 1000
+
+
+def submit_latency(journal, n, first_tag):
+    """(direct, journalled) per-submit seconds for n check-ins each."""
+    direct, journalled = [], []
+    for i in range(n):
+        start = time.perf_counter()
+        service.check_in(5000 + i % 100, first_tag + i, "Hardware Failure: kiosk bench", "Bench User",
+                         "bench@example.com", SIGNATURE)
+        direct.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        journal.check_in(5000 + i % 100, first_tag + n + i, "Hardware Failure: kiosk bench", "Bench User",
+                         "bench@example.com", SIGNATURE)
+        journalled.append(time.perf_counter() - start)
+    return direct, journalled
+
+
+def outage(journal, store, entries, first_tag, rng):
+    """Journal `entries` entries while the store is down; returns the expected applied check-ins."""
+    # Transactions the store has before the outage, and assets another desk holds
+    held = [service.check_in(7000 + i, first_tag + i, "Other: checked in at the desk").transaction
+            for i in range(entries // 10 + entries // 20)]
+    to_check_out, taken = held[:entries // 10], held[entries // 10:]
+    store.down = True
+    open_refs, applied_check_ins, tag = [], 0, first_tag + len(held)
+    for i in range(entries):
+        roll = rng.random()
+        if roll < 0.10 and to_check_out:
+            transaction = to_check_out.pop()
+            journal.check_out([transaction.transaction_id], (), SIGNATURE)
+            if rng.random() < 1 / 3:
+                database.check_out(transaction.transaction_id)       # another desk, during the outage
+        elif roll < 0.15 and taken:
+            journal.check_in(8000 + i, taken.pop().asset_tag, "Other: taken at the desk", signature=SIGNATURE)
+        elif roll < 0.40 and open_refs:
+            journal.check_out((), [open_refs.pop(rng.randrange(len(open_refs)))], SIGNATURE)
+        else:
+            tag += 1
+            open_refs.append(journal.check_in(6000 + i % 500, tag, "Software Request: kiosk bench",
+                                              "Kiosk User", "kiosk@example.com", SIGNATURE))
+            applied_check_ins += 1
+    return applied_check_ins
+
+
+def drain(sync, store, lost_replies):
+    """Sync until the journal is empty; returns seconds."""
+    store.down = False
+    store.lost_replies = lost_replies
+    start = time.perf_counter()
+    while True:
+        try:
+            if not sync.sync_once():
+                break
+        except sqlite3.OperationalError:
+            continue            # a lost reply: the entries are still pending and are replayed
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--submits", type=int, default=300)
+    parser.add_argument("--entries", type=int, default=5_000, help="journalled during each outage")
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 20, kiosk.SYNC_BATCH])
+    parser.add_argument("--lost-replies", type=int, default=2)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="slac_kiosk_")
+    database.configure_pool(os.path.join(folder, "store.db"))
+    database.migrate()
+    seed(database.get_pool().path, args.transactions)
+    os.environ.setdefault("SMTP_HOST", "127.0.0.1")      # receipts are queued; no worker sends them
+    print(f"store seeded with {args.transactions:,} transactions")
+
+    journal = kiosk.Journal(os.path.join(folder, "latency.db"))
+    direct, journalled = submit_latency(journal, args.submits, 3_000_000)
+    print(f"check-in submit, median / p95 over {args.submits}: "
+          f"service.check_in {percentiles(direct)[0]:.2f} / {percentiles(direct)[1]:.2f}ms, "
+          f"kiosk journal {percentiles(journalled)[0]:.2f} / {percentiles(journalled)[1]:.2f}ms")
+
+    print(f"{'batch':>6} {'entries':>8} {'ms/entry':>11} {'sync s':>8} {'entries/s':>10} {'batches':>8}  outcomes")
+    for n, batch in enumerate(args.batches):
+        journal = kiosk.Journal(os.path.join(folder, f"journal_{batch}.db"))
+        store = Outage(get_storage())
+        sync = kiosk.KioskSync(journal, store, batch=batch)
+        before = database.count_transactions("Checked-In") + database.count_transactions("Checked-Out")
+        start = time.perf_counter()
+        expected = outage(journal, store, args.entries, 4_000_000 + n * 100_000, random.Random(n))
+        journal_ms = (time.perf_counter() - start) * 1000 / args.entries
+        seconds = drain(sync, store, args.lost_replies)
+
+        with journal.lock:
+            counts = journal.conn.execute("SELECT kind, outcome, COUNT(*) FROM KioskJournal GROUP BY 1, 2").fetchall()
+            unsettled = journal.conn.execute("SELECT COUNT(*) FROM KioskJournal WHERE state <> 'done'").fetchone()[0]
+        outcomes = {}
+        for kind, outcome, count in counts:
+            outcomes[outcome] = outcomes.get(outcome, 0) + count
+        applied = sum(count for kind, outcome, count in counts if (kind, outcome) == ("check_in", "applied"))
+        added = (database.count_transactions("Checked-In") + database.count_transactions("Checked-Out")
+                 - before - args.entries // 10 - args.entries // 20)
+        print(f"{batch:>6} {args.entries:>8,} {journal_ms:>11.2f} {seconds:>8.2f} {args.entries / seconds:>10,.0f} "
+              f"{store.batches:>8}  {', '.join(f'{k} {v}' for k, v in sorted(outcomes.items()))}")
+        print(f"{'':>6} {expected:,} check-ins journalled, {applied:,} applied, {added:,} transactions added, "
+              f"{unsettled} unsettled after {args.lost_replies} lost replies: "
+              + ("no duplicates" if added == applied == expected and not unsettled else "MISMATCH"))
+        journal.close()
+
+
+if __name__ == "__main__":
+    main()
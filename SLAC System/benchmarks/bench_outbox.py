@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Submit latency with inline receipt email vs the outbox, against a slow SMTP sink.
+
+"inline" renders and sends the receipt inside the submit call like the old
+button handler; "outbox" only enqueues, and the background worker drains the
+queue.  A second outbox run has the sink reject every third message to show
+retries with backoff.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import database
+import outbox
+from benchmarks.smtp_sink import SMTPSink
+
+
+def submit_inline(details):
+    import receipts
+    receipts.deliver_receipt(details[0], "Check-In")
+
+
+def submit_outbox(details):
+    outbox.enqueue(details[0], "Check-In")
+
+
+def run(label, submit, n, delay, fail_every=0):
+    with SMTPSink(delay=delay, fail_every=fail_every) as sink:
+        os.environ["SMTP_PORT"] = str(sink.address[1])
+        path = os.path.join(tempfile.mkdtemp(prefix="slac_outbox_"), "outbox.db")
+        database.configure_pool(path, size=8)
+        database.tables()
+
+        import receipts
+        worker = None
+        if submit is submit_outbox:
+            worker = outbox.start_worker(receipts.deliver_receipt, poll_interval=0.05,
+                                         deliver_batch=receipts.deliver_receipts)
+
+        submit_times = []
+        start = time.perf_counter()
+        for i in range(n):
+            details = database.record_check_in(3000 + i, 700000 + i, "Hardware Failure: outbox bench",
+                                               "Bench User", f"bench{i}@example.com")
+            t0 = time.perf_counter()
+            submit(details)
+            submit_times.append(time.perf_counter() - t0)
+        submitted = time.perf_counter() - start
+
+        max_depth = 0
+        if worker:
+            while True:
+                stats = outbox.outbox_stats()
+                max_depth = max(max_depth, stats["pending"])
+                if stats["pending"] == 0:
+                    break
+                time.sleep(0.02)
+            outbox.stop_worker()
+        drained = time.perf_counter() - start
+
+        stats = outbox.outbox_stats()
+        print(f"{label:<22} submit p50={statistics.median(submit_times) * 1000:8.2f}ms  "
+              f"max={max(submit_times) * 1000:8.2f}ms  all submitted in {submitted:6.2f}s  "
+              f"all delivered in {drained:6.2f}s")
+        if worker:
+            print(f"{'':<22} max queue depth={max_depth}  sent={stats['sent']}  failed={stats['failed']}  "
+                  f"rejected by sink={sink.rejected}  send latency p50={stats['latency_p50']:.2f}s "
+                  f"p90={stats['latency_p90']:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--receipts", type=int, default=40)
+    parser.add_argument("--smtp-delay", type=float, default=0.25, help="seconds the sink stalls per message")
+    args = parser.parse_args()
+
+    os.environ.update({"SMTP_HOST": "127.0.0.1", "SMTP_USE_TLS": "0"})
+    outbox.BASE_DELAY = 0.05      # keep the retry run short
+    run("inline", submit_inline, args.receipts, args.smtp_delay)
+    run("outbox", submit_outbox, args.receipts, args.smtp_delay)
+    run("outbox, 1/3 rejected", submit_outbox, args.receipts, args.smtp_delay, fail_every=3)
+
+
+if __name__ == "__main__":
+    main()
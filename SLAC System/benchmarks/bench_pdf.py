@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF receipts per second and bytes allocated per receipt.
+
+"legacy" is the old renderer: a fresh FPDF with the logo decoded every time,
+written to a temp file that the mailer reads back and deletes.  "fresh" is
+the same build rendered to bytes, "template" copies the cached static page,
+and "bulk" renders through the process pool used for reprints.  Memory is the
+tracemalloc peak while rendering one receipt.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from fpdf import FPDF
+
+import receipts
+
+TX = (123456, 1042, "100734", "Hardware Failure: screen flickers after waking from sleep",
+      "2026-03-02 09:14:55", "2026-03-03 16:02:11", "Checked-Out")
+
+
+def _fresh_pdf(tx_tuple, emp_name, emp_email, kind):
+    tx_id, employee_id, asset_tag, issue, check_in, check_out, _ = tx_tuple
+    pdf = FPDF()
+    pdf.add_page()
+    if os.path.exists(receipts.logo_path):
+        pdf.image(receipts.logo_path, x=10, y=8, w=30)
+    pdf.set_font("Arial", size=14)
+    pdf.cell(190, 10, txt=f"SLAC Service Desk - {kind} Receipt", ln=True, align='C')
+    pdf.set_font("Arial", size=11)
+    pdf.ln(6)
+    pdf.cell(190, 8, txt=f"Confirmation Number: {receipts.confirmation_code(tx_id)}", ln=True)
+    pdf.cell(190, 8, txt=f"Transaction ID: {tx_id}", ln=True)
+    pdf.cell(190, 8, txt=f"Employee: {emp_name} (ID: {employee_id})", ln=True)
+    pdf.cell(190, 8, txt=f"Employee Email: {emp_email}", ln=True)
+    pdf.cell(190, 8, txt=f"Asset Tag: {asset_tag}", ln=True)
+    pdf.cell(190, 8, txt=f"Issue Type: {receipts.parse_issue_type(issue)}", ln=True)
+    pdf.multi_cell(190, 8, txt=f"Issue Details: {issue}", align='L')
+    pdf.ln(0)
+    pdf.cell(190, 8, txt=f"Check-In Time: {check_in}", ln=True)
+    if kind == "Check-Out" and check_out:
+        pdf.cell(190, 8, txt=f"Check-Out Time: {check_out}", ln=True)
+    return pdf
+
+
+def legacy(n):
+    for _ in range(n):
+        pdf = _fresh_pdf(TX, "Bench User", "bench@example.com", "Check-Out")
+        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+        pdf.output(tmp.name)
+        tmp.close()
+        with open(tmp.name, "rb") as f:
+            f.read()
+        os.remove(tmp.name)
+
+
+def fresh(n):
+    for _ in range(n):
+        bytes(_fresh_pdf(TX, "Bench User", "bench@example.com", "Check-Out").output())
+
+
+def template(n):
+    for _ in range(n):
+        receipts.create_pdf_receipt(TX, "Bench User", "bench@example.com", "Check-Out")
+
+
+def bulk(n):
+    receipts.render_receipts([((TX[0] + i,) + TX[1:], "Bench User", "bench@example.com", "Check-Out")
+                              for i in range(n)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--receipts", type=int, default=500)
+    args = parser.parse_args()
+
+    receipts.create_pdf_receipt(TX, "Bench User", "bench@example.com", "Check-Out")   # warm the template
+    size = len(receipts.create_pdf_receipt(TX, "Bench User", "bench@example.com", "Check-Out")[0])
+    print(f"receipt size: {size} bytes")
+    for fn in (legacy, fresh, template, bulk):
+        start = time.perf_counter()
+        fn(args.receipts)
+        elapsed = time.perf_counter() - start
+
+        line = f"{fn.__name__:<10} {args.receipts / elapsed:8.1f} receipts/s"
+        if fn is not bulk:    # pool workers allocate in other processes
+            tracemalloc.start()
+            fn(1)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            line += f"  peak allocated per receipt={peak / 1024:7.1f} KiB"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
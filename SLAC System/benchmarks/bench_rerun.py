@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard rerun cost with and without the read cache.
+
+Replays the reads of one Dashboard rerun (schema check, active list, first
+history page, history total) many times against a seeded database, with a
+check-in every --write-every reruns, the way widget clicks rerun the page
+between kiosk writes.  "uncached" is the old behaviour, where every rerun
+also took the write lock to run the schema script.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import database
+import datacache
+from benchmarks.seed import seed
+
+active = datacache.cached(database.view_active_transactions)
+page = datacache.cached(database.page_transactions)
+count = datacache.cached(database.count_transactions)
+
+
+def rerun_uncached():
+    with database.unit_of_work():       # old tables(): schema script under the write lock
+        pass
+    database.view_active_transactions()
+    database.page_transactions("Checked-Out", None, None, None, 50)
+    database.count_transactions("Checked-Out")
+
+
+def rerun_cached():
+    active()
+    page("Checked-Out", None, None, None, 50)
+    count("Checked-Out")
+
+
+def run(label, rerun, reruns, write_every):
+    times = []
+    before = datacache.cache_stats()
+    for i in range(reruns):
+        if write_every and i % write_every == 0:
+            database.record_check_in(1000 + i % 5000, 900000 + i, "Other: rerun bench")
+        start = time.perf_counter()
+        rerun()
+        times.append(time.perf_counter() - start)
+    stats = datacache.stats_since(before)
+    lookups = stats["hits"] + stats["misses"]
+    hit_rate = f"{stats['hits'] / lookups:6.1%}" if lookups else "     —"
+    print(f"{label:<10} mean={statistics.mean(times) * 1000:7.2f}ms/rerun  "
+          f"p50={statistics.median(times) * 1000:7.2f}ms  hit rate={hit_rate}  "
+          f"saved={stats['saved'] * 1000 / reruns:6.2f}ms/rerun")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--reruns", type=int, default=500)
+    parser.add_argument("--write-every", type=int, default=10, help="0 = no writes")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="slac_rerun_"), "rerun.db")
+    database.configure_pool(path)
+    database.tables()
+    seed(path, transactions=args.rows)
+
+    run("uncached", rerun_uncached, args.reruns, args.write_every)
+    run("cached", rerun_cached, args.reruns, args.write_every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Continuous scanning throughput and latency without a camera.
+
+Writes a synthetic 30 fps video in which a few asset tags slide into view,
+hold still and leave, then plays it through:
+
+    legacy      the old scan_asset_tags loop: decode every frame on one thread
+    engine/all  ScannerEngine decoding every frame it can get (drops the rest)
+    engine      ScannerEngine with the defaults (every Nth frame or on motion)
+
+Played back in real time (--pace, like a webcam) this shows decode latency
+and dropped frames; with --pace 0 it shows raw frames/sec.  --folder also
+runs the engine over the frames saved as an image folder.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from pyzbar.pyzbar import decode
+
+import scanner
+from benchmarks.bench_scanner import barcode_image
+
+FPS = 30
+
+
+def write_video(path, tags, size=(1280, 720), hold=45, travel=20, gap=30, seed=3):
+    """Each tag slides in for `travel` frames, holds for `hold`, slides out; `gap` empty frames between."""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), FPS, size)
+    background = np.linspace(80, 190, w, dtype=np.float32)[None, :].repeat(h, 0)
+    frames = 0
+
+    def emit(code=None, x=0):
+        nonlocal frames
+        frame = background + rng.normal(0, 6, (h, w))
+        if code is not None:
+            ch, cw = code.shape
+            y = (h - ch) // 2
+            left, right = max(x, 0), min(x + cw, w)
+            if right > left:
+                frame[y:y + ch, left:right] = code[:, left - x:right - x]
+        frame = cv2.cvtColor(np.clip(frame, 0, 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+        writer.write(frame)
+        frames += 1
+
+    for tag in tags:
+        code = barcode_image(tag, module_px=3, height=150)
+        rest = (w - code.shape[1]) // 2
+        for i in range(gap):
+            emit()
+        for i in range(travel):
+            emit(code, -code.shape[1] + (rest + code.shape[1]) * i // travel)
+        for i in range(hold):
+            emit(code, rest)
+        for i in range(travel):
+            emit(code, rest + (w - rest) * i // travel)
+    writer.release()
+    return frames
+
+
+def legacy(source, pace):
+    cap = scanner.open_source(source)
+    latencies, tags, last = [], [], None
+    next_at = time.perf_counter()
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        t0 = time.perf_counter()
+        found = decode(frame)
+        latencies.append(time.perf_counter() - t0)
+        value = found[0].data.decode("utf-8") if found else None
+        if value and value != last:
+            tags.append(value)
+        last = value or last
+        if pace:
+            next_at += pace
+            time.sleep(max(0.0, next_at - time.perf_counter()))
+    cap.release()
+    return {"captured": len(latencies), "decoded": len(latencies), "dropped": 0}, latencies, tags
+
+
+def engine(source, pace, **kwargs):
+    tags = []
+    e = scanner.ScannerEngine(source, on_tag=tags.append, pace=pace, **kwargs).start()
+    e.join()
+    return e.stats, e.latencies, tags
+
+
+def run(label, fn, source, pace, expected, **kwargs):
+    start = time.perf_counter()
+    stats, latencies, tags = fn(source, pace, **kwargs)
+    elapsed = time.perf_counter() - start
+    ms = sorted(x * 1000 for x in latencies) or [0.0]
+    p99 = ms[min(len(ms) - 1, int(len(ms) * 0.99))]
+    print(f"{label:<12} {stats['captured'] / elapsed:7.1f} frames/s  decoded={stats['decoded']:<5} "
+          f"dropped={stats['dropped']:<5} latency p50={statistics.median(ms):6.1f}ms p99={p99:6.1f}ms  "
+          f"tags={len(tags)} ({sum(t in expected for t in set(tags))}/{len(expected)} distinct)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tags", type=int, default=6)
+    parser.add_argument("--pace", type=float, default=1 / FPS, help="seconds per frame; 0 = as fast as possible")
+    parser.add_argument("--folder", action="store_true", help="also run from an image folder")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="slac_scan_")
+    video = os.path.join(folder, "scan.avi")
+    expected = [str(100000 + 7919 * i) for i in range(1, args.tags + 1)]
+    frames = write_video(video, expected)
+    print(f"{frames} frames ({frames / FPS:.1f}s at {FPS} fps), {args.tags} tags, pace={args.pace:.4f}s")
+
+    run("legacy", legacy, video, args.pace, expected)
+    run("engine/all", engine, video, args.pace, expected, decode_every=1, motion_threshold=0)
+    run("engine", engine, video, args.pace, expected)
+
+    if args.folder:
+        images = os.path.join(folder, "frames")
+        os.makedirs(images)
+        cap = cv2.VideoCapture(video)
+        i = 0
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            cv2.imwrite(os.path.join(images, f"{i:05d}.jpg"), frame)
+            i += 1
+        run("folder", engine, images, args.pace, expected)
+
+
+if __name__ == "__main__":
+    main()
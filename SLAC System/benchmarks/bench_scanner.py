@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Barcode decode time and success rate on a synthetic photo corpus.
+
+Generates Code 128 asset tags (no extra packages needed) and pastes them on
+phone-sized noisy backgrounds as JPEGs: clean, blurred, rotated, dim and
+small.  "legacy" is the old Check-In path (full-size colour decode); each
+stage of scanner.STAGES is also timed on its own, and "pipeline" runs them
+in order and stops at the first hit.
+"""
+import argparse
+import statistics
+import time
+
+import cv2
+import numpy as np
+from pyzbar.pyzbar import decode
+
+import scanner
+
+# Code 128 symbol widths (bar, space, bar, ...) for values 0-106; 106 is STOP.
+CODE128_WIDTHS = """
+212222 222122 222221 121223 121322 131222 122213 122312 132212 221213 221312 231212
+112232 122132 122231 113222 123122 123221 223211 221132 221231 213212 223112 312131
+311222 321122 321221 312212 322112 322211 212123 212321 232121 111323 131123 131321
+112313 132113 132311 211313 231113 231311 112133 112331 132131 113123 113321 133121
+313121 211331 231131 213113 213311 213131 311123 311321 331121 312113 312311 332111
+314111 221411 431111 111224 111422 121124 121421 141122 141221 112214 112412 122114
+122411 142112 142211 241211 221114 413111 241112 134111 111242 121142 121241 114212
+124112 124211 411212 421112 421211 212141 214121 412121 111143 111341 131141 114113
+114311 411113 411311 113141 114131 311141 411131 211412 211214 211232 2331112
+""".split()
+START_B = 104
+VARIANTS = ("clean", "blurred", "rotated", "dim", "small")
+
+
+def code128_modules(text):
+    """Bars as a 0/1 list of modules (Code Set B, with quiet zones)."""
+    values = [START_B] + [ord(ch) - 32 for ch in text]
+    checksum = (START_B + sum(i * v for i, v in enumerate(values[1:], 1))) % 103
+    modules = [0] * 10
+    for value in values + [checksum, 106]:
+        for i, width in enumerate(CODE128_WIDTHS[value]):
+            modules += [1 - i % 2] * int(width)
+    return modules + [0] * 10
+
+
+def barcode_image(text, module_px=3, height=120):
+    row = np.array(code128_modules(text), dtype=np.uint8)
+    row = np.repeat(255 - row * 255, module_px)
+    return np.tile(row, (height, 1))
+
+
+def synthetic_photo(text, variant, rng, size=(1440, 1920)):
+    h, w = size
+    photo = np.linspace(90, 200, w, dtype=np.float32)[None, :].repeat(h, 0)
+    photo += rng.normal(0, 12, (h, w))
+    module_px = 2 if variant == "small" else int(rng.integers(4, 8))
+    code = barcode_image(text, module_px, height=40 * module_px)
+    if variant == "rotated":
+        code = scanner.rotate(code, rng.choice([-1, 1]) * rng.uniform(25, 40))
+    ch, cw = code.shape
+    y = int(h / 2 - ch / 2 + rng.uniform(-0.15, 0.15) * h)
+    x = int(w / 2 - cw / 2 + rng.uniform(-0.15, 0.15) * w)
+    photo[y:y + ch, x:x + cw] = code
+    if variant == "blurred":
+        photo = cv2.GaussianBlur(photo, (0, 0), 0.5 * module_px)
+    if variant == "dim":
+        photo = photo * 0.35 + 40
+    photo = np.clip(photo, 0, 255).astype(np.uint8)
+    ok, jpeg = cv2.imencode(".jpg", cv2.cvtColor(photo, cv2.COLOR_GRAY2BGR),
+                            [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return jpeg.tobytes()
+
+
+def corpus(n, seed=7):
+    rng = np.random.default_rng(seed)
+    items = []
+    for i in range(n):
+        tag = str(rng.integers(100000, 1000000))
+        variant = VARIANTS[i % len(VARIANTS)]
+        items.append((variant, tag, synthetic_photo(tag, variant, rng)))
+    return items
+
+
+def legacy(data):
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    found = decode(img)
+    return found[0].data.decode("utf-8") if found else None
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    value = fn(*args)
+    return value, time.perf_counter() - start
+
+
+def report(label, rows):
+    """rows: (variant, ok, seconds)"""
+    times = [s * 1000 for _, _, s in rows]
+    by_variant = "  ".join(
+        f"{v}={sum(ok for var, ok, _ in rows if var == v)}/{sum(var == v for var, _, _ in rows)}"
+        for v in VARIANTS
+    )
+    print(f"{label:<12} mean={statistics.mean(times):7.1f}ms  p50={statistics.median(times):7.1f}ms  "
+          f"max={max(times):7.1f}ms  hits={sum(ok for _, ok, _ in rows)}/{len(rows)}  {by_variant}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--images", type=int, default=50)
+    args = parser.parse_args()
+
+    items = corpus(args.images)
+    print(f"{len(items)} photos, {statistics.mean(len(d) for _, _, d in items) / 1024:.0f} KiB JPEG on average")
+
+    report("legacy", [(v, value == tag, s) for v, tag, d in items for value, s in [timed(legacy, d)]])
+
+    grays = [(v, tag, cv2.imdecode(np.frombuffer(d, np.uint8), cv2.IMREAD_GRAYSCALE)) for v, tag, d in items]
+    for name, stage in scanner.STAGES:
+        report(f"  {name}", [(v, value == tag, s) for v, tag, g in grays for value, s in [timed(stage, g)]])
+
+    rows, firsts = [], {}
+    for v, tag, d in items:
+        result = scanner.decode_asset_tag(d)
+        rows.append((v, result.value == tag, result.seconds))
+        firsts[result.stage] = firsts.get(result.stage, 0) + 1
+    report("pipeline", rows)
+    print(f"{'':<12} first hit by stage: " + "  ".join(f"{k}={n}" for k, n in firsts.items()))
+    report("cached", [(v, value.value == tag, s) for v, tag, d in items
+                      for value, s in [timed(scanner.decode_asset_tag, d)]])
+
+
+if __name__ == "__main__":
+    main()
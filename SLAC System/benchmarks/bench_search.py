@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Search box cost per keystroke: pandas scans vs the trigram index.
+
+"apply" is the old Check-Out filter (row-wise lambda over five columns) and
+"contains" the old Dashboard filter (str.contains on employee_id/asset_tag).
+Both are timed over already-loaded active and completed frames, so the
+re-query the old pages also paid on each keystroke is not even counted.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import database
+from benchmarks.seed import seed
+
+QUERIES = ["fan", "1004", "patel", "vpn client", "zz"]
+
+
+def apply_scan(df, search):
+    s = search.lower()
+    return df[df.apply(
+        lambda row: s in str(row["transaction_id"]).lower()
+        or s in str(row["asset_tag"]).lower()
+        or s in str(row["employee_id"]).lower()
+        or s in str(row["issue"]).lower()
+        or s in str(row["check_in_time"]).lower(),
+        axis=1
+    )]
+
+
+def contains_scan(df, search):
+    return df[
+        df["employee_id"].astype(str).str.contains(search, case=False, na=False) |
+        df["asset_tag"].astype(str).str.contains(search, case=False, na=False)
+    ]
+
+
+def best_of(repeat, fn, *args):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-apply-above", type=int, default=200_000,
+                        help="row-wise apply takes minutes on big frames; skip it above this many rows")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="slac_search_")
+    for n in args.sizes:
+        path = os.path.join(tmpdir, f"search_{n}.db")
+        database.configure_pool(path)
+        database.migrate()
+        start = time.perf_counter()
+        seed(path, transactions=n)
+        print(f"\n== {n} transactions (seeded in {time.perf_counter() - start:.1f}s) ==")
+        frames = {
+            "Checked-In": database.view_active_transactions(),
+            "Checked-Out": database.view_completed_transactions(),
+        }
+        for status, df in frames.items():
+            print(f"-- {status}: {len(df)} rows")
+            for q in QUERIES:
+                line = f"{q!r:<13}"
+                if len(df) <= args.skip_apply_above:
+                    ms, hits = best_of(args.repeat, apply_scan, df, q)
+                    line += f" apply={ms:9.2f}ms ({hits:>6})"
+                else:
+                    line += f" apply={'skipped':>9}            "
+                ms, hits = best_of(args.repeat, contains_scan, df, q)
+                line += f"  contains={ms:8.2f}ms ({hits:>6})"
+                ms, hits = best_of(args.repeat, database.search_transactions, q, status)
+                line += f"  index={ms:7.2f}ms ({hits:>4}, top 200)"
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
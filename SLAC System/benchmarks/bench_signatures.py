@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Signature storage: bytes per signature and write latency.
+
+Generates freedraw signatures shaped like st_canvas output (fabric.js
+json_data paths plus the 400x150 RGBA image_data) and stores each one:
+
+    png-file    the old path: RGB PNG of the canvas written to signatures/
+    strokes     zlib'd stroke deltas in SignatureBlobs (the default)
+    bitmap      1-bit PNG in SignatureBlobs (used when a canvas has no paths)
+
+Every signature is then stored a second time for another transaction to show
+dedup, and the lazy render for a receipt is timed.
+"""
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import database
+import signatures
+
+
+def fake_signature(rng, width=400, height=150):
+    """(json_data, image_data) for a few wavy strokes across the canvas."""
+    objects = []
+    img = Image.new("RGBA", (width, height), (255, 255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    x = rng.uniform(20, 60)
+    for _ in range(int(rng.integers(2, 5))):
+        n = int(rng.integers(40, 120))
+        xs = x + np.cumsum(rng.uniform(0.5, 3.5, n))
+        ys = height / 2 + np.cumsum(rng.normal(0, 3, n)) + 25 * np.sin(np.linspace(0, rng.uniform(3, 9), n))
+        pts = list(zip(np.clip(xs, 1, width - 1).round(1), np.clip(ys, 1, height - 1).round(1)))
+        path = [["M", *pts[0]]]
+        path += [["Q", *pts[i], *((np.add(pts[i], pts[i + 1])) / 2)] for i in range(1, len(pts) - 1)]
+        path.append(["L", *pts[-1]])
+        objects.append({"type": "path", "path": path})
+        draw.line(pts, fill=(0, 0, 0, 255), width=2)
+        x = xs[-1] + rng.uniform(5, 20)
+    return {"objects": objects}, np.asarray(img)
+
+
+def png_file(folder, i, json_data, image_data):
+    rgb = image_data[:, :, :3].astype("uint8")
+    buf = io.BytesIO()
+    Image.fromarray(rgb).save(buf, format="PNG")
+    data = buf.getvalue()
+    with open(os.path.join(folder, f"signature_{i}.png"), "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def strokes(folder, i, json_data, image_data):
+    signature = signatures.encode_signature(json_data, image_data)
+    signatures.save_signature(i, "Check-In", signature)
+    return len(signature[3])
+
+
+def bitmap(folder, i, json_data, image_data):
+    signature = signatures.encode_signature(None, image_data)
+    signatures.save_signature(i, "Check-Out", signature)
+    return len(signature[3])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--signatures", type=int, default=300)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="slac_sig_")
+    database.configure_pool(os.path.join(folder, "sig.db"))
+    database.tables()
+    rng = np.random.default_rng(11)
+    samples = [fake_signature(rng) for _ in range(args.signatures)]
+
+    for fn in (png_file, strokes, bitmap):
+        sizes, times = [], []
+        for i, (json_data, image_data) in enumerate(samples, 1):
+            t0 = time.perf_counter()
+            sizes.append(fn(folder, i, json_data, image_data))
+            times.append(time.perf_counter() - t0)
+        print(f"{fn.__name__:<10} {statistics.mean(sizes):8.0f} B/signature  "
+              f"write p50={statistics.median(times) * 1000:6.2f}ms  max={max(times) * 1000:6.2f}ms")
+
+    # Same signatures again for new transactions: only link rows are added
+    for i, (json_data, _) in enumerate(samples, 1):
+        signatures.save_signature(args.signatures + i, "Check-In", signatures.encode_signature(json_data))
+    with database.database_connection() as conn:
+        blobs, blob_bytes = conn.execute("SELECT COUNT(*), SUM(LENGTH(data)) FROM SignatureBlobs").fetchone()
+        links = conn.execute("SELECT COUNT(*) FROM TransactionSignatures").fetchone()[0]
+    print(f"dedup      {links} transaction signatures -> {blobs} blobs, {blob_bytes} bytes")
+
+    first = signatures.decode_strokes(signatures.load_signature(1)[3])[1]
+    assert first == signatures.canvas_strokes(samples[0][0]), "stroke round trip failed"
+    times = []
+    for i in range(1, min(args.signatures, 100) + 1):
+        t0 = time.perf_counter()
+        signatures.signature_png(i)
+        times.append(time.perf_counter() - t0)
+    print(f"render     p50={statistics.median(times) * 1000:6.2f}ms per receipt (only when one is sent)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SMTP messages per second: connection per message vs pooled sessions.
+
+Sends the same receipt-sized message N times to a local sink.  "per-message"
+is the old send path (new certifi TLS context, connect, STARTTLS, send, QUIT
+every time); "session" borrows a pooled connection for each message; "batch"
+sends all N on one borrowed session.  Pass --plain to skip STARTTLS.
+"""
+import argparse
+import os
+import smtplib
+import ssl
+import time
+
+import certifi
+
+import receipts
+from benchmarks.smtp_sink import SMTPSink, self_signed_cert
+
+
+def per_message(msg, recipients, settings, certfile, n):
+    for _ in range(n):
+        tls_ctx = ssl.create_default_context(cafile=certifi.where())
+        if certfile:
+            tls_ctx.load_verify_locations(certfile)
+        server = smtplib.SMTP(settings.host, settings.port, timeout=20)
+        if settings.use_tls:
+            server.starttls(context=tls_ctx)
+        server.sendmail(settings.sender, recipients, msg.as_string())
+        server.quit()
+
+
+def session(msg, recipients, settings, certfile, n):
+    for _ in range(n):
+        with receipts.smtp_session() as s:
+            s.send(msg, recipients)
+
+
+def batch(msg, recipients, settings, certfile, n):
+    with receipts.smtp_session() as s:
+        for _ in range(n):
+            s.send(msg, recipients)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--messages", type=int, default=300)
+    parser.add_argument("--plain", action="store_true", help="no STARTTLS")
+    args = parser.parse_args()
+
+    certfile, keyfile = (None, None) if args.plain else self_signed_cert()
+    with SMTPSink(certfile=certfile, keyfile=keyfile) as sink:
+        os.environ.update({
+            "SMTP_HOST": "127.0.0.1",
+            "SMTP_PORT": str(sink.address[1]),
+            "SMTP_USE_TLS": "0" if args.plain else "1",
+        })
+        if certfile:
+            receipts.tls_context().load_verify_locations(certfile)
+        settings = receipts.smtp_settings()
+
+        msg, recipients = receipts.build_message(settings.sender, "bench@example.com", "Receipt",
+                                                 "<p>bench</p>", os.urandom(2500), "receipt.pdf")
+
+        for fn in (per_message, session, batch):
+            connections, accepted = sink.connections, sink.accepted
+            start = time.perf_counter()
+            fn(msg, recipients, settings, certfile, args.messages)
+            elapsed = time.perf_counter() - start
+            print(f"{fn.__name__:<12} {args.messages / elapsed:8.1f} msg/s  "
+                  f"connections={sink.connections - connections:<5} delivered={sink.accepted - accepted}")
+
+
+if __name__ == "__main__":
+    main()
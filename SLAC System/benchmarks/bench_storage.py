@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Same workload against each storage backend: results, then desk throughput.
+
+First a fixed script of upserts, check-ins, check-outs and reads runs on a
+scratch SQLite file and, with --postgres URL, in a scratch schema of that
+PostgreSQL database (dropped afterwards).  Their results are compared
+field by field; times are left out because they come from the clock.
+Then --desks threads each check laptops in and out back to back, and the
+check-ins/sec and p50/p99 latency per backend are reported.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import storage
+
+TIME_COLUMNS = ("check_in_time", "check_out_time")
+
+
+def scratch_schema_url(url, schema):
+    from psycopg.conninfo import make_conninfo
+    return make_conninfo(url, options=f"-c search_path={schema}")
+
+
+def comparable(value):
+    """Results with clock times reduced to 'set or not'."""
+    if hasattr(value, "to_dict"):
+        frame = value.copy()
+        for column in TIME_COLUMNS:
+            if column in frame:
+                frame[column] = frame[column].notna()
+        return [tuple(map(str, row)) for row in frame.itertuples(index=False, name=None)]
+    if isinstance(value, tuple) and len(value) == 7:
+        return tuple(str(v) if i not in (4, 5) else v is not None for i, v in enumerate(value))
+    return value
+
+
+def conformance(backend):
+    """Run the fixed script and return every result, in order."""
+    backend.tables()
+    results = []
+    for i in range(20):
+        backend.upsert_employee(1000 + i, f"Employee {i}", f"e{i}@example.com")
+    backend.ensure_employee_exists(1999)
+    backend.ensure_laptop_exists(555000)
+    ids = []
+    for i in range(60):
+        row = backend.record_check_in(1000 + i % 25, 700000 + i, f"Hardware Failure: unit {i}",
+                                      "" if i % 3 else f"Renamed {i}", "" if i % 3 else f"r{i}@example.com")
+        results.append(comparable(row))
+        ids.append(row[0])
+    for tx_id in ids[::3]:
+        results.append(backend.check_out(tx_id))
+    results.append(backend.check_out(ids[0]))            # already checked out
+    results.append(backend.check_out(10 ** 9))           # no such transaction
+    results.append(comparable(backend.get_transaction_details(ids[5])))
+    results.append(backend.get_transaction_details(10 ** 9))
+    results.append(backend.get_employee_meta(1003))
+    results.append(backend.get_employee_meta(1999))
+    results.append(backend.get_employee_meta(424242))
+    results.append(sorted(comparable(backend.view_active_transactions())))   # ties within a second
+    results.append(sorted(comparable(backend.view_completed_transactions())))
+    for status in ("Checked-In", "Checked-Out"):
+        results.append(backend.count_transactions(status))
+        results.append(backend.count_transactions(status, "2000-01-01", "2999-12-31"))
+        results.append(backend.count_transactions(status, "2999-01-01"))
+        results.append(comparable(backend.page_transactions(status, page_size=10)))
+    for query, status in (("unit 1", None), ("7000", "Checked-In"), ("renamed", "Checked-Out"), ("zz", None)):
+        results.append(sorted(comparable(backend.search_transactions(query, status, limit=None))))
+    results.append(comparable(backend.checkins_per_hour(48)))
+    results.append(comparable(backend.checkins_per_day(3)))
+    results.append(comparable(backend.turnaround_by_issue().round(6)))
+    results.append(comparable(backend.repeat_assets(min_visits=1).drop(columns="last_check_in")))
+    return results
+
+
+def throughput(backend, desks, per_desk):
+    latencies = []
+    lock = threading.Lock()
+
+    def desk(d):
+        mine = []
+        for i in range(per_desk):
+            start = time.perf_counter()
+            row = backend.record_check_in(5000 + d, 800000 + d * per_desk + i, "Other: desk load")
+            backend.check_out(row[0])
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=desk, args=(d,)) for d in range(desks)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"{backend.name:<10} desks={desks:<3} check-ins/sec={len(latencies) / elapsed:8.1f}  "
+          f"p50={statistics.median(latencies) * 1000:6.2f}ms  "
+          f"p99={latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--postgres", help="postgresql:// URL; a scratch schema is created and dropped")
+    parser.add_argument("--desks", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--per-desk", type=int, default=200)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="slac_storage_")
+    backends = [lambda: storage.configure_storage(os.path.join(folder, "storage.db"))]
+    schema = f"slac_bench_{os.getpid()}"
+    if args.postgres:
+        import psycopg
+        with psycopg.connect(args.postgres, autocommit=True) as conn:
+            conn.execute(f"CREATE SCHEMA {schema}")
+        backends.append(lambda: storage.PostgresStorage(scratch_schema_url(args.postgres, schema)))
+
+    try:
+        reference = None
+        for open_backend in backends:
+            backend = open_backend()
+            results = conformance(backend)
+            if reference is None:
+                reference = results
+                print(f"{backend.name:<10} ran {len(results)} checks")
+            else:
+                mismatches = [i for i, (a, b) in enumerate(zip(reference, results)) if a != b]
+                print(f"{backend.name:<10} ran {len(results)} checks: "
+                      + (f"MISMATCH at {mismatches}" if mismatches else "same results as sqlite"))
+            for desks in args.desks:
+                throughput(backend, desks, args.per_desk)
+            backend.close()
+    finally:
+        storage.configure_storage("")
+        if args.postgres:
+            with psycopg.connect(args.postgres, autocommit=True) as conn:
+                conn.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cost of the tracing layer, switched off and on.
+
+First the per-call overhead of @traced and span() on an empty function,
+against calling it undecorated.  Then the real service path (check-in,
+check-out, receipt lookup) on a scratch database with tracing off, on, and
+on with every tree also written as a JSON log line.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import tracing
+
+
+def empty():
+    return None
+
+
+def per_call_ns(fn, calls, repeat=5):
+    best = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best.append((time.perf_counter() - start) / calls * 1e9)
+    return min(best)
+
+
+def with_span():
+    with tracing.span("bench.block"):
+        return None
+
+
+def service_path(operations):
+    import service
+    times = []
+    for i in range(operations):
+        start = time.perf_counter()
+        with tracing.span("bench.request"):
+            outcome = service.check_in(3000 + i % 50, 600000 + i, "Other: tracing bench")
+            service.check_out(outcome.transaction.transaction_id)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--operations", type=int, default=1000)
+    args = parser.parse_args()
+
+    traced_empty = tracing.traced("bench.empty")(empty)
+    plain = per_call_ns(empty, args.calls)
+    for on in (False, True):
+        tracing.enable(on)
+        print(f"tracing {'on ' if on else 'off'}  plain call={plain:6.0f}ns  "
+              f"@traced={per_call_ns(traced_empty, args.calls) - plain:+7.0f}ns  "
+              f"span()={per_call_ns(with_span, args.calls) - plain:+7.0f}ns")
+
+    folder = tempfile.mkdtemp(prefix="slac_tracing_")
+    import database
+    import service
+    database.configure_pool(os.path.join(folder, "tracing.db"))
+    service.start_backend()
+    service_path(100)                      # warm up the pool and the statement cache
+    runs = [("off", False, None), ("on", True, None),
+            ("on + JSON log", True, os.path.join(folder, "trace.jsonl"))]
+    for label, on, log_path in runs:
+        tracing.enable(on)
+        if log_path:
+            tracing.log_to_file(log_path)
+        tracing.reset()
+        ms = service_path(args.operations)
+        logged = sum(1 for _ in open(log_path)) if log_path else 0
+        print(f"check-in + check-out, tracing {label:<14} median={ms:6.3f}ms"
+              + (f"  ({logged} JSON lines)" if log_path else ""))
+
+
+if __name__ == "__main__":
+    main()
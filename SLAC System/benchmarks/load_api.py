@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP load test for api.py: many concurrent kiosks posting check-ins.
+
+Starts the API under uvicorn against a scratch database, then runs asyncio
+clients (one keep-alive connection each) that POST /check-ins back to back;
+with --check-out each client also checks its laptop back out.  Reports
+p50/p99 request latency and check-ins/sec per concurrency level.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: kiosk\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length)) if length else None
+
+
+async def kiosk(port, k, per_client, check_out, latencies, errors):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for i in range(per_client):
+            start = time.perf_counter()
+            status, body = await request(reader, writer, "POST", "/check-ins", {
+                "employee_id": 2000 + k, "asset_tag": str(100000 * (k + 1) + i),
+                "issue": "Performance Issue: api load test",
+                "name": "Kiosk", "email": "kiosk@example.com",
+            })
+            latencies.append(time.perf_counter() - start)
+            if status != 201:
+                errors.append(status)
+                continue
+            if check_out:
+                start = time.perf_counter()
+                status, _ = await request(reader, writer, "POST", "/check-outs",
+                                          {"transaction_id": body["transaction"]["transaction_id"]})
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run(port, clients, per_client, check_out):
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(kiosk(port, k, per_client, check_out, latencies, errors) for k in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000
+    print(f"clients={clients:<4} check-ins/sec={clients * per_client / elapsed:8.1f}  "
+          f"requests/sec={len(latencies) / elapsed:8.1f}  p50={p50:7.2f}ms  p99={p99:7.2f}ms  "
+          f"errors={len(errors)}")
+
+
+async def wait_until_up(port, server, log_path, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"API server exited during startup; see {log_path}")
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            await asyncio.sleep(0.2)
+            continue
+        status, _ = await request(reader, writer, "GET", "/health")
+        writer.close()
+        if status == 200:
+            return
+    raise SystemExit(f"API server did not come up; see {log_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--per-client", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--check-out", action="store_true", help="check each laptop back out")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="slac_api_")
+    env = dict(os.environ, SLAC_DB_PATH=os.path.join(folder, "api.db"))
+    env.pop("SMTP_HOST", None)     # receipts are reported as skipped, not sent
+    log_path = os.path.join(folder, "server.log")
+    with open(log_path, "wb") as log:
+        server = subprocess.Popen(
+            [sys.executable, "api.py", "--port", str(args.port), "--workers", str(args.workers)],
+            cwd=APP_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    try:
+        asyncio.run(wait_until_up(args.port, server, log_path))
+        for clients in args.clients:
+            asyncio.run(run(args.port, clients, args.per_client, args.check_out))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
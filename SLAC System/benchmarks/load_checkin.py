@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Concurrent kiosk load test: step-by-step check-in vs the single-transaction pipeline.
+
+Each kiosk is a thread submitting check-ins back to back against a scratch
+database.  The "steps" flow replays the old Confirm Check-In sequence (one
+commit per helper); the "atomic" flow calls record_check_in().
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import database
+
+
+def steps_flow(employee_id, asset_tag, issue):
+    database.ensure_employee_exists(employee_id, "Kiosk", "kiosk@example.com")
+    database.ensure_laptop_exists(asset_tag)
+    database.ensure_laptop_exists(asset_tag)
+    database.ensure_employee_exists(employee_id)
+    with database.database_connection() as conn:
+        tx_id = conn.execute(
+            "INSERT INTO Transactions (employee_id, asset_tag, issue) VALUES (?, ?, ?)",
+            (employee_id, str(asset_tag), issue)
+        ).lastrowid
+    details = database.get_transaction_details(tx_id)
+    database.upsert_employee(employee_id, "Kiosk", "kiosk@example.com")
+    return details
+
+
+def atomic_flow(employee_id, asset_tag, issue):
+    return database.record_check_in(employee_id, asset_tag, issue, "Kiosk", "kiosk@example.com")
+
+
+def run(flow, path, kiosks, per_kiosk):
+    database.configure_pool(path, size=kiosks)
+    database.tables()
+    latencies = []
+    lock = threading.Lock()
+
+    def kiosk(k):
+        mine = []
+        for i in range(per_kiosk):
+            start = time.perf_counter()
+            flow(2000 + k, 100000 * (k + 1) + i, "Performance Issue: load test")
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=kiosk, args=(k,)) for k in range(kiosks)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{flow.__name__:<12} kiosks={kiosks:<3} check-ins/sec={len(latencies) / elapsed:8.1f}  "
+          f"p50={p50:6.2f}ms  p99={p99:6.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--kiosks", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--per-kiosk", type=int, default=200)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="slac_load_")
+    for kiosks in args.kiosks:
+        for flow in (steps_flow, atomic_flow):
+            run(flow, os.path.join(tmpdir, f"{flow.__name__}_{kiosks}.db"), kiosks, args.per_kiosk)
+
+
+if __name__ == "__main__":
+    main()
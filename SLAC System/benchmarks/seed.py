@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic data generator for checkin_system.db.
+
+Rows are generated deterministically from a seed so runs are comparable.
+
+    python -m benchmarks.seed scratch.db --transactions 250000 --employees 8000
+"""
+import argparse
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+ISSUE_TYPES = ["Hardware Failure", "Software Request", "Performance Issue", "Account Lockout", "Other"]
+ISSUE_DETAILS = [
+    "screen flickers after sleep", "needs VPN client reinstall", "fan very loud",
+    "battery drains in an hour", "locked out after password change", "keyboard keys sticking",
+    "install MATLAB license", "slow boot", "wifi drops on site", "docking station not detected",
+]
+FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey", "Riley", "Jamie", "Avery", "Quinn"]
+LAST_NAMES = ["Lee", "Patel", "Garcia", "Nguyen", "Smith", "Kim", "Chen", "Lopez", "Brown", "Singh"]
+
+
+def fast_connection(path):
+    """Bulk-load connection: durability is irrelevant for scratch databases."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-64000")
+    return conn
+
+
+def generate_transactions(n, employees, laptops, active_ratio, years, seed, end=None):
+    """Yield Transactions rows in check-in order, ending at `end` (default: now)."""
+    rng = random.Random(seed)
+    end = end or datetime.now().replace(microsecond=0)
+    start = end - timedelta(days=365 * years)
+    span = (end - start).total_seconds()
+    step = span / max(n, 1)
+    for i in range(n):
+        check_in = start + timedelta(seconds=i * step + rng.random() * step)
+        issue = f"{rng.choice(ISSUE_TYPES)}: {rng.choice(ISSUE_DETAILS)}"
+        # The newest rows are the ones still at the desk
+        active = i >= n * (1 - active_ratio) and rng.random() < 0.9
+        if active:
+            check_out, status = None, "Checked-In"
+        else:
+            check_out = min(check_in + timedelta(hours=rng.lognormvariate(2.5, 1.0)), end)
+            check_out, status = check_out.isoformat(sep=" "), "Checked-Out"
+        yield (
+            i + 1,
+            1000 + rng.randrange(employees),
+            str(100000 + rng.randrange(laptops)),
+            issue,
+            check_in.isoformat(sep=" "),
+            check_out,
+            status,
+        )
+
+
+def seed(path, transactions=100_000, employees=5_000, laptops=20_000, active_ratio=0.02,
+         years=3, duplicate_laptops=False, random_seed=42, batch=50_000):
+    """Fill an already-migrated database at `path` with synthetic rows.
+
+    duplicate_laptops reproduces the pre-migration bug where every check-in
+    added another Laptops row.
+    """
+    rng = random.Random(random_seed)
+    conn = fast_connection(path)
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO Employees (employee_id, name, email) VALUES (?, ?, ?)",
+            (
+                (1000 + i, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", f"user{1000 + i}@example.com")
+                for i in range(employees)
+            ),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO Laptops (asset_tag, model, description) VALUES (?, '', '')",
+            ((str(100000 + i),) for i in range(laptops)),
+        )
+
+    rows = generate_transactions(transactions, employees, laptops, active_ratio, years, random_seed)
+    while True:
+        chunk = [row for _, row in zip(range(batch), rows)]
+        if not chunk:
+            break
+        with conn:
+            conn.executemany("""
+                INSERT INTO Transactions
+                    (transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, chunk)
+            if duplicate_laptops:
+                conn.executemany(
+                    "INSERT INTO Laptops (asset_tag, model, description) VALUES (?, '', '')",
+                    ((row[2],) for row in chunk),
+                )
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="database file; created and migrated if missing")
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--employees", type=int, default=5_000)
+    parser.add_argument("--laptops", type=int, default=20_000)
+    parser.add_argument("--active-ratio", type=float, default=0.02)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import database
+    path = os.path.abspath(args.path)
+    database.configure_pool(path)
+    database.migrate()
+    with database.database_connection() as conn:
+        existing = conn.execute("SELECT COUNT(*) FROM Transactions").fetchone()[0]
+    if existing:
+        raise SystemExit(f"{path} already has {existing:,} transactions; seed an empty database")
+    seed(path, args.transactions, args.employees, args.laptops, args.active_ratio, args.years, args.seed)
+    print(f"Seeded {path}: {args.transactions:,} transactions, {args.employees:,} employees, "
+          f"{args.laptops:,} laptops")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local stand-in SMTP server for benchmarks and manual testing.
+
+Speaks just enough SMTP for smtplib.  STARTTLS is offered only when a
+certificate is given (otherwise run the app with SMTP_USE_TLS=0); AUTH is
+not supported, so leave SMTP_USERNAME unset.  It can add a per-message
+delay and reject every Nth message to exercise retries.
+
+    python -m benchmarks.smtp_sink --port 2525
+"""
+import argparse
+import os
+import socketserver
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        sink = self.server.sink
+        with sink.lock:
+            sink.connections += 1
+        self.reply("220 slac-sink ESMTP")
+        tls = False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250-slac-sink")
+                if sink.tls_context and not tls:
+                    self.reply("250-STARTTLS")
+                self.reply("250 SIZE 20971520")
+            elif command == "STARTTLS" and sink.tls_context and not tls:
+                self.reply("220 Ready to start TLS")
+                self.wfile.flush()
+                self.connection = sink.tls_context.wrap_socket(self.connection, server_side=True)
+                self.rfile = self.connection.makefile("rb")
+                self.wfile = self.connection.makefile("wb", buffering=0)
+                tls = True
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data in self.rfile:
+                    if data in (b".\r\n", b".\n"):
+                        break
+                    size += len(data)
+                if sink.delay:
+                    time.sleep(sink.delay)
+                with sink.lock:
+                    sink.received += 1
+                    rejected = sink.fail_every and sink.received % sink.fail_every == 0
+                    if rejected:
+                        sink.rejected += 1
+                    else:
+                        sink.accepted += 1
+                        sink.bytes += size
+                self.reply("451 Try again later" if rejected else "250 Queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """Threaded SMTP sink; counts connections and accepted/rejected messages."""
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, fail_every=0, certfile=None, keyfile=None):
+        self.delay = delay
+        self.fail_every = fail_every
+        self.tls_context = None
+        if certfile:
+            self.tls_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            self.tls_context.load_cert_chain(certfile, keyfile)
+        self.lock = threading.Lock()
+        self.connections = self.received = self.accepted = self.rejected = self.bytes = 0
+        self._server = _Server((host, port), _Handler)
+        self._server.sink = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def self_signed_cert(host="127.0.0.1"):
+    """Create a throwaway certificate for `host` with the openssl CLI; returns (certfile, keyfile)."""
+    folder = tempfile.mkdtemp(prefix="slac_sink_tls_")
+    certfile, keyfile = os.path.join(folder, "cert.pem"), os.path.join(folder, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", keyfile, "-out", certfile, "-subj", f"/CN={host}",
+         "-addext", f"subjectAltName=IP:{host}"],
+        check=True, capture_output=True,
+    )
+    return certfile, keyfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to stall on every message")
+    parser.add_argument("--fail-every", type=int, default=0, help="reject every Nth message with 451")
+    parser.add_argument("--tls", action="store_true", help="offer STARTTLS with a self-signed certificate")
+    args = parser.parse_args()
+    certfile, keyfile = self_signed_cert(args.host) if args.tls else (None, None)
+    with SMTPSink(args.host, args.port, args.delay, args.fail_every, certfile, keyfile) as sink:
+        print(f"SMTP sink listening on {sink.address[0]}:{sink.address[1]} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(5)
+                print(f"connections={sink.connections} accepted={sink.accepted} rejected={sink.rejected}")
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
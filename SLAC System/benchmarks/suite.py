@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite: each hot helper on seeded data, checked against a baseline.
+
+Seeds a scratch database (or --db FILE; an existing copy of
+checkin_system.db is benchmarked as it is) with synthetic employees,
+laptops and transactions, times every case in CASES and writes the
+results as JSON.  Each case's median is compared with the stored baseline
+and the run exits 1 when one is more than --threshold times slower.
+Baselines depend on the machine: record one with --save-baseline where
+the comparison will run.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --transactions 500000 --only search_transactions check_in
+    python -m benchmarks.suite --save-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import database
+from benchmarks.seed import seed
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SEARCH_QUERIES = ("screen", "Patel", "wifi drops", "1004", "Hardware Failure: fan")
+
+
+def timings(fn, calls):
+    """Seconds per call for fn(0), fn(1), ... fn(calls - 1)."""
+    times = []
+    for i in range(calls):
+        start = time.perf_counter()
+        fn(i)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+# ---------------- Cases ----------------
+# Each takes the suite context and returns per-call seconds.
+def case_check_in(ctx):
+    return timings(lambda i: database.record_check_in(
+        9000 + i % 50, 900000 + i, "Hardware Failure: suite check-in"), ctx.runs * 4)
+
+def case_check_out(ctx):
+    ids = [database.record_check_in(9100 + i % 50, 950000 + i, "Other: suite check-out")[0]
+           for i in range(ctx.runs * 4)]
+    return timings(lambda i: database.check_out(ids[i]), len(ids))
+
+def case_view_active_transactions(ctx):
+    return timings(lambda i: database.view_active_transactions(), ctx.runs)
+
+def case_view_completed_transactions(ctx):
+    return timings(lambda i: database.view_completed_transactions(), max(3, ctx.runs // 4))
+
+def case_page_transactions(ctx):
+    return timings(lambda i: database.page_transactions("Checked-Out"), ctx.runs * 2)
+
+def case_search_transactions(ctx):
+    return timings(lambda i: database.search_transactions(SEARCH_QUERIES[i % len(SEARCH_QUERIES)]),
+                   ctx.runs * 2)
+
+def case_create_pdf_receipt(ctx):
+    from receipts import create_pdf_receipt
+    row = database.get_transaction_details(1)
+    return timings(lambda i: create_pdf_receipt(row, "Suite Employee", "suite@example.com"), ctx.runs * 2)
+
+def case_decode_asset_tag(ctx):
+    import scanner
+    from benchmarks.bench_scanner import corpus
+    photos = [data for _, _, data in corpus(ctx.runs)]      # distinct photos, so no cache hits
+    return timings(lambda i: scanner.decode_asset_tag(photos[i]), len(photos))
+
+def case_send_email(ctx):
+    import receipts
+    from benchmarks.smtp_sink import SMTPSink
+    attachment = os.path.join(ctx.folder, "receipt.pdf")
+    with open(attachment, "wb") as f:
+        f.write(receipts.create_pdf_receipt(database.get_transaction_details(1), "Suite", "suite@example.com")[0])
+    with SMTPSink() as sink:
+        os.environ.update({"SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(sink.address[1]), "SMTP_USE_TLS": "0"})
+        try:
+            return timings(lambda i: receipts.send_email_with_attachment_smtp(
+                "suite@example.com", "Receipt", "<p>suite</p>", attachment), ctx.runs * 2)
+        finally:
+            receipts.keepalive_sessions()
+            for key in ("SMTP_HOST", "SMTP_PORT", "SMTP_USE_TLS"):
+                os.environ.pop(key, None)
+
+CASES = {
+    "check_in": case_check_in,
+    "check_out": case_check_out,
+    "view_active_transactions": case_view_active_transactions,
+    "view_completed_transactions": case_view_completed_transactions,
+    "page_transactions": case_page_transactions,
+    "search_transactions": case_search_transactions,
+    "create_pdf_receipt": case_create_pdf_receipt,
+    "decode_asset_tag": case_decode_asset_tag,
+    "send_email": case_send_email,
+}
+
+# ---------------- Results ----------------
+def summarise(times):
+    ms = sorted(t * 1000 for t in times)
+    return {"median_ms": round(statistics.median(ms), 4),
+            "p90_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.9))], 4),
+            "calls": len(ms)}
+
+def compare(results, baseline, threshold):
+    """Print each case against the baseline; returns the names that regressed."""
+    if baseline["meta"]["volumes"] != results["meta"]["volumes"]:
+        print(f"note: baseline was recorded with {baseline['meta']['volumes']}, this run used "
+              f"{results['meta']['volumes']}; ratios are only indicative")
+    regressed = []
+    for name, current in results["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            print(f"{name:<28} {current['median_ms']:10.3f}ms  (not in baseline)")
+            continue
+        ratio = current["median_ms"] / max(before["median_ms"], 1e-6)
+        limit = before.get("threshold", threshold)
+        status = "REGRESSED" if ratio > limit else "ok"
+        if ratio > limit:
+            regressed.append(name)
+        print(f"{name:<28} {current['median_ms']:10.3f}ms  baseline={before['median_ms']:10.3f}ms  "
+              f"x{ratio:5.2f} (limit x{limit:g})  {status}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", help="database file to seed (if empty) and benchmark; default: a scratch file")
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--employees", type=int, default=5_000)
+    parser.add_argument("--laptops", type=int, default=20_000)
+    parser.add_argument("--runs", type=int, default=25, help="base number of calls per case")
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), help="run just these cases")
+    parser.add_argument("--output", help="results JSON (default: suite_results.json in the scratch folder)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="fail when a median exceeds this multiple of the baseline's")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="slac_suite_")
+    path = os.path.abspath(args.db or os.path.join(folder, "suite.db"))
+    database.configure_pool(path)
+    database.migrate()
+    with database.database_connection() as conn:
+        existing = conn.execute("SELECT COUNT(*) FROM Transactions").fetchone()[0]
+    if not existing:
+        start = time.perf_counter()
+        seed(path, args.transactions, args.employees, args.laptops)
+        print(f"seeded {args.transactions:,} transactions in {time.perf_counter() - start:.1f}s")
+    with database.database_connection() as conn:
+        volumes = dict(zip(("employees", "laptops", "transactions"), conn.execute(
+            "SELECT (SELECT COUNT(*) FROM Employees), (SELECT COUNT(*) FROM Laptops), "
+            "(SELECT COUNT(*) FROM Transactions)").fetchone()))
+
+    ctx = argparse.Namespace(runs=args.runs, folder=folder)
+    results = {
+        "meta": {"recorded_at": datetime.now().isoformat(timespec="seconds"),
+                 "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                 "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPU",
+                 "volumes": volumes},
+        "cases": {},
+    }
+    for name in args.only or CASES:
+        results["cases"][name] = summarise(CASES[name](ctx))
+
+    output = args.output or os.path.join(folder, "suite_results.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; run with --save-baseline first")
+        return
+    with open(args.baseline) as f:
+        regressed = compare(results, json.load(f), args.threshold)
+    if regressed:
+        print(f"{len(regressed)} case(s) slower than x{args.threshold:g} the baseline: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk import and export of employees, laptops and transaction history.
+
+Files are streamed in chunks: CSV through pandas' chunked reader, Parquet
+through pyarrow record batches (pyarrow is only needed for .parquet files).
+Each chunk is written with executemany inside one unit of work, and exports
+page through pd.read_sql with a chunksize, so memory stays flat however
+large the file is.
+
+    python bulk.py import employees roster.csv
+    python bulk.py import laptops inventory.parquet
+    python bulk.py export transactions history.csv --status Checked-Out --start 2025-01-01
+"""
+import argparse
+import io
+import json
+import os
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import pandas as pd
+
+from database import (
+    HISTORY_TIME_COLUMN, add_history_stats, archive_partitions, database_connection, history_clauses,
+    partition_connection, refresh_asset_state, tables, unit_of_work,
+)
+from datacache import bump_data_version
+
+CHUNK_ROWS = 20_000        # a history chunk holds the write lock ~1.5s, well inside busy_timeout
+
+NUMBER_COLUMNS = ("transaction_id", "employee_id")
+WHOLE_NUMBER = r"\s*\d+(?:\.0*)?\s*"     # Parquet stores integer columns with gaps as floats
+STATUSES = ("Checked-In", "Checked-Out")
+
+TableSpec = namedtuple("TableSpec", "table columns required insert order_by")
+ImportResult = namedtuple("ImportResult", "rows skipped seconds")
+HistoryRow = namedtuple("HistoryRow", "transaction_id employee_id asset_tag issue check_in_time check_out_time status")
+
+# Blank name/email/model/description cells never overwrite stored values.
+TABLES = {
+    "employees": TableSpec(
+        "Employees",
+        ("employee_id", "name", "email"),
+        ("employee_id",),
+        """
+        INSERT INTO Employees (employee_id, name, email) VALUES (?, COALESCE(?, ''), COALESCE(?, ''))
+        ON CONFLICT(employee_id) DO UPDATE SET
+            name=COALESCE(NULLIF(excluded.name, ''), name), email=COALESCE(NULLIF(excluded.email, ''), email)
+        """,
+        "employee_id",
+    ),
+    "laptops": TableSpec(
+        "Laptops",
+        ("asset_tag", "model", "description"),
+        ("asset_tag",),
+        """
+        INSERT INTO Laptops (asset_tag, model, description) VALUES (?, COALESCE(?, ''), COALESCE(?, ''))
+        ON CONFLICT(asset_tag) DO UPDATE SET
+            model=COALESCE(NULLIF(excluded.model, ''), model),
+            description=COALESCE(NULLIF(excluded.description, ''), description)
+        """,
+        "asset_tag",
+    ),
+    # History from another system.  Rows with a transaction_id that already
+    # exists are skipped, so re-running an import is harmless.
+    "transactions": TableSpec(
+        "Transactions",
+        ("transaction_id", "employee_id", "asset_tag", "issue", "check_in_time", "check_out_time", "status"),
+        ("employee_id", "asset_tag", "issue"),
+        """
+        INSERT INTO Transactions (transaction_id, employee_id, asset_tag, issue,
+                                  check_in_time, check_out_time, status)
+        VALUES (?1, ?2, ?3, ?4, COALESCE(?5, CURRENT_TIMESTAMP), ?6,
+                COALESCE(?7, CASE WHEN ?6 IS NULL THEN 'Checked-In' ELSE 'Checked-Out' END))
+        ON CONFLICT(transaction_id) DO NOTHING
+        """,
+        "transaction_id",
+    ),
+}
+
+# ---------------- Reading ----------------
+def file_format(source, fmt=None):
+    """'csv' or 'parquet', from `fmt` or the file name (paths and uploaded files)."""
+    if fmt:
+        return fmt.lower()
+    name = source if isinstance(source, str) else getattr(source, "name", "")
+    return "parquet" if str(name).lower().endswith((".parquet", ".pq")) else "csv"
+
+def _pyarrow_parquet():
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet files need pyarrow: pip install pyarrow") from None
+    return pq
+
+def read_chunks(source, fmt=None, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames of at most chunk_rows rows, every value a string or None."""
+    if file_format(source, fmt) == "parquet":
+        for batch in _pyarrow_parquet().ParquetFile(source).iter_batches(batch_size=chunk_rows):
+            frame = batch.to_pandas()
+            yield frame.astype("string").astype(object).where(frame.notna(), None)
+    else:
+        # Text dtype keeps ids exact; SQLite's column affinity converts them on insert
+        for frame in pd.read_csv(source, chunksize=chunk_rows, dtype=str, keep_default_na=False,
+                                 na_values=[""], skipinitialspace=True):
+            yield frame.astype(object).where(frame.notna(), None)
+
+def _numbers(values, column):
+    """Text ids -> ints (None stays None); ValueError names the first bad value."""
+    bad = values.notna() & ~values.astype("string").str.fullmatch(WHOLE_NUMBER).fillna(False)
+    if bad.any():
+        raise ValueError(f"Column {column} must hold whole numbers, not {values[bad].iloc[0]!r}")
+    return pd.Series([None if pd.isna(v) else int(str(v).split(".")[0]) for v in values],
+                     index=values.index, dtype=object)
+
+def _tags(values):
+    """Asset tags as SQLite stores them: whole numbers as ints, other tags as trimmed text."""
+    text = values.astype("string").str.strip().replace("", pd.NA)
+    number = text.str.fullmatch(WHOLE_NUMBER).fillna(False)
+    return pd.Series([None if pd.isna(t) else int(t.split(".")[0]) if n else t for t, n in zip(text, number)],
+                     index=values.index, dtype=object)
+
+def _rows(frame, spec):
+    """Chunk -> (parameter tuples, number of rows skipped).
+
+    Ids must be whole numbers and a status one of STATUSES, or the chunk is
+    refused with a ValueError.  Rows missing a required field are skipped,
+    and so are Checked-Out rows without a check_out_time.
+    """
+    missing = [c for c in spec.required if c not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    frame = frame.reindex(columns=list(spec.columns))
+    for column in NUMBER_COLUMNS:
+        if column in frame.columns:
+            frame[column] = _numbers(frame[column], column)
+    if "asset_tag" in frame.columns:
+        frame["asset_tag"] = _tags(frame["asset_tag"])
+    if "status" in frame.columns:
+        bad = frame["status"].notna() & ~frame["status"].isin(STATUSES)
+        if bad.any():
+            raise ValueError(f"Column status must be {' or '.join(STATUSES)}, not {frame['status'][bad].iloc[0]!r}")
+    complete = frame[list(spec.required)].notna().all(axis=1)
+    if "status" in frame.columns:
+        complete &= ~((frame["status"] == "Checked-Out") & frame["check_out_time"].isna())
+    rows = list(frame[complete].itertuples(index=False, name=None))
+    return rows, int((~complete).sum())
+
+# ---------------- Import ----------------
+SEARCH_TRIGGER = "trg_transactions_search_insert"
+STATS_TRIGGER = "trg_transactions_stats_insert"
+FEED_TRIGGER = "trg_transactions_feed_insert"
+ASSET_TRIGGER = "trg_transactions_asset_insert"
+
+def _is_open(row):
+    """Whether a history row is a check-in still open, as the insert's status default decides."""
+    return (row.status or ("Checked-In" if row.check_out_time is None else "Checked-Out")) == "Checked-In"
+
+def _second_check_ins(conn, rows):
+    """Indexes of the new rows that check in an asset which is already checked in.
+
+    record_check_in() refuses those with AlreadyCheckedIn; here the asset is
+    open in AssetState or opened by an earlier row of the chunk.  Rows whose
+    transaction_id is stored already are left to the insert to skip.
+    """
+    rows = [HistoryRow._make(r) for r in rows]
+    ids = json.dumps([r.transaction_id for r in rows if r.transaction_id is not None])
+    stored = {i for (i,) in conn.execute(
+        "SELECT transaction_id FROM Transactions WHERE transaction_id IN (SELECT value FROM json_each(?))", (ids,))}
+    tags = json.dumps(sorted({str(r.asset_tag) for r in rows if _is_open(r)}))
+    held = {tag for (tag,) in conn.execute("""
+        SELECT asset_tag FROM AssetState
+        WHERE status = 'Checked-In' AND asset_tag IN (SELECT value FROM json_each(?))
+    """, (tags,))}
+    second = set()
+    for i, r in enumerate(rows):
+        if _is_open(r) and r.transaction_id not in stored:
+            if r.asset_tag in held:
+                second.add(i)
+            held.add(r.asset_tag)
+    return second
+
+def _insert_history(conn, rows):
+    """Insert one chunk of history and add it to the search index and counters in one pass.
+
+    Returns the number of rows skipped because they would check in an asset
+    that is already checked in (see _second_check_ins()).
+
+    The per-row search, analytics and asset state triggers are most of the
+    cost of a history import, so they are dropped for the chunk and
+    recreated before the commit.  DDL is transactional and the chunk holds the write lock,
+    so no other writer ever runs without them.  Change feed followers get
+    one 'reset' event for the chunk rather than an event per row.
+    """
+    second = _second_check_ins(conn, rows)
+    rows = [r for i, r in enumerate(rows) if i not in second]
+    conn.executemany("INSERT OR IGNORE INTO Employees (employee_id, name, email) VALUES (?, '', '')",
+                     {(r[1],) for r in rows})
+    conn.executemany("INSERT OR IGNORE INTO Laptops (asset_tag, model, description) VALUES (?, '', '')",
+                     {(r[2],) for r in rows})
+    triggers = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type='trigger' AND name IN (?, ?, ?, ?)",
+                                 (SEARCH_TRIGGER, STATS_TRIGGER, FEED_TRIGGER, ASSET_TRIGGER)).fetchall())
+    if not triggers:
+        conn.executemany(TABLES["transactions"].insert, rows)
+        return len(second)
+    # The chunk's new rows: ids above the current maximum, plus explicit ids
+    # that did not exist yet (existing ones are skipped by the insert)
+    last_id = conn.execute("SELECT COALESCE(MAX(transaction_id), 0) FROM Transactions").fetchone()[0]
+    explicit_ids = json.dumps(sorted({int(r[0]) for r in rows if r[0] is not None}))
+    new_ids = json.dumps([i for (i,) in conn.execute("""
+        SELECT value FROM json_each(?) WHERE value NOT IN (SELECT transaction_id FROM Transactions)
+    """, (explicit_ids,))])
+    for name in triggers:
+        conn.execute(f"DROP TRIGGER {name}")
+    conn.executemany(TABLES["transactions"].insert, rows)
+    inserted = "(t.transaction_id > ? OR t.transaction_id IN (SELECT value FROM json_each(?)))"
+    if SEARCH_TRIGGER in triggers:
+        conn.execute(f"""
+            INSERT INTO TransactionSearch (rowid, transaction_id, asset_tag, employee_id, issue, name, status)
+            SELECT t.transaction_id, t.transaction_id, t.asset_tag, t.employee_id, t.issue,
+                   COALESCE(e.name, ''), t.status
+            FROM Transactions t LEFT JOIN Employees e ON e.employee_id = t.employee_id
+            WHERE {inserted}
+        """, (last_id, new_ids))
+    if STATS_TRIGGER in triggers:
+        add_history_stats(conn, inserted, (last_id, new_ids))
+    if ASSET_TRIGGER in triggers:
+        refresh_asset_state(conn, inserted, (last_id, new_ids))
+    if FEED_TRIGGER in triggers:
+        conn.execute("INSERT INTO ChangeFeed (entity, op) VALUES ('transaction', 'reset')")
+    for sql in triggers.values():
+        conn.execute(sql)
+    return len(second)
+
+def import_file(table, source, fmt=None, chunk_rows=CHUNK_ROWS, progress=None):
+    """Stream a CSV/Parquet file into `table`; one transaction per chunk.
+
+    Transactions imports also create any missing employee and laptop rows,
+    and skip a check-in of an asset that is already checked in.
+    `progress(rows_so_far)` is called after each chunk.
+    """
+    spec = TABLES[table]
+    tables()
+    start = time.perf_counter()
+    total = skipped = 0
+    try:
+        for frame in read_chunks(source, fmt, chunk_rows):
+            rows, bad = _rows(frame, spec)
+            with unit_of_work() as conn:
+                if table == "transactions":
+                    refused = _insert_history(conn, rows)
+                else:
+                    conn.executemany(spec.insert, rows)
+                    refused = 0
+            skipped += bad + refused
+            total += len(rows) - refused
+            if progress is not None:
+                progress(total)
+    finally:
+        bump_data_version()
+    return ImportResult(total, skipped, time.perf_counter() - start)
+
+# ---------------- Export ----------------
+def _export_query(table, status=None, start=None, end=None):
+    spec = TABLES[table]
+    clauses, params = history_clauses(status, start, end) if table == "transactions" else ([], [])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return f"SELECT {', '.join(spec.columns)} FROM {spec.table} {where} ORDER BY {spec.order_by}", params
+
+def _export_chunks(conn, table, status, start, end, chunk_rows):
+    """DataFrame chunks of an export: archived transactions (oldest partition first), then the table."""
+    sql, params = _export_query(table, status, start, end)
+    if table == "transactions" and status != "Checked-In":
+        for partition in reversed(archive_partitions(conn)):
+            with partition_connection(partition) as part:
+                yield from pd.read_sql(sql, part, params=params, chunksize=chunk_rows)
+    yield from pd.read_sql(sql, conn, params=params, chunksize=chunk_rows)
+
+@contextmanager
+def _text_output(dest):
+    """Text handle for a path or a binary file object (left open for the caller)."""
+    if isinstance(dest, (str, os.PathLike)):
+        with open(dest, "w", newline="", encoding="utf-8") as f:
+            yield f
+    else:
+        f = io.TextIOWrapper(dest, encoding="utf-8", newline="")
+        try:
+            yield f
+        finally:
+            f.flush()
+            f.detach()
+
+def export_file(table, dest, fmt=None, status=None, start=None, end=None, chunk_rows=CHUNK_ROWS):
+    """Stream `table` (optionally filtered history) to a CSV/Parquet path or binary file.
+
+    Returns the number of rows written.  The database part of the export
+    reads one snapshot, so concurrent check-ins don't tear it.  Completed
+    history includes archived transactions.
+    """
+    fmt = file_format(dest, fmt)
+    total = 0
+    with database_connection() as conn:
+        chunks = _export_chunks(conn, table, status, start, end, chunk_rows)
+        if fmt == "parquet":
+            pq = _pyarrow_parquet()
+            import pyarrow as pa
+            schema = pa.schema([(c, pa.string()) for c in TABLES[table].columns])
+            with pq.ParquetWriter(dest, schema) as writer:
+                for frame in chunks:
+                    frame = frame.astype("string")
+                    writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+                    total += len(frame)
+        else:
+            with _text_output(dest) as f:
+                for i, frame in enumerate(chunks):
+                    frame.to_csv(f, header=i == 0, index=False)
+                    total += len(frame)
+                if total == 0:
+                    f.write(",".join(TABLES[table].columns) + "\n")
+    return total
+
+# ---------------- CLI ----------------
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export for the check-in database")
+    parser.add_argument("action", choices=("import", "export"))
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("path", help=".csv or .parquet file")
+    parser.add_argument("--format", choices=("csv", "parquet"), help="override the file extension")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--status", choices=sorted(HISTORY_TIME_COLUMN), help="export: transactions only")
+    parser.add_argument("--start", help="export: first day (YYYY-MM-DD)")
+    parser.add_argument("--end", help="export: last day (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.action == "import":
+        result = import_file(args.table, args.path, args.format, args.chunk_rows,
+                             progress=lambda n: print(f"\r{n:,} rows", end="", flush=True))
+        print(f"\rImported {result.rows:,} {args.table} rows in {result.seconds:.1f}s "
+              f"({result.rows / max(result.seconds, 1e-9):,.0f} rows/s); skipped {result.skipped:,}")
+    else:
+        rows = export_file(args.table, args.path, args.format, args.status, args.start, args.end, args.chunk_rows)
+        seconds = time.perf_counter() - started
+        print(f"Exported {rows:,} {args.table} rows in {seconds:.1f}s ({rows / max(seconds, 1e-9):,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
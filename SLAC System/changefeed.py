@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Change feed: committed changes to Transactions and Employees, in order.
+
+Triggers (database.py, migration 10) append an event to ChangeFeed inside
+the transaction that makes each change, so the feed holds exactly what was
+committed, in commit order, whoever wrote it (app, API, another process).
+seq only grows: SQLite has one writer and AUTOINCREMENT never reuses a
+value.  A reader keeps the last seq it applied and asks for the events
+after it, one range read on the primary key that is usually empty.
+
+A reader that cannot catch up from events alone reloads instead: when the
+events it needs were trimmed, when a bulk history import wrote a 'reset'
+event, or when more than MAX_EVENTS are pending.  ActiveFollower keeps the
+Dashboard's checked-in devices this way, and api.py streams the same events
+to wall displays as Server-Sent Events.  SQLite only, like bulk.py and
+archive.py; on PostgreSQL the Dashboard re-queries.
+"""
+import json
+import threading
+from collections import namedtuple
+
+import database
+from activeset import active_frame
+from tracing import traced
+
+MAX_EVENTS = 1000          # pending events past which a follower reloads instead
+
+Event = namedtuple("Event", "seq entity op key row at")
+Changes = namedtuple("Changes", "events cursor reset")
+
+
+def latest_seq(conn=None):
+    """seq of the newest event (0 for an empty feed)."""
+    if conn is None:
+        with database.database_connection() as conn:
+            return latest_seq(conn)
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM ChangeFeed").fetchone()[0]
+
+@traced("feed.read_changes")
+def read_changes(cursor, limit=MAX_EVENTS):
+    """Events after `cursor`, oldest first, and the seq to read from next time.
+
+    reset is True when the events do not bring a reader at `cursor` up to
+    date: some it needed were trimmed, one is a 'reset', or `limit` more
+    were pending.  The reader should then reload and continue from the
+    cursor its reload returns (see snapshot()).
+    """
+    with database.database_connection() as conn:
+        rows = conn.execute("""
+            SELECT seq, entity, op, key, row, at FROM ChangeFeed
+            WHERE seq > ? ORDER BY seq LIMIT ?
+        """, (cursor, limit)).fetchall()
+    events = [Event(seq, entity, op, key, json.loads(row) if row else None, at)
+              for seq, entity, op, key, row, at in rows]
+    reset = bool(events) and (events[0].seq != cursor + 1 or len(events) == limit
+                              or any(e.op == "reset" for e in events))
+    return Changes(events, events[-1].seq if events else cursor, reset)
+
+@traced("feed.snapshot")
+def snapshot():
+    """(cursor, checked-in devices) read in one transaction, so no change falls between them."""
+    import pandas as pd
+    with database.database_connection() as conn:
+        conn.execute("BEGIN")
+        cursor = latest_seq(conn)
+        frame = pd.read_sql(database.ACTIVE_QUERY, conn)
+    return cursor, active_frame(frame)
+
+
+class ActiveFollower:
+    """The checked-in devices (view_active_transactions order), kept current from the feed.
+
+    After the first load, refresh() costs one read of the events since the
+    previous call and only rebuilds the frame if a transaction changed.
+    The frame is replaced rather than modified, so callers may keep one,
+    but must not change it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.frame = None
+        self.cursor = 0
+        self.reloads = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            if self.frame is None:
+                self._reload()
+            else:
+                changes = read_changes(self.cursor)
+                if changes.reset:
+                    self._reload()
+                elif changes.events:
+                    self._apply(changes.events)
+                    self.cursor = changes.cursor
+            return self.frame
+
+    def _reload(self):
+        self.cursor, self.frame = snapshot()
+        self.reloads += 1
+
+    def _apply(self, events):
+        latest = {}                 # transaction_id -> its row now, None once deleted
+        for event in events:
+            if event.entity == "transaction":
+                latest[event.key] = None if event.op == "delete" else event.row
+        if not latest:
+            return
+        import pandas as pd
+        frame = self.frame[~self.frame["transaction_id"].isin(list(latest))]
+        added = [row for row in latest.values() if row is not None and row["status"] == "Checked-In"]
+        if added:
+            added = active_frame(pd.DataFrame(added, columns=list(database.ACTIVE_COLUMNS)))
+            added = added.sort_values("check_in_time", ascending=False)
+            # An empty frame's text columns read back as object, not str
+            frame = pd.concat([added, frame], ignore_index=True) if len(frame) else added
+            if frame["asset_tag"].dtype != added["asset_tag"].dtype:
+                frame = active_frame(frame)     # one side has text tags: all tags become str
+            # New check-ins are the newest, so this only sorts after an edit to check_in_time
+            if not frame["check_in_time"].is_monotonic_decreasing:
+                frame = frame.sort_values("check_in_time", ascending=False, kind="stable", ignore_index=True)
+        self.frame = frame.reset_index(drop=True)
+
+
+_follower = None
+_follower_lock = threading.Lock()
+
+def active_follower():
+    """Process-wide ActiveFollower for the pool's database, shared by every session."""
+    global _follower
+    path = database.get_pool().path
+    with _follower_lock:
+        if _follower is None or _follower.path != path:
+            _follower = ActiveFollower(path)
+        return _follower
@@ -0,0 +1,1448 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared SQLite connection layer for the check-in system.
+
+Connections are long-lived and pooled per process, so Streamlit reruns and
+sessions reuse them instead of opening checkin_system.db on every helper call.
+"""
+import json
+import os
+import pathlib
+import queue
+import sqlite3
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+# pandas is imported in the functions that build DataFrames: it is the slowest
+# import of a cold start and the Check-In page never needs it.
+
+from datacache import bump_data_version
+from tracing import traced
+
+# Next to this file rather than the working directory, so the app, the API
+# and scripts started from anywhere all share one database
+DB_PATH = os.environ.get(
+    "SLAC_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkin_system.db")
+)
+
+POOL_SIZE = 4
+STATEMENT_CACHE_SIZE = 256
+
+# WAL lets the dashboard read while a kiosk writes; synchronous=NORMAL only
+# fsyncs on checkpoint instead of on every commit.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+# ---------------- Connection pool ----------------
+def open_connection(path=None):
+    """Open a tuned connection that can be handed between threads."""
+    conn = sqlite3.connect(
+        path or DB_PATH,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """Thread-safe pool of long-lived SQLite connections."""
+
+    def __init__(self, path=None, size=POOL_SIZE):
+        self.path = path or DB_PATH
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+
+    def acquire(self, timeout=None):
+        if self._closed:
+            raise RuntimeError(f"connection pool for {self.path} is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return open_connection(self.path)
+                except Exception:
+                    self._opened -= 1
+                    raise
+        return self._idle.get(timeout=timeout)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if not self._closed:
+                self._idle.put_nowait(conn)
+                return
+            self._opened -= 1
+        conn.close()            # borrowed before close(); it goes now instead of back to the pool
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commit on success, roll back on error."""
+        conn = self.acquire()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close the idle connections; borrowed ones are closed as they are released."""
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Process-wide pool, shared by every Streamlit rerun and session."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+def configure_pool(path=None, size=POOL_SIZE):
+    """Point the process-wide pool at another database file (scripts, benchmarks)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(path or DB_PATH, size)
+    return _pool
+
+def database_connection():
+    return get_pool().connection()
+
+@contextmanager
+def unit_of_work():
+    """Borrow a connection inside BEGIN IMMEDIATE ... COMMIT.
+
+    The write lock is taken up front, so concurrent kiosks queue on
+    busy_timeout instead of failing halfway through with SQLITE_BUSY.
+    """
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.release(conn)
+
+# ---------------- Schema migrations ----------------
+# receipts.parse_issue_type() in SQL: the text before the first ':', or
+# 'Issue' when that is empty.  Turnaround is check-in to check-out in
+# seconds (never negative) and lands in a TurnaroundBuckets bucket.
+def _issue_type_sql(row):
+    prefix = f"CASE WHEN instr({row}.issue, ':') THEN substr({row}.issue, 1, instr({row}.issue, ':') - 1) ELSE {row}.issue END"
+    return f"trim(CASE WHEN ({prefix}) = '' THEN 'Issue' ELSE ({prefix}) END)"
+
+def _turnaround_sql(row):
+    return f"max(0.0, (julianday({row}.check_out_time) - julianday({row}.check_in_time)) * 86400.0)"
+
+def _turnaround_stats_sql(row, sign):
+    """Add (sign=+1) or remove (-1) a completed row's turnaround."""
+    return f"""
+            INSERT INTO TurnaroundStats (issue_type, bucket, n, total_seconds)
+            SELECT {_issue_type_sql(row)},
+                   (SELECT MIN(bucket) FROM TurnaroundBuckets WHERE upper_seconds >= {_turnaround_sql(row)}),
+                   {sign}, {sign} * {_turnaround_sql(row)}
+            WHERE {row}.status = 'Checked-Out' AND {row}.check_out_time IS NOT NULL
+            ON CONFLICT(issue_type, bucket) DO UPDATE
+            SET n = n + excluded.n, total_seconds = total_seconds + excluded.total_seconds;"""
+
+def _visit_stats_sql(row, sign):
+    """Add or remove a row's check-in from the hourly and per-asset counters."""
+    return f"""
+            INSERT INTO CheckInHourCounts (hour, n) VALUES (strftime('%Y-%m-%d %H', {row}.check_in_time), {sign})
+            ON CONFLICT(hour) DO UPDATE SET n = n + excluded.n;
+            INSERT INTO AssetVisitCounts (asset_tag, n, last_check_in) VALUES ({row}.asset_tag, {sign}, {row}.check_in_time)
+            ON CONFLICT(asset_tag) DO UPDATE SET n = n + excluded.n,
+                last_check_in = CASE WHEN excluded.n > 0 THEN max(last_check_in, excluded.last_check_in)
+                                     ELSE last_check_in END;"""
+
+def _feed_transaction_sql(op, row):
+    """Append a Transactions change, with the row as it now is (as it was, for deletes)."""
+    return f"""
+            INSERT INTO ChangeFeed (entity, op, key, row)
+            VALUES ('transaction', '{op}', {row}.transaction_id, json_object(
+                'transaction_id', {row}.transaction_id, 'employee_id', {row}.employee_id,
+                'asset_tag', {row}.asset_tag, 'issue', {row}.issue, 'check_in_time', {row}.check_in_time,
+                'check_out_time', {row}.check_out_time, 'status', {row}.status));"""
+
+def _asset_state_sql(tags):
+    """Point AssetState at the latest check-in of each asset tag that `tags` (a SELECT of tag) yields."""
+    return f"""
+            INSERT OR REPLACE INTO AssetState (asset_tag, transaction_id, employee_id, status, last_seen)
+            SELECT t.asset_tag, t.transaction_id, t.employee_id, t.status, COALESCE(t.check_out_time, t.check_in_time)
+            FROM (SELECT DISTINCT tag FROM ({tags})) changed
+            JOIN Transactions t ON t.transaction_id = (
+                SELECT transaction_id FROM Transactions WHERE asset_tag = changed.tag
+                ORDER BY check_in_time DESC, transaction_id DESC LIMIT 1
+            );"""
+
+def _check_outs_to_utc(conn):
+    """Migration 13: rewrite check-out times in UTC, like the check-ins.
+
+    check_out() used to stamp the host's local time, so every turnaround
+    mixed two clocks.  datetime(x, 'utc') converts with this host's zone,
+    the one that wrote them.  One trigger run per row takes minutes on a
+    million rows, so (as in archive.py) the update triggers are dropped for
+    the UPDATE and the counters it would have moved are adjusted with one
+    grouped statement each.  Archive partitions keep the times they hold.
+    """
+    update_triggers = ("trg_transactions_count_update", "trg_transactions_stats_turnaround",
+                       "trg_transactions_feed_update", "trg_transactions_asset_update")
+    triggers = dict(conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type='trigger' AND name IN "
+        f"({', '.join('?' * len(update_triggers))})", update_triggers).fetchall())
+    for name in triggers:
+        conn.execute(f"DROP TRIGGER {name}")
+
+    def count(sign):
+        conn.execute(f"""
+            INSERT INTO TransactionDayCounts (status, day, n)
+            SELECT 'Checked-Out', date(check_out_time), {sign} * COUNT(*)
+            FROM Transactions WHERE status = 'Checked-Out' GROUP BY 2
+            ON CONFLICT(status, day) DO UPDATE SET n = n + excluded.n
+        """)
+        conn.execute(f"""
+            INSERT INTO TurnaroundStats (issue_type, bucket, n, total_seconds)
+            WITH completed AS MATERIALIZED (   -- or the bucket lookup recomputes seconds per bucket
+                SELECT {_issue_type_sql("t")} AS issue_type, {_turnaround_sql("t")} AS seconds
+                FROM Transactions t WHERE t.status = 'Checked-Out' AND t.check_out_time IS NOT NULL
+            )
+            SELECT issue_type, (SELECT MIN(bucket) FROM TurnaroundBuckets WHERE upper_seconds >= seconds) AS bucket,
+                   {sign} * COUNT(*), {sign} * SUM(seconds)
+            FROM completed
+            GROUP BY issue_type, bucket
+            ON CONFLICT(issue_type, bucket) DO UPDATE
+            SET n = n + excluded.n, total_seconds = total_seconds + excluded.total_seconds
+        """)
+
+    count(-1)
+    conn.execute("UPDATE Transactions SET check_out_time = datetime(check_out_time, 'utc') "
+                 "WHERE check_out_time IS NOT NULL")
+    count(1)
+    conn.execute("UPDATE AssetState SET last_seen = datetime(last_seen, 'utc') WHERE status = 'Checked-Out'")
+    conn.execute("INSERT INTO ChangeFeed (entity, op) VALUES ('transaction', 'reset')")
+    for sql in triggers.values():
+        conn.execute(sql)
+
+def _index_archived_assets(conn):
+    """Migration 14: fill ArchivedAssets from the partition files archived so far."""
+    for partition in archive_partitions(conn):
+        if not os.path.exists(partition.path):
+            continue
+        with partition_connection(partition) as part:
+            tags = part.execute("SELECT DISTINCT asset_tag FROM Transactions").fetchall()
+        conn.executemany("INSERT OR IGNORE INTO ArchivedAssets (asset_tag, month) VALUES (?, ?)",
+                         [(tag, partition.month) for (tag,) in tags])
+
+FEED_RETAIN = 100_000      # change events kept; followers further behind reload instead
+
+TURNAROUND_BUCKET_GROWTH = 1.15     # bucket upper bounds: 60s * 1.15^k, so p90 is within 15% past a minute
+
+# Each entry is (version, statements).  Versions are recorded in
+# PRAGMA user_version; append new migrations, never edit applied ones.
+MIGRATIONS = [
+    (1, (
+        """
+        CREATE TABLE IF NOT EXISTS Employees (
+            employee_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Laptops (
+            asset_tag INTEGER NOT NULL,
+            model TEXT NOT NULL,
+            description TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Transactions (
+            transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER NOT NULL,
+            asset_tag INTEGER NOT NULL,
+            issue TEXT NOT NULL,
+            check_in_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            check_out_time DATETIME,
+            status TEXT CHECK(status IN ('Checked-In', 'Checked-Out')) DEFAULT 'Checked-In',
+            FOREIGN KEY (employee_id) REFERENCES Employees(employee_id),
+            FOREIGN KEY (asset_tag) REFERENCES Laptops(asset_tag)
+        )
+        """,
+    )),
+    # Laptops had no key, so INSERT OR IGNORE added a row per check-in.
+    # Keep the first row per asset tag and enforce uniqueness from now on.
+    # The active index is partial and covers the whole Check-Out/Dashboard
+    # query; completed rows are the bulk of the table, so that one is not.
+    (2, (
+        """
+        DELETE FROM Laptops
+        WHERE rowid NOT IN (SELECT MIN(rowid) FROM Laptops GROUP BY asset_tag)
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_laptops_asset_tag ON Laptops(asset_tag)",
+        """
+        CREATE INDEX IF NOT EXISTS ix_transactions_active
+        ON Transactions(status, check_in_time, employee_id, asset_tag, issue)
+        WHERE status='Checked-In'
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_transactions_completed ON Transactions(status, check_out_time)",
+        "CREATE INDEX IF NOT EXISTS ix_transactions_asset_tag ON Transactions(asset_tag)",
+        "CREATE INDEX IF NOT EXISTS ix_transactions_employee_id ON Transactions(employee_id)",
+        "ANALYZE",
+    )),
+    # Per-day row counts by status, kept current by triggers, so history
+    # totals never need COUNT(*) over Transactions.  A row is counted on the
+    # day of its check-out if completed, else on the day of its check-in.
+    (3, (
+        """
+        CREATE TABLE IF NOT EXISTS TransactionDayCounts (
+            status TEXT NOT NULL,
+            day TEXT NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (status, day)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT OR REPLACE INTO TransactionDayCounts (status, day, n)
+        SELECT status,
+               date(CASE status WHEN 'Checked-Out' THEN check_out_time ELSE check_in_time END),
+               COUNT(*)
+        FROM Transactions GROUP BY 1, 2
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_count_insert
+        AFTER INSERT ON Transactions
+        BEGIN
+            INSERT INTO TransactionDayCounts (status, day, n)
+            VALUES (NEW.status,
+                    date(CASE NEW.status WHEN 'Checked-Out' THEN NEW.check_out_time ELSE NEW.check_in_time END),
+                    1)
+            ON CONFLICT(status, day) DO UPDATE SET n = n + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_count_update
+        AFTER UPDATE OF status, check_in_time, check_out_time ON Transactions
+        BEGIN
+            UPDATE TransactionDayCounts SET n = n - 1
+            WHERE status = OLD.status
+              AND day = date(CASE OLD.status WHEN 'Checked-Out' THEN OLD.check_out_time ELSE OLD.check_in_time END);
+            INSERT INTO TransactionDayCounts (status, day, n)
+            VALUES (NEW.status,
+                    date(CASE NEW.status WHEN 'Checked-Out' THEN NEW.check_out_time ELSE NEW.check_in_time END),
+                    1)
+            ON CONFLICT(status, day) DO UPDATE SET n = n + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_count_delete
+        AFTER DELETE ON Transactions
+        BEGIN
+            UPDATE TransactionDayCounts SET n = n - 1
+            WHERE status = OLD.status
+              AND day = date(CASE OLD.status WHEN 'Checked-Out' THEN OLD.check_out_time ELSE OLD.check_in_time END);
+        END
+        """,
+    )),
+    # Trigram full-text index for the search boxes, keyed by transaction_id.
+    # status is indexed too so "active only" is part of the MATCH instead of
+    # a join filter over every historical hit.
+    (4, (
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS TransactionSearch USING fts5(
+            transaction_id, asset_tag, employee_id, issue, name, status,
+            tokenize='trigram'
+        )
+        """,
+        """
+        INSERT INTO TransactionSearch (rowid, transaction_id, asset_tag, employee_id, issue, name, status)
+        SELECT t.transaction_id, t.transaction_id, t.asset_tag, t.employee_id, t.issue,
+               COALESCE(e.name, ''), t.status
+        FROM Transactions t LEFT JOIN Employees e ON e.employee_id = t.employee_id
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_search_insert
+        AFTER INSERT ON Transactions
+        BEGIN
+            INSERT INTO TransactionSearch (rowid, transaction_id, asset_tag, employee_id, issue, name, status)
+            VALUES (NEW.transaction_id, NEW.transaction_id, NEW.asset_tag, NEW.employee_id, NEW.issue,
+                    COALESCE((SELECT name FROM Employees WHERE employee_id = NEW.employee_id), ''),
+                    NEW.status);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_search_update
+        AFTER UPDATE OF employee_id, asset_tag, issue, status ON Transactions
+        BEGIN
+            UPDATE TransactionSearch
+            SET asset_tag = NEW.asset_tag,
+                employee_id = NEW.employee_id,
+                issue = NEW.issue,
+                name = COALESCE((SELECT name FROM Employees WHERE employee_id = NEW.employee_id), ''),
+                status = NEW.status
+            WHERE rowid = NEW.transaction_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_search_delete
+        AFTER DELETE ON Transactions
+        BEGIN
+            DELETE FROM TransactionSearch WHERE rowid = OLD.transaction_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_employees_search_name
+        AFTER UPDATE OF name ON Employees
+        WHEN NEW.name IS NOT OLD.name
+        BEGIN
+            UPDATE TransactionSearch SET name = NEW.name
+            WHERE rowid IN (SELECT transaction_id FROM Transactions WHERE employee_id = NEW.employee_id);
+        END
+        """,
+    )),
+    # Receipt emails waiting for the background sender (see outbox.py).
+    # Times are Unix seconds; next_attempt_at doubles as the claim lease.
+    (5, (
+        """
+        CREATE TABLE IF NOT EXISTS EmailOutbox (
+            outbox_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending' CHECK(status IN ('pending', 'sent', 'failed')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            next_attempt_at REAL NOT NULL,
+            sent_at REAL,
+            last_error TEXT,
+            FOREIGN KEY (transaction_id) REFERENCES Transactions(transaction_id)
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_outbox_due
+        ON EmailOutbox(next_attempt_at) WHERE status='pending'
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_outbox_sent
+        ON EmailOutbox(sent_at) WHERE status='sent'
+        """,
+    )),
+    # Signatures as content-addressed blobs (see signatures.py); identical
+    # signatures share one row, transactions point at them per kind.
+    (6, (
+        """
+        CREATE TABLE IF NOT EXISTS SignatureBlobs (
+            digest BLOB PRIMARY KEY,
+            format TEXT NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            data BLOB NOT NULL
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS TransactionSignatures (
+            transaction_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            digest BLOB NOT NULL,
+            signed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (transaction_id, kind),
+            FOREIGN KEY (transaction_id) REFERENCES Transactions(transaction_id),
+            FOREIGN KEY (digest) REFERENCES SignatureBlobs(digest)
+        ) WITHOUT ROWID
+        """,
+    )),
+    # Dashboard analytics counters, kept current by triggers so the panel
+    # never scans Transactions: check-ins per UTC hour, visits per asset,
+    # and per issue type a histogram of turnaround times (count and total
+    # seconds per bucket) for the mean and p90.
+    (7, (
+        """
+        CREATE TABLE IF NOT EXISTS CheckInHourCounts (
+            hour TEXT PRIMARY KEY,
+            n INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS AssetVisitCounts (
+            asset_tag INTEGER PRIMARY KEY,
+            n INTEGER NOT NULL DEFAULT 0,
+            last_check_in DATETIME
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_asset_visits_n ON AssetVisitCounts(n DESC, asset_tag)",
+        """
+        CREATE TABLE IF NOT EXISTS TurnaroundBuckets (
+            bucket INTEGER PRIMARY KEY,
+            upper_seconds REAL NOT NULL
+        )
+        """,
+        f"""
+        INSERT OR IGNORE INTO TurnaroundBuckets (bucket, upper_seconds)
+        WITH RECURSIVE b(bucket, upper_seconds) AS (
+            SELECT 0, 60.0
+            UNION ALL
+            SELECT bucket + 1, upper_seconds * {TURNAROUND_BUCKET_GROWTH} FROM b WHERE bucket < 99
+        )
+        SELECT bucket, upper_seconds FROM b UNION ALL SELECT 100, 1e18
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS TurnaroundStats (
+            issue_type TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            total_seconds REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (issue_type, bucket)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT OR REPLACE INTO CheckInHourCounts (hour, n)
+        SELECT strftime('%Y-%m-%d %H', check_in_time), COUNT(*) FROM Transactions GROUP BY 1
+        """,
+        """
+        INSERT OR REPLACE INTO AssetVisitCounts (asset_tag, n, last_check_in)
+        SELECT asset_tag, COUNT(*), MAX(check_in_time) FROM Transactions GROUP BY asset_tag
+        """,
+        f"""
+        INSERT OR REPLACE INTO TurnaroundStats (issue_type, bucket, n, total_seconds)
+        SELECT issue_type, bucket, COUNT(*), SUM(seconds)
+        FROM (
+            SELECT {_issue_type_sql("t")} AS issue_type, {_turnaround_sql("t")} AS seconds,
+                   (SELECT MIN(bucket) FROM TurnaroundBuckets WHERE upper_seconds >= {_turnaround_sql("t")}) AS bucket
+            FROM Transactions t
+            WHERE t.status = 'Checked-Out' AND t.check_out_time IS NOT NULL
+        )
+        GROUP BY issue_type, bucket
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_stats_insert
+        AFTER INSERT ON Transactions
+        BEGIN{_visit_stats_sql("NEW", 1)}{_turnaround_stats_sql("NEW", 1)}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_stats_turnaround
+        AFTER UPDATE OF status, check_in_time, check_out_time, issue ON Transactions
+        BEGIN{_turnaround_stats_sql("OLD", -1)}{_turnaround_stats_sql("NEW", 1)}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_stats_visits
+        AFTER UPDATE OF check_in_time, asset_tag ON Transactions
+        WHEN OLD.check_in_time IS NOT NEW.check_in_time OR OLD.asset_tag IS NOT NEW.asset_tag
+        BEGIN{_visit_stats_sql("OLD", -1)}{_visit_stats_sql("NEW", 1)}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_stats_delete
+        AFTER DELETE ON Transactions
+        BEGIN{_visit_stats_sql("OLD", -1)}{_turnaround_stats_sql("OLD", -1)}
+        END
+        """,
+    )),
+    # Monthly partitions of archived completed transactions (see archive.py),
+    # one row per file.  The id and check-out ranges let reads skip the
+    # partitions that cannot hold the rows they want.
+    (8, (
+        """
+        CREATE TABLE IF NOT EXISTS ArchivePartitions (
+            month TEXT PRIMARY KEY,
+            file TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            first_id INTEGER NOT NULL,
+            last_id INTEGER NOT NULL,
+            first_check_out DATETIME NOT NULL,
+            last_check_out DATETIME NOT NULL,
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        """,
+    )),
+    # One receipt for several transactions (batch check-out): batch holds
+    # all their ids as a JSON array, transaction_id the first of them.
+    (9, (
+        "ALTER TABLE EmailOutbox ADD COLUMN batch TEXT",
+    )),
+    # Append-only change feed (see changefeed.py), written by triggers in the
+    # writer's own transaction, so it holds exactly the committed changes in
+    # commit order.  Employee events carry the name only: the feed is served
+    # to wall displays.  Deleting a completed row (archive.py) is not an
+    # event, and bulk.py writes one 'reset' event per history chunk in
+    # place of a row each.  Every 1024th event trims the oldest past FEED_RETAIN.
+    (10, (
+        """
+        CREATE TABLE IF NOT EXISTS ChangeFeed (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            op TEXT NOT NULL,
+            key INTEGER,
+            row TEXT,
+            at REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0)
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_feed_insert
+        AFTER INSERT ON Transactions
+        BEGIN{_feed_transaction_sql("insert", "NEW")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_feed_update
+        AFTER UPDATE ON Transactions
+        BEGIN{_feed_transaction_sql("update", "NEW")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_feed_delete
+        AFTER DELETE ON Transactions
+        WHEN OLD.status = 'Checked-In'
+        BEGIN{_feed_transaction_sql("delete", "OLD")}
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_employees_feed_insert
+        AFTER INSERT ON Employees
+        BEGIN
+            INSERT INTO ChangeFeed (entity, op, key, row)
+            VALUES ('employee', 'insert', NEW.employee_id,
+                    json_object('employee_id', NEW.employee_id, 'name', NEW.name));
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_employees_feed_name
+        AFTER UPDATE OF name ON Employees
+        WHEN NEW.name IS NOT OLD.name
+        BEGIN
+            INSERT INTO ChangeFeed (entity, op, key, row)
+            VALUES ('employee', 'update', NEW.employee_id,
+                    json_object('employee_id', NEW.employee_id, 'name', NEW.name));
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_change_feed_trim
+        AFTER INSERT ON ChangeFeed
+        WHEN NEW.seq % 1024 = 0
+        BEGIN
+            DELETE FROM ChangeFeed WHERE seq <= NEW.seq - {FEED_RETAIN};
+        END
+        """,
+    )),
+    # Where each asset is now: its latest check-in (by check_in_time), that
+    # transaction's status and holder, and when it was last seen (check-out,
+    # else check-in).  Triggers recompute an asset's row from the new
+    # (asset_tag, check_in_time) index whenever one of its transactions
+    # changes, which replaces the plain asset_tag index.  record_check_in
+    # reads it to refuse a second check-in of an asset still checked in.
+    (11, (
+        "CREATE INDEX IF NOT EXISTS ix_transactions_asset_history ON Transactions(asset_tag, check_in_time)",
+        "DROP INDEX IF EXISTS ix_transactions_asset_tag",
+        """
+        CREATE TABLE IF NOT EXISTS AssetState (
+            asset_tag INTEGER NOT NULL PRIMARY KEY,
+            transaction_id INTEGER NOT NULL,
+            employee_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            last_seen DATETIME
+        ) WITHOUT ROWID
+        """,
+        _asset_state_sql("SELECT asset_tag AS tag FROM Transactions"),
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_asset_insert
+        AFTER INSERT ON Transactions
+        BEGIN{_asset_state_sql("SELECT NEW.asset_tag AS tag")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_asset_update
+        AFTER UPDATE OF asset_tag, employee_id, status, check_in_time, check_out_time ON Transactions
+        BEGIN{_asset_state_sql("SELECT OLD.asset_tag AS tag UNION SELECT NEW.asset_tag")}
+            DELETE FROM AssetState
+            WHERE asset_tag = OLD.asset_tag AND transaction_id = OLD.transaction_id AND OLD.asset_tag IS NOT NEW.asset_tag;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_asset_delete
+        AFTER DELETE ON Transactions
+        BEGIN{_asset_state_sql("SELECT OLD.asset_tag AS tag")}
+            DELETE FROM AssetState WHERE asset_tag = OLD.asset_tag AND transaction_id = OLD.transaction_id;
+        END
+        """,
+    )),
+    # Kiosk journal entries the store has applied, by idempotency key (see
+    # kiosk.py), so an entry replayed after a lost reply returns its first
+    # outcome instead of being applied again.
+    (12, (
+        """
+        CREATE TABLE IF NOT EXISTS KioskOps (
+            op_key TEXT NOT NULL PRIMARY KEY,
+            outcome TEXT NOT NULL CHECK(outcome IN ('applied', 'adopted', 'superseded', 'conflict')),
+            transaction_id INTEGER,
+            message TEXT NOT NULL DEFAULT '',
+            applied_at REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0)
+        ) WITHOUT ROWID
+        """,
+    )),
+    # Check-outs in UTC (see _check_outs_to_utc), and AssetVisitCounts
+    # rebuilt WITHOUT ROWID: as a rowid alias its asset_tag refused any tag
+    # that is not an integer, failing the check-in that counted it.
+    (13, (
+        _check_outs_to_utc,
+        "CREATE TABLE AssetVisitCounts_rebuild AS SELECT asset_tag, n, last_check_in FROM AssetVisitCounts",
+        "DROP TABLE AssetVisitCounts",
+        """
+        CREATE TABLE AssetVisitCounts (
+            asset_tag INTEGER NOT NULL PRIMARY KEY,
+            n INTEGER NOT NULL DEFAULT 0,
+            last_check_in DATETIME
+        ) WITHOUT ROWID
+        """,
+        "INSERT INTO AssetVisitCounts SELECT asset_tag, n, last_check_in FROM AssetVisitCounts_rebuild",
+        "DROP TABLE AssetVisitCounts_rebuild",
+        "CREATE INDEX IF NOT EXISTS ix_asset_visits_n ON AssetVisitCounts(n DESC, asset_tag)",
+    )),
+    # The asset tags each archive partition holds, so an asset's history
+    # opens only the partitions it is in.
+    (14, (
+        """
+        CREATE TABLE IF NOT EXISTS ArchivedAssets (
+            asset_tag INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            PRIMARY KEY (asset_tag, month)
+        ) WITHOUT ROWID
+        """,
+        _index_archived_assets,
+    )),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def schema_version():
+    with database_connection() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(target=None):
+    """Apply pending migrations up to target (default: latest) in one transaction."""
+    target = SCHEMA_VERSION if target is None else target
+    current = schema_version()
+    if current >= target:
+        return current              # up to date: don't take the write lock
+    with unit_of_work() as conn:
+        # Re-read under the write lock so concurrent processes don't both migrate
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, statements in MIGRATIONS:
+            if version < number <= target:
+                for statement in statements:
+                    if callable(statement):     # a step too big for one statement
+                        statement(conn)
+                    else:
+                        conn.execute(statement)
+                conn.execute(f"PRAGMA user_version={number}")
+                version = number
+    return version
+
+# ---------------- Archive partitions ----------------
+# archive.py moves old completed transactions out of Transactions into one
+# SQLite file per check-out month, <database name>_archive/transactions_YYYY_MM.db,
+# with the same columns.  view_completed_transactions, get_transaction_details
+# and page_transactions read those files as well.  The day counters and the
+# analytics tables still count archived rows; the search index does not.
+Partition = namedtuple("Partition", "month path n first_id last_id first_check_out last_check_out")
+
+def archive_dir(path=None):
+    """Folder of the monthly partitions of a database file (default: the pool's)."""
+    return os.path.splitext(os.path.abspath(path or get_pool().path))[0] + "_archive"
+
+def archive_partitions(conn, where="1", params=()):
+    """Catalogued partitions matching `where`, newest check-outs first."""
+    folder = archive_dir()
+    return [
+        Partition(month, os.path.join(folder, file), *rest)
+        for month, file, *rest in conn.execute(f"""
+            SELECT month, file, n, first_id, last_id, first_check_out, last_check_out
+            FROM ArchivePartitions WHERE {where} ORDER BY last_check_out DESC
+        """, params)
+    ]
+
+@contextmanager
+def partition_connection(partition):
+    """Read-only connection to one partition file."""
+    conn = sqlite3.connect(pathlib.Path(partition.path).as_uri() + "?mode=ro", uri=True)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+# ---------------- DB helpers ----------------
+class AlreadyCheckedIn(ValueError):
+    """The asset's latest transaction is still open; check it out first."""
+
+    def __init__(self, asset_tag, transaction_id, employee_id):
+        super().__init__(f"Asset {asset_tag} is already checked in (Tx#{transaction_id}, "
+                         f"Employee {employee_id}). Check it out before checking it in again.")
+        self.asset_tag = asset_tag
+        self.transaction_id = transaction_id
+        self.employee_id = employee_id
+
+def tables():
+    migrate()
+
+@traced("db.ensure_laptop_exists")
+def ensure_laptop_exists(asset_tag: str):
+    with database_connection() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO Laptops (asset_tag, model, description) VALUES (?, '', '')",
+            (str(asset_tag),)
+        )
+    bump_data_version()
+
+@traced("db.ensure_employee_exists")
+def ensure_employee_exists(employee_id: int, name: str = "", email: str = ""):
+    """Create a minimal employee row if it doesn't exist (name/email can be empty strings)."""
+    with database_connection() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO Employees (employee_id, name, email) VALUES (?, ?, ?)",
+            (int(employee_id), name or "", email or "")
+        )
+    bump_data_version()
+
+@traced("db.upsert_employee")
+def upsert_employee(employee_id: int, name: str, email: str):
+    """Update name/email if provided; create row if missing."""
+    name = (name or "").strip()
+    email = (email or "").strip()
+    if not email:
+        return
+    with database_connection() as conn:
+        cur = conn.execute("UPDATE Employees SET name=?, email=? WHERE employee_id=?", (name, email, int(employee_id)))
+        if cur.rowcount == 0:
+            conn.execute("INSERT INTO Employees (employee_id, name, email) VALUES (?, ?, ?)", (int(employee_id), name, email))
+    bump_data_version()
+
+@traced("db.record_check_in")
+def record_check_in(employee_id, asset_tag, issue, name: str = "", email: str = "", conn=None):
+    """Upsert the employee, ensure the laptop and insert the transaction atomically.
+
+    Returns the new transaction row in the same shape as get_transaction_details().
+    Name/email only overwrite an existing employee when an email is given,
+    matching upsert_employee().  Raises AlreadyCheckedIn if the asset is
+    still checked in.  Pass `conn` to insert inside an open unit of work;
+    the caller then bumps the data version once it commits.
+    """
+    if conn is not None:
+        return _insert_check_in(conn, employee_id, asset_tag, issue, name, email)
+    with unit_of_work() as conn:
+        row = _insert_check_in(conn, employee_id, asset_tag, issue, name, email)
+    bump_data_version()
+    return row
+
+def _insert_check_in(conn, employee_id, asset_tag, issue, name="", email="", check_in_time=None):
+    """record_check_in() inside an open unit of work; check_in_time defaults to now."""
+    name = (name or "").strip()
+    email = (email or "").strip()
+    # Under the write lock, so two kiosks cannot both pass this check
+    held = conn.execute(
+        "SELECT transaction_id, employee_id FROM AssetState WHERE asset_tag = ? AND status = 'Checked-In'",
+        (str(asset_tag),)
+    ).fetchone()
+    if held:
+        raise AlreadyCheckedIn(asset_tag, *held)
+    conn.execute("""
+        INSERT INTO Employees (employee_id, name, email) VALUES (?, ?, ?)
+        ON CONFLICT(employee_id) DO UPDATE SET name=excluded.name, email=excluded.email
+        WHERE excluded.email <> ''
+    """, (int(employee_id), name, email))
+    conn.execute(
+        "INSERT OR IGNORE INTO Laptops (asset_tag, model, description) VALUES (?, '', '')",
+        (str(asset_tag),)
+    )
+    return conn.execute("""
+        INSERT INTO Transactions (employee_id, asset_tag, issue, check_in_time)
+        VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        RETURNING transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time, status
+    """, (int(employee_id), str(asset_tag), issue, check_in_time)).fetchall()[0]
+
+def check_in(employee_id, asset_tag, issue):
+    return record_check_in(employee_id, asset_tag, issue)[0]
+
+
+@traced("db.check_out")
+def check_out(transaction_id):
+    """Close a checked-in transaction; False if it was missing or already checked out."""
+    with database_connection() as connect:
+        closed = connect.execute("""
+            UPDATE Transactions
+            SET check_out_time=CURRENT_TIMESTAMP, status='Checked-Out'
+            WHERE transaction_id=? AND status='Checked-In'
+        """, (transaction_id,)).rowcount == 1
+    bump_data_version()
+    return closed
+
+@traced("db.check_out_many")
+def check_out_many(transaction_ids, conn=None):
+    """Close every checked-in transaction among transaction_ids in one statement.
+
+    Returns the closed rows, shaped like get_transaction_details(), in id
+    order; ids that were missing or already checked out are left out.
+    Pass `conn` to update inside an open unit of work, as in record_check_in().
+    """
+    if conn is not None:
+        return _check_out_many(conn, transaction_ids)
+    with database_connection() as conn:
+        rows = _check_out_many(conn, transaction_ids)
+    bump_data_version()
+    return rows
+
+def _check_out_many(conn, transaction_ids):
+    ids = json.dumps(sorted({int(i) for i in transaction_ids}))
+    return sorted(conn.execute("""
+        UPDATE Transactions
+        SET check_out_time=CURRENT_TIMESTAMP, status='Checked-Out'
+        WHERE transaction_id IN (SELECT value FROM json_each(?)) AND status='Checked-In'
+        RETURNING transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time, status
+    """, (ids,)).fetchall())
+
+
+ACTIVE_QUERY = """
+    SELECT transaction_id, employee_id, asset_tag, issue, check_in_time
+    FROM Transactions
+    WHERE status='Checked-In'
+    ORDER BY check_in_time DESC
+"""
+
+@traced("db.view_active_transactions")
+def view_active_transactions():
+    import pandas as pd
+    with database_connection() as connect:
+        return pd.read_sql(ACTIVE_QUERY, connect)
+
+
+@traced("db.view_completed_transactions")
+def view_completed_transactions():
+    """Every completed transaction, archived ones included, newest check-out first."""
+    import pandas as pd
+    sql = """
+        SELECT transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time
+        FROM Transactions
+        WHERE status='Checked-Out'
+        ORDER BY check_out_time DESC
+    """
+    with database_connection() as connect:
+        frame = pd.read_sql(sql, connect)
+        partitions = archive_partitions(connect)
+    if not partitions:
+        return frame
+    frames = [frame]
+    for partition in partitions:
+        with partition_connection(partition) as conn:
+            frames.append(pd.read_sql(sql, conn))
+    frame = pd.concat([f for f in frames if not f.empty] or frames[:1], ignore_index=True)
+    # Already in order unless history older than the archive was imported since
+    if not frame["check_out_time"].is_monotonic_decreasing:
+        frame = frame.sort_values("check_out_time", ascending=False, kind="stable", ignore_index=True)
+    return frame
+
+@traced("db.get_transaction_details")
+def get_transaction_details(transaction_id):
+    sql = """
+        SELECT transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time, status
+        FROM Transactions WHERE transaction_id = ?
+    """
+    params = (int(transaction_id),)
+    with database_connection() as conn:
+        row = conn.execute(sql, params).fetchone()
+        partitions = [] if row else archive_partitions(conn, "? BETWEEN first_id AND last_id", params)
+    for partition in partitions:
+        with partition_connection(partition) as part:
+            row = part.execute(sql, params).fetchone()
+        if row:
+            break
+    return row
+
+@traced("db.get_employee_meta")
+def get_employee_meta(employee_id: int, conn=None):
+    sql, params = "SELECT name, email FROM Employees WHERE employee_id=?", (int(employee_id),)
+    if conn is None:
+        with database_connection() as conn:
+            row = conn.execute(sql, params).fetchone()
+    else:
+        row = conn.execute(sql, params).fetchone()
+    if row:
+        return row[0], row[1]
+    return None, None
+
+# ---------------- Paginated history ----------------
+HISTORY_TIME_COLUMN = {"Checked-Out": "check_out_time", "Checked-In": "check_in_time"}
+
+def history_range(start, end):
+    """Inclusive date bounds as SQL text bounds on a DATETIME column."""
+    low = str(start) if start else None
+    high = f"{end} 23:59:59.999999" if end else None
+    return low, high
+
+def history_clauses(status=None, start=None, end=None):
+    """WHERE clauses and parameters for a status and inclusive date range.
+
+    Dates apply to the check-out time for completed rows, else check-in.
+    """
+    column = HISTORY_TIME_COLUMN.get(status, "check_in_time")
+    low, high = history_range(start, end)
+    clauses, params = [], []
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if low:
+        clauses.append(f"{column} >= ?")
+        params.append(low)
+    if high:
+        clauses.append(f"{column} <= ?")
+        params.append(high)
+    return clauses, params
+
+@traced("db.page_transactions")
+def page_transactions(status="Checked-Out", start=None, end=None, after=None, page_size=50):
+    """One page of history, newest first, filtered and ordered in SQL.
+
+    Pages are keyset-based: pass the (time, transaction_id) of the last row
+    of the previous page as `after`, so every page costs the same no matter
+    how deep into the history it is.  Completed pages continue into the
+    archive partitions, reading only those that can still reach the page.
+    """
+    import pandas as pd
+    column = HISTORY_TIME_COLUMN[status]
+    clauses, params = history_clauses(status, start, end)
+    if after:
+        clauses.append(f"({column}, transaction_id) < (?, ?)")
+        params.extend(after)
+    sql = f"""
+        SELECT transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time
+        FROM Transactions
+        WHERE {" AND ".join(clauses)}
+        ORDER BY {column} DESC, transaction_id DESC
+        LIMIT ?
+    """
+    params.append(int(page_size))
+    with database_connection() as conn:
+        page = pd.read_sql(sql, conn, params=params)
+        partitions = archive_partitions(conn, *_archived_range(start, end, after)) if status == "Checked-Out" else []
+    for partition in partitions:
+        # Newest first: once a full page is newer than this partition, it is final
+        if len(page) >= page_size and page[column].iloc[-1] > partition.last_check_out:
+            break
+        with partition_connection(partition) as part:
+            rows = pd.read_sql(sql, part, params=params)
+        if not rows.empty:
+            page = rows if page.empty else pd.concat([page, rows], ignore_index=True).sort_values(
+                [column, "transaction_id"], ascending=False, ignore_index=True).head(page_size)
+    return page
+
+def _archived_range(start, end, after):
+    """WHERE clause and parameters picking the partitions a completed page can read."""
+    low, high = history_range(start, end)
+    clauses, params = ["1"], []
+    if low:
+        clauses.append("last_check_out >= ?")
+        params.append(low)
+    if high:
+        clauses.append("first_check_out <= ?")
+        params.append(high)
+    if after:
+        clauses.append("first_check_out <= ?")
+        params.append(after[0])
+    return " AND ".join(clauses), params
+
+def page_cursor(page, status="Checked-Out"):
+    """The `after` key that continues from the last row of page."""
+    if page.empty:
+        return None
+    last = page.iloc[-1]
+    return (last[HISTORY_TIME_COLUMN[status]], int(last["transaction_id"]))
+
+@traced("db.count_transactions")
+def count_transactions(status="Checked-Out", start=None, end=None):
+    """Row count from the trigger-maintained day counters (one row per day)."""
+    clauses, params = ["status = ?"], [status]
+    if start:
+        clauses.append("day >= ?")
+        params.append(str(start))
+    if end:
+        clauses.append("day <= ?")
+        params.append(str(end))
+    with database_connection() as conn:
+        return conn.execute(
+            f"SELECT COALESCE(SUM(n), 0) FROM TransactionDayCounts WHERE {' AND '.join(clauses)}",
+            params
+        ).fetchone()[0]
+
+# ---------------- Assets ----------------
+# AssetState (migration 11) answers "where is this laptop now" with one
+# primary-key read; an asset's history pages through the
+# (asset_tag, check_in_time) index like page_transactions().
+AssetStatus = namedtuple("AssetStatus", "asset_tag transaction_id employee_id name status last_seen")
+
+@traced("db.asset_status")
+def asset_status(asset_tag):
+    """The asset's current AssetStatus, or None if it was never checked in."""
+    with database_connection() as conn:
+        row = conn.execute("""
+            SELECT s.asset_tag, s.transaction_id, s.employee_id, COALESCE(e.name, ''), s.status, s.last_seen
+            FROM AssetState s LEFT JOIN Employees e ON e.employee_id = s.employee_id
+            WHERE s.asset_tag = ?
+        """, (str(asset_tag).strip(),)).fetchone()
+    return AssetStatus._make(row) if row else None
+
+@traced("db.asset_history")
+def asset_history(asset_tag, after=None, page_size=50):
+    """One page of an asset's transactions, newest check-in first, archived ones included.
+
+    `after` is the (check_in_time, transaction_id) of the previous page's
+    last row; asset_history_cursor() gives it.
+    """
+    import pandas as pd
+    clauses, params = ["asset_tag = ?"], [str(asset_tag).strip()]
+    if after:
+        clauses.append("(check_in_time, transaction_id) < (?, ?)")
+        params.extend(after)
+    sql = f"""
+        SELECT transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time, status
+        FROM Transactions
+        WHERE {" AND ".join(clauses)}
+        ORDER BY check_in_time DESC, transaction_id DESC
+        LIMIT ?
+    """
+    params.append(int(page_size))
+    with database_connection() as conn:
+        page = pd.read_sql(sql, conn, params=params)
+        partitions = archive_partitions(
+            conn, "month IN (SELECT month FROM ArchivedAssets WHERE asset_tag = ?)", params[:1])
+    for partition in partitions:
+        # Archived rows were checked in before they were checked out
+        if len(page) >= page_size and page["check_in_time"].iloc[-1] > partition.last_check_out:
+            break
+        with partition_connection(partition) as part:
+            rows = pd.read_sql(sql, part, params=params)
+        if not rows.empty:
+            page = rows if page.empty else pd.concat([page, rows], ignore_index=True).sort_values(
+                ["check_in_time", "transaction_id"], ascending=False, ignore_index=True).head(page_size)
+    return page
+
+def asset_history_cursor(page):
+    """The `after` key that continues from the last row of an asset_history() page."""
+    if page.empty:
+        return None
+    last = page.iloc[-1]
+    return (last["check_in_time"], int(last["transaction_id"]))
+
+def refresh_asset_state(conn, where, params=()):
+    """Recompute AssetState for the assets of the Transactions rows matching `where` (alias t)."""
+    conn.execute(_asset_state_sql(f"SELECT t.asset_tag AS tag FROM Transactions t WHERE {where}"), params)
+
+# ---------------- Kiosk sync ----------------
+# A kiosk journals check-ins and check-outs locally and replays them here in
+# batches (kiosk.py).  Each op names its own time, in UTC like
+# CURRENT_TIMESTAMP, check-ins and check-outs alike, so clamping one to the
+# other compares one clock.  A check-out points at a transaction_id, or at
+# the key of a check-in journalled on the same kiosk (`ref`), which
+# KioskOps resolves.
+KioskOp = namedtuple("KioskOp", "key kind employee_id asset_tag issue name email transaction_id ref at")
+KioskResult = namedtuple("KioskResult", "key outcome transaction message replayed")
+
+DETAIL_SQL = """
+    SELECT transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time, status
+    FROM Transactions WHERE transaction_id = ?
+"""
+
+@traced("db.apply_kiosk_ops")
+def apply_kiosk_ops(ops):
+    """Apply KioskOps in order in one transaction; returns a KioskResult per op.
+
+    Outcomes: 'applied'; 'adopted' (a check-in of an asset already checked
+    in for the same employee maps to that transaction); 'superseded' (a
+    check-out of a transaction already checked out elsewhere, which stands);
+    'conflict' (anything else a person has to look at).  An op whose key
+    was applied before returns its first outcome with replayed=True.
+    """
+    with unit_of_work() as conn:
+        results = [_apply_kiosk_op(conn, op) for op in ops]
+    bump_data_version()
+    return results
+
+def _apply_kiosk_op(conn, op):
+    done = conn.execute("SELECT outcome, transaction_id, message FROM KioskOps WHERE op_key = ?",
+                        (op.key,)).fetchone()
+    if done:
+        outcome, transaction_id, message = done
+        row = conn.execute(DETAIL_SQL, (transaction_id,)).fetchone() if transaction_id else None
+        return KioskResult(op.key, outcome, row, message, True)
+    if op.kind == "check_in":
+        # Not dated before the asset's latest check-in, or AssetState would
+        # go on showing that one while this transaction is open
+        at = conn.execute("SELECT max(?, COALESCE(max(check_in_time), '')) FROM Transactions WHERE asset_tag = ?",
+                          (op.at, str(op.asset_tag))).fetchone()[0]
+        try:
+            outcome, row, message = "applied", _insert_check_in(
+                conn, op.employee_id, op.asset_tag, op.issue, op.name, op.email, at), ""
+        except AlreadyCheckedIn as e:
+            row = conn.execute(DETAIL_SQL, (e.transaction_id,)).fetchone()
+            if e.employee_id == int(op.employee_id):
+                outcome, message = "adopted", f"Already checked in as Tx#{e.transaction_id}; kept that transaction."
+            else:
+                outcome, row, message = "conflict", None, str(e)
+    else:
+        outcome, row, message = _kiosk_check_out(conn, op)
+    conn.execute("INSERT INTO KioskOps (op_key, outcome, transaction_id, message) VALUES (?, ?, ?, ?)",
+                 (op.key, outcome, row[0] if row else None, message))
+    return KioskResult(op.key, outcome, row, message, False)
+
+def _kiosk_check_out(conn, op):
+    transaction_id = op.transaction_id
+    if transaction_id is None:
+        ref = conn.execute("SELECT transaction_id FROM KioskOps WHERE op_key = ?", (op.ref,)).fetchone()
+        if not (ref and ref[0]):
+            return "conflict", None, "Its check-in was not recorded by the service desk."
+        transaction_id = ref[0]
+    # Not before its check-in, which may have been adopted from another desk
+    row = conn.execute("""
+        UPDATE Transactions SET check_out_time = MAX(?, check_in_time), status = 'Checked-Out'
+        WHERE transaction_id = ? AND status = 'Checked-In'
+        RETURNING transaction_id, employee_id, asset_tag, issue, check_in_time, check_out_time, status
+    """, (op.at, int(transaction_id))).fetchone()
+    if row:
+        return "applied", row, ""
+    row = conn.execute(DETAIL_SQL, (int(transaction_id),)).fetchone()
+    if row is None:
+        return "conflict", None, f"Transaction {transaction_id} not found."
+    return "superseded", row, f"Already checked out elsewhere at {row[5]}."
+
+# ---------------- Analytics ----------------
+# Every read below touches only the trigger-maintained counters, so its
+# cost depends on the window asked for, not on the size of Transactions.
+def recent_hours(hours):
+    """'YYYY-MM-DD HH' labels of the last `hours` UTC hours, oldest first."""
+    import pandas as pd
+    end = pd.Timestamp.now("UTC").tz_localize(None).floor("h")
+    return pd.date_range(end=end, periods=int(hours), freq="h").strftime("%Y-%m-%d %H")
+
+def recent_days(days):
+    """'YYYY-MM-DD' labels of the last `days` UTC days, oldest first."""
+    import pandas as pd
+    end = pd.Timestamp.now("UTC").tz_localize(None).normalize()
+    return pd.date_range(end=end, periods=int(days), freq="D").strftime("%Y-%m-%d")
+
+@traced("db.checkins_per_hour")
+def checkins_per_hour(hours=24):
+    """Check-ins in each of the last `hours` UTC hours, oldest first (zero-filled)."""
+    import pandas as pd
+    index = recent_hours(hours)
+    with database_connection() as conn:
+        counts = dict(conn.execute(
+            "SELECT hour, n FROM CheckInHourCounts WHERE hour >= ?", (index[0],)
+        ).fetchall())
+    return pd.DataFrame({"hour": index, "checkins": [counts.get(h, 0) for h in index]})
+
+@traced("db.checkins_per_day")
+def checkins_per_day(days=30):
+    """Check-ins on each of the last `days` UTC days, oldest first (zero-filled)."""
+    import pandas as pd
+    index = recent_days(days)
+    with database_connection() as conn:
+        counts = dict(conn.execute("""
+            SELECT substr(hour, 1, 10), SUM(n) FROM CheckInHourCounts
+            WHERE hour >= ? GROUP BY 1
+        """, (index[0],)).fetchall())
+    return pd.DataFrame({"day": index, "checkins": [counts.get(d, 0) for d in index]})
+
+def turnaround_quantile(buckets, q):
+    """Upper bound of the histogram bucket holding quantile q; buckets = [(upper, n), ...] ascending."""
+    total = sum(n for _, n in buckets)
+    seen = 0
+    for upper, n in buckets:
+        seen += n
+        if total and seen >= q * total:
+            return upper
+    return None
+
+def turnaround_frame(rows):
+    """(issue_type, bucket upper seconds, n, total seconds) rows -> the turnaround table."""
+    import pandas as pd
+    stats = {}
+    for issue_type, upper, n, total in rows:
+        entry = stats.setdefault(issue_type, {"buckets": [], "total": 0.0})
+        entry["buckets"].append((upper, n))
+        entry["total"] += total
+    records = []
+    for issue_type, entry in stats.items():
+        completed = sum(n for _, n in entry["buckets"])
+        records.append((issue_type, completed, entry["total"] / completed / 3600,
+                        turnaround_quantile(entry["buckets"], 0.9) / 3600))
+    frame = pd.DataFrame(records, columns=["issue_type", "completed", "mean_hours", "p90_hours"])
+    return frame.sort_values("completed", ascending=False, ignore_index=True)
+
+@traced("db.turnaround_by_issue")
+def turnaround_by_issue():
+    """Completed count, mean and p90 turnaround hours per issue type, busiest first."""
+    with database_connection() as conn:
+        rows = conn.execute("""
+            SELECT s.issue_type, b.upper_seconds, s.n, s.total_seconds
+            FROM TurnaroundStats s JOIN TurnaroundBuckets b ON b.bucket = s.bucket
+            WHERE s.n > 0
+            ORDER BY s.issue_type, s.bucket
+        """).fetchall()
+    return turnaround_frame(rows)
+
+def add_history_stats(conn, where, params=()):
+    """Add the Transactions rows matching `where` (alias t) to the analytics counters.
+
+    One grouped pass instead of the per-row trigger, for bulk loads that
+    drop trg_transactions_stats_insert while they insert.
+    """
+    conn.execute(f"""
+        INSERT INTO CheckInHourCounts (hour, n)
+        SELECT strftime('%Y-%m-%d %H', t.check_in_time), COUNT(*) FROM Transactions t WHERE {where} GROUP BY 1
+        ON CONFLICT(hour) DO UPDATE SET n = n + excluded.n
+    """, params)
+    conn.execute(f"""
+        INSERT INTO AssetVisitCounts (asset_tag, n, last_check_in)
+        SELECT t.asset_tag, COUNT(*), MAX(t.check_in_time) FROM Transactions t WHERE {where} GROUP BY 1
+        ON CONFLICT(asset_tag) DO UPDATE
+        SET n = n + excluded.n, last_check_in = max(last_check_in, excluded.last_check_in)
+    """, params)
+    conn.execute(f"""
+        INSERT INTO TurnaroundStats (issue_type, bucket, n, total_seconds)
+        SELECT issue_type, bucket, COUNT(*), SUM(seconds)
+        FROM (
+            SELECT {_issue_type_sql("t")} AS issue_type, {_turnaround_sql("t")} AS seconds,
+                   (SELECT MIN(bucket) FROM TurnaroundBuckets WHERE upper_seconds >= {_turnaround_sql("t")}) AS bucket
+            FROM Transactions t
+            WHERE t.status = 'Checked-Out' AND t.check_out_time IS NOT NULL AND ({where})
+        )
+        GROUP BY issue_type, bucket
+        ON CONFLICT(issue_type, bucket) DO UPDATE
+        SET n = n + excluded.n, total_seconds = total_seconds + excluded.total_seconds
+    """, params)
+
+@traced("db.repeat_assets")
+def repeat_assets(limit=10, min_visits=2):
+    """Assets checked in most often: asset_tag, visits, last_check_in."""
+    import pandas as pd
+    with database_connection() as conn:
+        return pd.read_sql("""
+            SELECT asset_tag, n AS visits, last_check_in FROM AssetVisitCounts
+            WHERE n >= ? ORDER BY n DESC, asset_tag LIMIT ?
+        """, conn, params=(int(min_visits), int(limit)))
+
+# ---------------- Search ----------------
+SEARCH_COLUMNS = ("transaction_id", "asset_tag", "employee_id", "issue", "name")
+ACTIVE_COLUMNS = ("transaction_id", "employee_id", "asset_tag", "issue", "check_in_time")
+HISTORY_COLUMNS = ACTIVE_COLUMNS + ("check_out_time",)
+
+def result_columns(status):
+    """Same columns as view_active_transactions/view_completed_transactions."""
+    return ACTIVE_COLUMNS if status == "Checked-In" else HISTORY_COLUMNS
+
+def _sql_limit(limit):
+    return int(limit) if limit else -1
+
+def like_escape(text):
+    """`text` as a literal inside a LIKE pattern that says ESCAPE '\\'."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+@traced("db.search_transactions")
+def search_transactions(query, status=None, columns=SEARCH_COLUMNS, limit=200):
+    """Substring search over the trigram index, best matches first.
+
+    Every whitespace-separated term must appear in one of `columns`.  Rows
+    whose transaction id, asset tag or employee id start with the first term
+    rank ahead of other hits, then FTS5's bm25 rank decides.  Terms shorter
+    than three characters can't use a trigram index, so those queries fall
+    back to a LIKE scan.  limit=None returns every match.  Archived
+    transactions are not searched.
+    """
+    import pandas as pd
+    terms = query.split()
+    if not terms:
+        return pd.DataFrame(columns=result_columns(status))
+    if min(len(term) for term in terms) < 3:
+        return _search_like(terms, status, columns, limit)
+
+    expression = " AND ".join(_fts_phrase(term) for term in terms)
+    expression = "{%s} : (%s)" % (" ".join(columns), expression)
+    if status == "Checked-Out":
+        # Nearly every row is completed: excluding the few active rows is much
+        # cheaper than intersecting with a posting list the size of the table.
+        expression += ' NOT status : "Checked-In"'
+    elif status:
+        expression += f" AND status : {_fts_phrase(status)}"
+    prefix = like_escape(terms[0]) + "%"
+    with database_connection() as conn:
+        return pd.read_sql(f"""
+            WITH hits AS (
+                SELECT rowid AS transaction_id,
+                       (transaction_id LIKE ? ESCAPE '\\' OR asset_tag LIKE ? ESCAPE '\\'
+                        OR employee_id LIKE ? ESCAPE '\\') AS prefix_hit,
+                       rank
+                FROM TransactionSearch
+                WHERE TransactionSearch MATCH ?
+                ORDER BY prefix_hit DESC, rank
+                LIMIT ?
+            )
+            SELECT {", ".join("t." + c for c in result_columns(status))}
+            FROM hits JOIN Transactions t ON t.transaction_id = hits.transaction_id
+            ORDER BY hits.prefix_hit DESC, hits.rank
+        """, conn, params=(prefix, prefix, prefix, expression, _sql_limit(limit)))
+
+def _search_like(terms, status, columns, limit):
+    import pandas as pd
+    fields = {
+        "transaction_id": "t.transaction_id", "asset_tag": "t.asset_tag",
+        "employee_id": "t.employee_id", "issue": "t.issue", "name": "COALESCE(e.name, '')",
+    }
+    clauses, params = [], []
+    for term in terms:
+        clauses.append("(" + " OR ".join(f"{fields[c]} LIKE ? ESCAPE '\\'" for c in columns) + ")")
+        params.extend([f"%{like_escape(term)}%"] * len(columns))
+    if status:
+        clauses.append("t.status = ?")
+        params.append(status)
+    with database_connection() as conn:
+        return pd.read_sql(f"""
+            SELECT {", ".join("t." + c for c in result_columns(status))}
+            FROM Transactions t LEFT JOIN Employees e ON e.employee_id = t.employee_id
+            WHERE {" AND ".join(clauses)}
+            ORDER BY t.check_in_time DESC
+            LIMIT ?
+        """, conn, params=params + [_sql_limit(limit)])
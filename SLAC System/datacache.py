@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Read cache for Streamlit reruns.
+
+Every widget interaction reruns the whole page, re-running the same reads
+against unchanged data.  Functions wrapped with cached() keep their last
+results until a write bumps the data version (database.py does this in
+every helper that changes Transactions, Employees or Laptops) or the entry
+outlives its TTL, which bounds staleness from writes made by another
+process.  Hits return a copy, so callers may modify DataFrames freely.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 60.0         # seconds; only matters for writes from other processes
+MAX_ENTRIES = 256
+
+_data_version = 0
+_lock = threading.Lock()
+_entries = OrderedDict()   # key -> (version, stored_at, value, seconds to compute)
+_stats = {"hits": 0, "misses": 0, "saved": 0.0, "spent": 0.0}
+
+def data_version():
+    return _data_version
+
+def bump_data_version():
+    """Call after committing a write that cached reads could see."""
+    global _data_version
+    with _lock:
+        _data_version += 1
+
+def _copy(value):
+    return value.copy() if hasattr(value, "copy") else value
+
+def cached(fn=None, *, ttl=DEFAULT_TTL):
+    """Cache fn's results per (arguments, data version); usable bare or with ttl=."""
+    if fn is None:
+        return functools.partial(cached, ttl=ttl)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = (fn.__qualname__, args, tuple(sorted(kwargs.items())))
+        version, now = _data_version, time.monotonic()
+        with _lock:
+            entry = _entries.get(key)
+            if entry is not None and entry[0] == version and now - entry[1] < ttl:
+                _entries.move_to_end(key)
+                _stats["hits"] += 1
+                _stats["saved"] += entry[3]
+                return _copy(entry[2])
+
+        start = time.perf_counter()
+        value = fn(*args, **kwargs)
+        cost = time.perf_counter() - start
+        with _lock:
+            _entries[key] = (version, now, value, cost)
+            _entries.move_to_end(key)
+            while len(_entries) > MAX_ENTRIES:
+                _entries.popitem(last=False)
+            _stats["misses"] += 1
+            _stats["spent"] += cost
+        return _copy(value)
+
+    wrapper.uncached = fn
+    return wrapper
+
+def cache_stats():
+    """Running totals: hits, misses, seconds saved by hits, seconds spent on misses."""
+    with _lock:
+        return dict(_stats, entries=len(_entries))
+
+def stats_since(before):
+    """Difference between cache_stats() now and an earlier snapshot (e.g. one rerun)."""
+    now = cache_stats()
+    return {k: now[k] - before[k] for k in ("hits", "misses", "saved", "spent")}
+
+def clear():
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline kiosk mode: a local journal of check-ins and check-outs, and the
+thread that syncs it to the shared store.
+
+With SLAC_KIOSK_JOURNAL set to a file on the kiosk's own disk, the Check-In
+and Check-Out pages record each submit in that SQLite journal and return
+after one local commit, whether or not checkin_system.db's share, the
+PostgreSQL server or the network is up.  Each entry has an idempotency key
+and carries its signature; its receipt waits until the entry has synced.
+The sync thread replays pending entries in journal order, SYNC_BATCH at a
+time, each batch in one transaction of storage.apply_kiosk_ops().  The
+store keeps every key it applied, so a batch whose reply was lost is
+replayed without applying anything twice.  Once an entry has its
+transaction, its signature is stored and its receipt queued, as service.py
+does for a desk.
+
+The store settles conflicts in journal order (database.apply_kiosk_ops): a
+check-in of an asset already checked in for the same employee adopts that
+transaction; a check-out of a transaction already checked out elsewhere is
+superseded, so the store's check-out stands, without a second signature or
+receipt.  Anything else (the asset checked in for someone else, an unknown
+transaction) is a conflict, listed on the kiosk's sync panel for staff.
+"""
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+import database
+import service
+from database import KioskOp
+from signatures import save_signature
+from storage import get_storage
+
+log = logging.getLogger(__name__)
+
+JOURNAL_PATH = os.environ.get("SLAC_KIOSK_JOURNAL", "")
+SYNC_BATCH = 200          # journal entries per store transaction
+POLL_INTERVAL = 5.0       # idle wake-up when nothing was journalled
+RETRY_DELAY = 2.0         # first retry while the store is unreachable, then 4s, 8s, ...
+MAX_RETRY_DELAY = 60.0
+RETAIN_DAYS = 30          # settled entries kept for the sync panel and offline check-outs
+
+JOURNAL_SCHEMA = (
+    # synchronous=FULL: an entry the kiosk acknowledged survives a power cut
+    "PRAGMA synchronous=FULL",
+    """
+    CREATE TABLE IF NOT EXISTS KioskJournal (
+        entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        op_key TEXT NOT NULL UNIQUE,
+        kind TEXT NOT NULL CHECK(kind IN ('check_in', 'check_out')),
+        employee_id INTEGER,
+        asset_tag INTEGER,
+        issue TEXT,
+        name TEXT NOT NULL DEFAULT '',
+        email TEXT NOT NULL DEFAULT '',
+        transaction_id INTEGER,
+        ref TEXT,
+        batch TEXT,
+        sig_format TEXT,
+        sig_width INTEGER,
+        sig_height INTEGER,
+        sig_data BLOB,
+        recorded_at REAL NOT NULL,
+        state TEXT NOT NULL DEFAULT 'pending' CHECK(state IN ('pending', 'applied', 'done')),
+        outcome TEXT,
+        message TEXT NOT NULL DEFAULT '',
+        receipt TEXT NOT NULL DEFAULT '',
+        receipt_queued INTEGER NOT NULL DEFAULT 0,
+        synced_at REAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_kiosk_journal_state ON KioskJournal(state, entry_id)",
+    "CREATE INDEX IF NOT EXISTS ix_kiosk_journal_ref ON KioskJournal(ref) WHERE ref IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_kiosk_journal_transaction ON KioskJournal(transaction_id) "
+    "WHERE transaction_id IS NOT NULL",
+)
+
+# transaction_id: for a check-out of a transaction the store had, set when
+# journalled; otherwise filled in by the sync.  ref: a check-out of a
+# check-in still in this journal, by its key.  batch: check-outs signed together.
+Entry = namedtuple("Entry", "op_key kind employee_id asset_tag issue transaction_id ref batch recorded_at "
+                             "state outcome message receipt receipt_queued")
+Device = namedtuple("Device", "label transaction_id ref")
+Pending = namedtuple("Pending", "keys message")     # submitted, not synced yet
+SyncStatus = namedtuple("SyncStatus", "online pending conflicts oldest last_sync last_error synced seconds")
+
+PENDING_MESSAGE = ("Saved on this kiosk. It reaches the service desk as soon as the connection allows, "
+                   "and the receipt email is sent then.")
+
+
+def enabled():
+    return bool(JOURNAL_PATH)
+
+def unreachable(error):
+    """Whether `error` means the store cannot be reached right now, so the sync retries."""
+    if isinstance(error, (sqlite3.OperationalError, OSError)):
+        return True
+    psycopg = sys.modules.get("psycopg")          # only loaded with a PostgreSQL store
+    return psycopg is not None and isinstance(error, psycopg.OperationalError)
+
+def _number(value, label):
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{label} must be a number.") from None
+
+def _op_time(recorded_at):
+    """An entry's time as the store writes it: UTC, check-ins and check-outs alike."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(recorded_at))
+
+
+# ---------------- Journal ----------------
+class Journal:
+    """The kiosk's SQLite journal, on one connection shared by the pages and the sync thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = database.open_connection(path)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            for statement in JOURNAL_SCHEMA:
+                self.conn.execute(statement)
+
+    def _select(self, where, params=(), order="entry_id", limit=-1):
+        with self.lock:
+            rows = self.conn.execute(f"SELECT {', '.join(Entry._fields)} FROM KioskJournal "
+                                     f"WHERE {where} ORDER BY {order} LIMIT ?", (*params, limit)).fetchall()
+        return [Entry._make(row) for row in rows]
+
+    # ---- Writes from the pages ----
+    def check_in(self, employee_id, asset_tag, issue, name="", email="", signature=None):
+        """Journal a check-in; returns its key.
+
+        Refused while this journal has the asset checked in and not yet
+        synced; the store refuses the rest when the entry syncs.
+        """
+        key = uuid.uuid4().hex
+        fmt, width, height, data = signature or (None, None, None, None)
+        with self.lock, self.conn:
+            held = self.conn.execute("""
+                SELECT recorded_at FROM KioskJournal j
+                WHERE kind = 'check_in' AND asset_tag = ? AND state = 'pending'
+                  AND NOT EXISTS (SELECT 1 FROM KioskJournal o WHERE o.ref = j.op_key)
+            """, (asset_tag,)).fetchone()
+            if held:
+                raise ValueError(f"Asset {asset_tag} was already checked in on this kiosk at "
+                                 f"{datetime.fromtimestamp(held[0]):%H:%M} and has not synced yet.")
+            self.conn.execute("""
+                INSERT INTO KioskJournal (op_key, kind, employee_id, asset_tag, issue, name, email,
+                                          sig_format, sig_width, sig_height, sig_data, recorded_at)
+                VALUES (?, 'check_in', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (key, employee_id, asset_tag, issue, (name or "").strip(), (email or "").strip(),
+                  fmt, width, height, data, time.time()))
+        return key
+
+    def check_out(self, transaction_ids=(), refs=(), signature=None):
+        """Journal check-outs of transactions and of this journal's check-ins under one signature.
+
+        Returns their keys; anything this journal already checks out is left out.
+        """
+        batch = uuid.uuid4().hex
+        fmt, width, height, data = signature or (None, None, None, None)
+        now = time.time()
+        keys = []
+        with self.lock, self.conn:
+            for transaction_id, ref in [(int(i), None) for i in transaction_ids] + [(None, r) for r in refs]:
+                employee_id = asset_tag = None
+                if ref is not None:
+                    # Point at the transaction directly once the check-in has one
+                    row = self.conn.execute("SELECT employee_id, asset_tag, transaction_id FROM KioskJournal "
+                                            "WHERE op_key = ?", (ref,)).fetchone()
+                    employee_id, asset_tag, transaction_id = row or (None, None, None)
+                    ref = None if transaction_id else ref
+                if self.conn.execute("""
+                    SELECT 1 FROM KioskJournal
+                    WHERE kind = 'check_out' AND (transaction_id = ? OR ref = ?)
+                      AND COALESCE(outcome, 'applied') = 'applied'
+                """, (transaction_id, ref)).fetchone():
+                    continue
+                key = uuid.uuid4().hex
+                self.conn.execute("""
+                    INSERT INTO KioskJournal (op_key, kind, employee_id, asset_tag, transaction_id, ref, batch,
+                                              sig_format, sig_width, sig_height, sig_data, recorded_at)
+                    VALUES (?, 'check_out', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (key, employee_id, asset_tag, transaction_id, ref, batch, fmt, width, height, data, now))
+                keys.append(key)
+        return keys
+
+    # ---- The sync thread's side ----
+    def pending(self, limit=SYNC_BATCH):
+        """The oldest unsynced entries as KioskOps."""
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT op_key, kind, employee_id, asset_tag, issue, name, email, transaction_id, ref, recorded_at
+                FROM KioskJournal WHERE state = 'pending' ORDER BY entry_id LIMIT ?
+            """, (int(limit),)).fetchall()
+        return [KioskOp(*row[:-1], _op_time(row[-1])) for row in rows]
+
+    def record(self, results):
+        """Store the store's KioskResults: applied entries still need their signature and receipt."""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany("""
+                UPDATE KioskJournal
+                SET state = ?, outcome = ?, message = ?, synced_at = ?,
+                    transaction_id = COALESCE(?, transaction_id),
+                    employee_id = COALESCE(?, employee_id), asset_tag = COALESCE(?, asset_tag)
+                WHERE op_key = ?
+            """, [("applied" if r.outcome == "applied" else "done", r.outcome, r.message, now,
+                   *((r.transaction[0], r.transaction[1], r.transaction[2]) if r.transaction else (None,) * 3),
+                   r.key) for r in results])
+
+    def applied(self):
+        """Entries the store has applied, with their signatures: (Entry, signature or None)."""
+        with self.lock:
+            rows = self.conn.execute(f"""
+                SELECT {', '.join(Entry._fields)}, sig_format, sig_width, sig_height, sig_data
+                FROM KioskJournal WHERE state = 'applied' ORDER BY entry_id
+            """).fetchall()
+        return [(Entry._make(row[:len(Entry._fields)]), tuple(row[-4:]) if row[-4] else None) for row in rows]
+
+    def mark_done(self, receipts):
+        """Settle applied entries; `receipts` maps each key to its service.Receipt."""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "UPDATE KioskJournal SET state = 'done', receipt = ?, receipt_queued = ? WHERE op_key = ?",
+                [(receipt.message, receipt.queued, key) for key, receipt in receipts.items()]
+            )
+
+    def prune(self, days=RETAIN_DAYS):
+        with self.lock, self.conn:
+            return self.conn.execute("DELETE FROM KioskJournal WHERE state = 'done' AND synced_at < ?",
+                                     (time.time() - days * 86400,)).rowcount
+
+    # ---- Reads ----
+    def entries(self, keys):
+        by_key = {entry.op_key: entry for entry in self._select(
+            f"op_key IN ({', '.join('?' * len(keys))})", tuple(keys))}
+        return [by_key[key] for key in keys]
+
+    def open_check_ins(self, search=""):
+        """This journal's check-ins that no journalled check-out covers, newest first."""
+        like = f"%{database.like_escape(search.strip())}%"
+        return self._select("""
+            kind = 'check_in' AND COALESCE(outcome, 'applied') IN ('applied', 'adopted')
+            AND NOT EXISTS (SELECT 1 FROM KioskJournal o WHERE o.kind = 'check_out'
+                            AND (o.ref = KioskJournal.op_key OR o.transaction_id = KioskJournal.transaction_id))
+            AND (CAST(asset_tag AS TEXT) LIKE ? ESCAPE '\\' OR CAST(employee_id AS TEXT) LIKE ? ESCAPE '\\'
+                 OR issue LIKE ? ESCAPE '\\' OR name LIKE ? ESCAPE '\\')
+        """, (like,) * 4, order="entry_id DESC")
+
+    def conflicts(self, limit=50):
+        return self._select("outcome = 'conflict'", order="entry_id DESC", limit=int(limit))
+
+    def counts(self):
+        """(unsynced entries, conflicts, recorded_at of the oldest unsynced entry or None)."""
+        with self.lock:
+            return self.conn.execute("""
+                SELECT COALESCE(SUM(state <> 'done'), 0), COALESCE(SUM(outcome = 'conflict'), 0),
+                       MIN(CASE WHEN state <> 'done' THEN recorded_at END)
+                FROM KioskJournal
+            """).fetchone()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# ---------------- Sync ----------------
+class KioskSync(threading.Thread):
+    """Daemon thread that replays the journal to the store whenever it is reachable.
+
+    `storage` defaults to get_storage() at each attempt.  While the store
+    is unreachable the thread retries with doubling delays, and at once
+    when something new is journalled.
+    """
+
+    def __init__(self, journal, storage=None, batch=SYNC_BATCH, poll_interval=POLL_INTERVAL):
+        super().__init__(name="kiosk-sync", daemon=True)
+        self.journal = journal
+        self.storage = storage
+        self.batch = batch
+        self.poll_interval = poll_interval
+        self.online = None              # unknown until the first replay
+        self.last_error = None
+        self.last_sync = None
+        self.synced = 0                 # entries replayed by this thread
+        self.seconds = 0.0              # time spent replaying them
+        self.pruned_at = 0.0
+        self.settled = threading.Condition()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def run(self):
+        failures = 0
+        while not self._stopping.is_set():
+            try:
+                replayed = self.sync_once()
+            except Exception as e:
+                failures += 1
+                self.online, self.last_error = False, str(e)
+                with self.settled:
+                    self.settled.notify_all()       # pages waiting on a sync stop waiting
+                if unreachable(e):
+                    log.warning("Kiosk sync: store unreachable (%s); retrying", e)
+                else:
+                    log.exception("Kiosk sync failed")
+                self._wake.wait(min(RETRY_DELAY * 2 ** (failures - 1), MAX_RETRY_DELAY))
+                self._wake.clear()
+                continue
+            failures = 0
+            if not replayed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def sync_once(self):
+        """Replay one batch and follow up what it applied; returns the number of entries replayed."""
+        self.follow_up()
+        ops = self.journal.pending(self.batch)
+        if not ops:
+            return 0
+        start = time.perf_counter()
+        results = self._apply(self.storage or get_storage(), ops)
+        self.journal.record(results)
+        self.follow_up({r.key: r.transaction for r in results})
+        self.seconds += time.perf_counter() - start
+        self.synced += len(ops)
+        self.online, self.last_error, self.last_sync = True, None, time.time()
+        with self.settled:
+            self.settled.notify_all()
+        if time.time() - self.pruned_at > 3600:
+            self.journal.prune()
+            self.pruned_at = time.time()
+        return len(ops)
+
+    def _apply(self, store, ops):
+        """store.apply_kiosk_ops(ops), one op at a time if the batch fails for a reason of its own.
+
+        An op the store rejects with an error other than unreachability is
+        settled as a conflict, so it cannot hold up the rest of the journal.
+        """
+        try:
+            return store.apply_kiosk_ops(ops)
+        except Exception as e:
+            if unreachable(e):
+                raise
+            if len(ops) > 1:
+                return [result for op in ops for result in self._apply(store, [op])]
+            log.exception("Kiosk entry %s was not applied", ops[0].key)
+            return [database.KioskResult(ops[0].key, "conflict", None, f"Not applied: {e}", False)]
+
+    def follow_up(self, rows=None):
+        """Store the signatures and queue the receipts of applied entries, then settle them.
+
+        `rows` maps keys to the store's transaction rows from this replay;
+        entries left applied by an earlier run are looked up.
+        """
+        applied = self.journal.applied()
+        if not applied:
+            return
+        rows = rows or {}
+        transactions = {
+            entry.op_key: (service.Transaction._make(rows[entry.op_key]) if rows.get(entry.op_key)
+                           else service.get_transaction_details(entry.transaction_id))
+            for entry, _ in applied
+        }
+        signatures, receipts = {}, {}
+        for entry, signature in applied:
+            kind = "Check-In" if entry.kind == "check_in" else "Check-Out"
+            group = (kind, entry.batch or entry.op_key)
+            if signature:
+                signatures.setdefault(group, (signature, []))[1].append(entry.transaction_id)
+            # One digest receipt per employee for check-outs signed together
+            receipts.setdefault(group + (entry.employee_id,), []).append(entry.op_key)
+        queued = {}
+        with database.database_connection() as conn:       # one commit for the batch
+            for (kind, _), (signature, ids) in signatures.items():
+                save_signature(ids, kind, signature, conn)
+            for (kind, _, _), keys in receipts.items():
+                group = [transactions[key] for key in keys]
+                receipt = service.queue_receipt(group if len(group) > 1 else group[0], kind, conn)
+                queued.update(dict.fromkeys(keys, receipt))
+        self.journal.mark_done(queued)
+
+    def wait(self, keys, timeout):
+        """Block until the entries are settled or `timeout` passes; returns their Entries."""
+        deadline = time.monotonic() + timeout
+        with self.settled:
+            while True:
+                entries = self.journal.entries(keys)
+                remaining = deadline - time.monotonic()
+                if all(entry.state == "done" for entry in entries) or remaining <= 0:
+                    return entries
+                self.settled.wait(remaining)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wake.set()
+        self.join(timeout)
+
+
+_journal = None
+_sync = None
+_lock = threading.Lock()
+
+def get_journal():
+    """Process-wide journal at SLAC_KIOSK_JOURNAL."""
+    global _journal
+    with _lock:
+        if _journal is None:
+            _journal = Journal(JOURNAL_PATH)
+    return _journal
+
+def start_sync(storage=None, **kwargs):
+    """Start the process-wide sync thread once; later calls return the running one."""
+    global _sync
+    journal = get_journal()
+    with _lock:
+        if _sync is None or not _sync.is_alive():
+            _sync = KioskSync(journal, storage, **kwargs)
+            _sync.start()
+    return _sync
+
+def stop_sync(timeout=None):
+    global _sync
+    with _lock:
+        if _sync is not None:
+            _sync.stop(timeout)
+            _sync = None
+
+def sync_status():
+    """SyncStatus of the journal and the sync thread."""
+    pending, conflicts, oldest = get_journal().counts()
+    sync = _sync
+    if sync is None:
+        return SyncStatus(None, pending, conflicts, oldest, None, None, 0, 0.0)
+    return SyncStatus(sync.online, pending, conflicts, oldest, sync.last_sync, sync.last_error,
+                      sync.synced, sync.seconds)
+
+
+# ---------------- Kiosk operations ----------------
+def _settle(keys, wait):
+    """Wake the sync thread and give it up to `wait` seconds, unless the store is known to be down."""
+    sync = start_sync()
+    sync.wake()
+    if wait and sync.online is not False:
+        return sync.wait(keys, wait)
+    return get_journal().entries(keys)
+
+def check_in(employee_id, asset_tag, issue, name="", email="", signature=None, wait=0.0):
+    """service.check_in() through the journal.
+
+    Returns service.Outcome if the entry synced within `wait` seconds,
+    otherwise Pending.  Raises ValueError for bad input, for an asset this
+    kiosk already checked in, and for a check-in the store refused.
+    """
+    asset_tag = str(asset_tag or "").strip()
+    issue = (issue or "").strip()
+    if not (str(employee_id or "").strip() and asset_tag and issue):
+        raise ValueError("Employee ID, Asset Tag, and Issue Details are required.")
+    key = get_journal().check_in(_number(employee_id, "Employee ID"), asset_tag,
+                                 issue, name, email, signature)
+    entry, = _settle([key], wait)
+    if entry.state != "done":
+        return Pending([key], PENDING_MESSAGE)
+    if entry.outcome == "conflict":
+        raise ValueError(entry.message)
+    transaction = service.get_transaction_details(entry.transaction_id)
+    if entry.outcome == "adopted":
+        return service.Outcome(transaction, service.Receipt(False, entry.message))
+    return service.Outcome(transaction, service.Receipt(bool(entry.receipt_queued), entry.receipt))
+
+def check_out_many(transaction_ids=(), signature=None, refs=(), wait=0.0):
+    """service.check_out_many() through the journal; `refs` are keys of this kiosk's check-ins.
+
+    Returns service.BatchOutcome if every entry synced within `wait`
+    seconds, otherwise Pending.
+    """
+    refs = [ref for ref in refs if ref]
+    if not (transaction_ids or refs):
+        raise ValueError("Select at least one device to check out.")
+    keys = get_journal().check_out(transaction_ids, refs, signature)
+    if not keys:
+        raise service.AlreadyCheckedOut("Already checked out on this kiosk.")
+    entries = _settle(keys, wait)
+    if any(entry.state != "done" for entry in entries):
+        return Pending(keys, PENDING_MESSAGE)
+    closed = [entry for entry in entries if entry.outcome == "applied"]
+    if not closed:
+        raise service.AlreadyCheckedOut("; ".join(entry.message for entry in entries))
+    receipts = {}
+    for entry in closed:
+        receipts.setdefault(entry.employee_id, service.Receipt(bool(entry.receipt_queued), entry.receipt))
+    return service.BatchOutcome(
+        sorted(service.get_transaction_details(entry.transaction_id) for entry in closed),
+        list(receipts.values()),
+        sorted(entry.transaction_id for entry in entries if entry.outcome != "applied" and entry.transaction_id),
+    )
+
+def offline_devices(search=""):
+    """Devices the Check-Out page can offer while the store is unreachable.
+
+    This kiosk's own check-ins that it has not checked out, and, for a
+    number typed into the search, that transaction from a receipt.
+    """
+    devices = [
+        Device(f"{f'Tx#{entry.transaction_id}' if entry.transaction_id else 'Not synced'} - {entry.asset_tag} "
+               f"(Employee {entry.employee_id})", entry.transaction_id, None if entry.transaction_id else entry.op_key)
+        for entry in get_journal().open_check_ins(search)
+    ]
+    search = search.strip()
+    if search.isdigit() and not any(device.transaction_id == int(search) for device in devices):
+        devices.append(Device(f"Tx#{search} (from its receipt)", int(search), None))
+    return devices
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent receipt outbox and the background worker that drains it.
+
+The submit path only inserts an EmailOutbox row; a worker thread claims due
+rows, hands them to a delivery function and retries failures with
+exponential backoff.  A claim pushes next_attempt_at forward by a lease, so
+rows held by a process that died become due again on their own.  A receipt
+covers one transaction id, or a tuple of ids for a batch check-out digest.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database import database_connection, unit_of_work
+
+log = logging.getLogger(__name__)
+
+SEND_THREADS = 4
+CLAIM_BATCH = 20
+CLAIM_LEASE = 120.0       # seconds a claimed row is hidden from other workers
+POLL_INTERVAL = 5.0       # idle wake-up when nothing was enqueued
+MAX_ATTEMPTS = 6
+BASE_DELAY = 5.0          # first retry after ~5s, then 10s, 20s, ...
+MAX_DELAY = 600.0
+
+# ---------------- Queue operations ----------------
+def enqueue(transaction_id, kind, conn=None):
+    """Queue a receipt and wake the worker. Returns the outbox id.
+
+    `transaction_id` is one id or a tuple of ids for one digest receipt.
+    Pass `conn` to enqueue inside an open unit of work.
+    """
+    now = time.time()
+    sql = """
+        INSERT INTO EmailOutbox (transaction_id, kind, created_at, next_attempt_at, batch)
+        VALUES (?, ?, ?, ?, ?)
+    """
+    if isinstance(transaction_id, tuple):
+        params = (int(transaction_id[0]), kind, now, now, json.dumps([int(i) for i in transaction_id]))
+    else:
+        params = (int(transaction_id), kind, now, now, None)
+    if conn is not None:
+        outbox_id = conn.execute(sql, params).lastrowid
+    else:
+        with database_connection() as conn:
+            outbox_id = conn.execute(sql, params).lastrowid
+    _wake.set()
+    return outbox_id
+
+def claim_due(limit=CLAIM_BATCH, now=None):
+    """Lease up to `limit` due rows to the caller; returns (outbox_id, transaction_id, kind, attempts).
+
+    transaction_id is the tuple of ids for a digest receipt, as enqueued.
+    """
+    now = time.time() if now is None else now
+    with unit_of_work() as conn:
+        rows = conn.execute("""
+            UPDATE EmailOutbox
+            SET attempts = attempts + 1, next_attempt_at = ?
+            WHERE outbox_id IN (
+                SELECT outbox_id FROM EmailOutbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY next_attempt_at
+                LIMIT ?
+            )
+            RETURNING outbox_id, transaction_id, kind, attempts, batch
+        """, (now + CLAIM_LEASE, now, int(limit))).fetchall()
+    return [(outbox_id, tuple(json.loads(batch)) if batch else transaction_id, kind, attempts)
+            for outbox_id, transaction_id, kind, attempts, batch in rows]
+
+def mark_sent(outbox_id):
+    with database_connection() as conn:
+        conn.execute(
+            "UPDATE EmailOutbox SET status='sent', sent_at=?, last_error=NULL WHERE outbox_id=?",
+            (time.time(), outbox_id)
+        )
+
+def backoff_delay(attempts):
+    """Exponential backoff with +/-20% jitter so retries don't arrive in lockstep."""
+    delay = min(BASE_DELAY * 2 ** (attempts - 1), MAX_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+def mark_failed(outbox_id, attempts, error):
+    """Schedule a retry, or give up after MAX_ATTEMPTS."""
+    with database_connection() as conn:
+        if attempts >= MAX_ATTEMPTS:
+            conn.execute(
+                "UPDATE EmailOutbox SET status='failed', last_error=? WHERE outbox_id=?",
+                (str(error), outbox_id)
+            )
+        else:
+            conn.execute(
+                "UPDATE EmailOutbox SET next_attempt_at=?, last_error=? WHERE outbox_id=?",
+                (time.time() + backoff_delay(attempts), str(error), outbox_id)
+            )
+
+def retry_failed():
+    """Put every failed row back in the queue (e.g. after fixing SMTP settings)."""
+    with database_connection() as conn:
+        count = conn.execute("""
+            UPDATE EmailOutbox SET status='pending', attempts=0, next_attempt_at=?
+            WHERE status='failed'
+        """, (time.time(),)).rowcount
+    _wake.set()
+    return count
+
+def outbox_stats(window=3600.0):
+    """Queue depth, failures and send latency (enqueue to sent) over the last `window` seconds."""
+    since = time.time() - window
+    with database_connection() as conn:
+        pending, due = conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(next_attempt_at <= ?), 0)
+            FROM EmailOutbox WHERE status='pending'
+        """, (time.time(),)).fetchone()
+        failed = conn.execute("SELECT COUNT(*) FROM EmailOutbox WHERE status='failed'").fetchone()[0]
+        latencies = [row[0] for row in conn.execute("""
+            SELECT sent_at - created_at FROM EmailOutbox
+            WHERE status='sent' AND sent_at >= ?
+            ORDER BY 1
+        """, (since,))]
+    stats = {"pending": pending, "due": due, "failed": failed, "sent": len(latencies),
+             "latency_p50": None, "latency_p90": None}
+    if latencies:
+        stats["latency_p50"] = latencies[len(latencies) // 2]
+        stats["latency_p90"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))]
+    return stats
+
+# ---------------- Worker ----------------
+_wake = threading.Event()
+
+
+class OutboxWorker(threading.Thread):
+    """Daemon thread that claims due rows and delivers them on a small pool.
+
+    `deliver(transaction_id, kind)` sends one receipt and raises on failure.
+    If `deliver_batch(items)` is given, each send thread gets a slice of the
+    claimed rows to send in one call (e.g. on one SMTP connection); it
+    returns None or an exception per item.  `on_idle()` runs whenever the
+    queue is empty, e.g. to keep connections warm.
+    """
+
+    def __init__(self, deliver, threads=SEND_THREADS, poll_interval=POLL_INTERVAL,
+                 deliver_batch=None, on_idle=None):
+        super().__init__(name="outbox-worker", daemon=True)
+        self.deliver = deliver
+        self.deliver_batch = deliver_batch
+        self.on_idle = on_idle
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="outbox-send")
+        self._stopping = threading.Event()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                drained = self.drain_once()
+            except Exception:
+                log.exception("Outbox drain failed")
+                drained = 0
+            if not drained:
+                if self.on_idle is not None:
+                    try:
+                        self.on_idle()
+                    except Exception:
+                        log.exception("Outbox idle hook failed")
+                _wake.wait(self.poll_interval)
+                _wake.clear()
+
+    def drain_once(self):
+        """Claim one batch and block until every row in it is delivered or rescheduled."""
+        rows = claim_due(CLAIM_BATCH)
+        if self.deliver_batch is not None:
+            step = -(-len(rows) // self.threads) or 1
+            futures = [self.pool.submit(self._deliver_chunk, rows[i:i + step])
+                       for i in range(0, len(rows), step)]
+        else:
+            futures = [self.pool.submit(self._deliver_one, *row) for row in rows]
+        for future in futures:
+            future.result()
+        return len(rows)
+
+    def _deliver_one(self, outbox_id, transaction_id, kind, attempts):
+        error = None
+        try:
+            self.deliver(transaction_id, kind)
+        except Exception as e:
+            error = e
+        self._record(outbox_id, transaction_id, attempts, error)
+
+    def _deliver_chunk(self, rows):
+        try:
+            results = self.deliver_batch([(transaction_id, kind) for _, transaction_id, kind, _ in rows])
+        except Exception as e:
+            results = [e] * len(rows)
+        for (outbox_id, transaction_id, _, attempts), error in zip(rows, results):
+            self._record(outbox_id, transaction_id, attempts, error)
+
+    def _record(self, outbox_id, transaction_id, attempts, error):
+        if error is None:
+            mark_sent(outbox_id)
+        else:
+            log.warning("Receipt %s for transaction %s failed (attempt %s): %s",
+                        outbox_id, transaction_id, attempts, error)
+            mark_failed(outbox_id, attempts, error)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        _wake.set()
+        self.join(timeout)
+        self.pool.shutdown(wait=True)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def start_worker(deliver, **kwargs):
+    """Start the process-wide worker once; later calls return the running one."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = OutboxWorker(deliver, **kwargs)
+            _worker.start()
+    return _worker
+
+def stop_worker(timeout=None):
+    global _worker
+    with _worker_lock:
+        if _worker is not None:
+            _worker.stop(timeout)
+            _worker = None
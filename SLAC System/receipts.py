@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF receipts and SMTP email for check-ins and check-outs.
+
+Nothing here touches the Streamlit page, so receipts can be rendered and sent
+from the outbox worker thread as well as from a script run.  fpdf, certifi
+and the MIME classes are imported on first use: a page that only records
+check-ins never renders or sends anything itself.
+"""
+import copy
+import functools
+import io
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import streamlit as stl
+
+import smtplib
+
+from storage import get_storage
+from tracing import span, traced
+from signatures import signature_png
+
+# ---------------- Safe secrets helpers ----------------
+def _get_secret(key, default=None):
+    """Return a secret, else an environment variable, else default.
+
+    Never crashes if secrets.toml is missing.
+    """
+    try:
+        value = stl.secrets.get(key)
+    except Exception:
+        value = None
+    if value is None:
+        value = os.environ.get(key)
+    return default if value is None else value
+
+def _bool_secret(name, default=False):
+    v = _get_secret(name, default)
+    if isinstance(v, bool): return v
+    if isinstance(v, (int, float)): return bool(v)
+    if isinstance(v, str): return v.strip().lower() in ("1", "true", "yes", "on")
+    return bool(v)
+
+def _list_secret(name):
+    v = _get_secret(name, [])
+    if isinstance(v, str):
+        return [item.strip() for item in v.split(",") if item.strip()]
+    return list(v)
+
+def smtp_configured():
+    return bool(_get_secret("SMTP_HOST"))
+
+# ---------------- Email & PDF ----------------
+def confirmation_code(tx_id: int) -> str:
+    return f"CN-{tx_id:06d}"
+
+def parse_issue_type(issue_text: str) -> str:
+    return (issue_text.split(":", 1)[0] or "Issue").strip()
+
+logo_path = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'static', 'logo.png'
+)
+
+RECEIPT_LABELS = ("Confirmation Number", "Transaction ID", "Employee", "Employee Email", "Asset Tag", "Issue Type")
+LABEL_WIDTH = 45
+DIGEST_COLUMNS = (("Confirmation #", 30), ("Tx ID", 18), ("Asset Tag", 25), ("Issue Type", 37),
+                  ("Check-In Time", 40), ("Check-Out Time", 40))
+RENDER_PROCESSES = None    # bulk rendering: default to one process per CPU
+
+@functools.lru_cache(maxsize=None)
+def _receipt_template(kind):
+    """Static part of a receipt: logo, title, fonts and the fixed labels.
+
+    Built once per process and kind; each receipt deep-copies it, so the
+    logo is decoded and the page set up only once.  Returns (pdf, y of the
+    first label).
+    """
+    from fpdf import FPDF          # <- install package: fpdf2
+    pdf = FPDF()
+    pdf.add_page()
+    if os.path.exists(logo_path):
+        pdf.image(logo_path, x=10, y=8, w=30)
+    pdf.set_font("Arial", size=14)
+    pdf.cell(190, 10, txt=f"SLAC Service Desk - {kind} Receipt", ln=True, align='C')
+    pdf.set_font("Arial", size=11)
+    pdf.ln(6)
+    top = pdf.get_y()
+    for label in RECEIPT_LABELS:
+        pdf.cell(LABEL_WIDTH, 8, txt=f"{label}:", ln=True)
+    return pdf, top
+
+@traced("receipt.create_pdf_receipt")
+def create_pdf_receipt(tx_tuple, emp_name, emp_email, kind="Check-In", signature=None):
+    """Render a receipt into memory; returns (pdf bytes, confirmation number).
+
+    `signature` is optional PNG bytes drawn under the times.
+    """
+    tx_id, employee_id, asset_tag, issue, check_in, check_out, _ = tx_tuple
+    cn = confirmation_code(tx_id)
+
+    template, top = _receipt_template(kind)
+    pdf = copy.deepcopy(template)
+    pdf.set_y(top)
+    values = (cn, tx_id, f"{emp_name or ''} (ID: {employee_id})", emp_email or '—',
+              asset_tag, parse_issue_type(issue))
+    for value in values:
+        pdf.set_x(pdf.l_margin + LABEL_WIDTH)
+        pdf.cell(190 - LABEL_WIDTH, 8, txt=str(value), ln=True)
+    pdf.multi_cell(190, 8, txt=f"Issue Details: {issue}", align='L')
+    pdf.ln(0)
+    pdf.cell(190, 8, txt=f"Check-In Time: {check_in}", ln=True)
+    if kind == "Check-Out" and check_out:
+        pdf.cell(190, 8, txt=f"Check-Out Time: {check_out}", ln=True)
+    if signature:
+        pdf.ln(4)
+        pdf.cell(190, 8, txt="Signature:", ln=True)
+        pdf.image(io.BytesIO(signature), x=pdf.l_margin, w=60)
+    return bytes(pdf.output()), cn
+
+@functools.lru_cache(maxsize=None)
+def _digest_template(kind):
+    """Logo and title of a digest receipt, built once per process like _receipt_template()."""
+    from fpdf import FPDF
+    pdf = FPDF()
+    pdf.add_page()
+    if os.path.exists(logo_path):
+        pdf.image(logo_path, x=10, y=8, w=30)
+    pdf.set_font("Arial", size=14)
+    pdf.cell(190, 10, txt=f"SLAC Service Desk - {kind} Receipt", ln=True, align='C')
+    pdf.set_font("Arial", size=11)
+    pdf.ln(6)
+    return pdf, pdf.get_y()
+
+@traced("receipt.create_digest_receipt")
+def create_digest_receipt(tx_tuples, emp_name, emp_email, kind="Check-Out", signature=None):
+    """One receipt listing several of an employee's transactions (batch check-out).
+
+    Returns (pdf bytes, confirmation numbers in row order).  `signature` is
+    optional PNG bytes, drawn once under the table.
+    """
+    template, top = _digest_template(kind)
+    pdf = copy.deepcopy(template)
+    pdf.set_y(top)
+    pdf.cell(190, 8, txt=f"Employee: {emp_name or ''} (ID: {tx_tuples[0][1]})", ln=True)
+    pdf.cell(190, 8, txt=f"Employee Email: {emp_email or '—'}", ln=True)
+    pdf.cell(190, 8, txt=f"Devices: {len(tx_tuples)}", ln=True)
+    pdf.ln(2)
+    pdf.set_font("Arial", "B", 9)
+    for label, width in DIGEST_COLUMNS:
+        pdf.cell(width, 7, txt=label, border=1)
+    pdf.ln()
+    pdf.set_font("Arial", size=9)
+    codes = []
+    for tx_id, _, asset_tag, issue, check_in, check_out, _ in tx_tuples:
+        codes.append(confirmation_code(tx_id))
+        values = (codes[-1], tx_id, asset_tag, parse_issue_type(issue), check_in, check_out or "")
+        for (_, width), value in zip(DIGEST_COLUMNS, values):
+            pdf.cell(width, 7, txt=str(value), border=1)
+        pdf.ln()
+    if signature:
+        pdf.ln(4)
+        pdf.set_font("Arial", size=11)
+        pdf.cell(190, 8, txt="Signature:", ln=True)
+        pdf.image(io.BytesIO(signature), x=pdf.l_margin, w=60)
+    return bytes(pdf.output()), codes
+
+def receipt_filename(tx_id, kind="Check-In"):
+    """Attachment name; tx_id is a tuple of ids for a digest."""
+    if isinstance(tx_id, tuple):
+        return f"{kind.lower()}_receipt_{len(tx_id)}_devices_tx{tx_id[0]}.pdf"
+    return f"{kind.lower()}_receipt_tx{tx_id}.pdf"
+
+def _render_one(args):
+    return create_pdf_receipt(*args)[0]
+
+def render_receipts(items, processes=RENDER_PROCESSES, chunksize=16):
+    """Render many receipts in a process pool (reprints).
+
+    items are (tx_tuple, emp_name, emp_email, kind[, signature]); returns PDF bytes in
+    the same order.  Each worker process builds its own template once.
+    """
+    items = list(items)
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_render_one, items, chunksize=chunksize))
+
+def reprint_receipts(transaction_ids, kind="Check-In", processes=RENDER_PROCESSES):
+    """PDF bytes for existing transactions, keyed by transaction_id."""
+    items = []
+    for tx_id in transaction_ids:
+        tx_tuple = get_storage().get_transaction_details(tx_id)
+        if tx_tuple is not None:
+            emp_name, emp_email = get_storage().get_employee_meta(tx_tuple[1])
+            items.append((tx_tuple, emp_name, emp_email, kind, signature_png(tx_id, kind)))
+    pdfs = render_receipts(items, processes)
+    return {item[0][0]: pdf for item, pdf in zip(items, pdfs)}
+
+# ---------------- SMTP sessions ----------------
+KEEPALIVE_SECONDS = 60     # NOOP a connection idle longer than this before reusing it
+MAX_IDLE_SECONDS = 240     # servers commonly drop idle clients after ~5 minutes
+SMTP_SESSIONS = 4          # one per outbox send thread
+
+SMTPSettings = namedtuple("SMTPSettings", "host port use_tls username password sender")
+
+def smtp_settings():
+    username = _get_secret("SMTP_USERNAME")
+    return SMTPSettings(
+        host=_get_secret("SMTP_HOST"),
+        port=int(_get_secret("SMTP_PORT", 587)),
+        use_tls=_bool_secret("SMTP_USE_TLS", True),
+        username=username,
+        password=_get_secret("SMTP_PASSWORD"),
+        sender=_get_secret("SMTP_FROM", username or "no-reply@example.com"),
+    )
+
+@functools.lru_cache(maxsize=None)
+def tls_context():
+    """TLS context built once per process; loading the CA bundle is not free."""
+    import ssl
+    import certifi
+    # Use certifi CA bundle for TLS so macOS trust works reliably
+    return ssl.create_default_context(cafile=certifi.where())
+
+
+class SMTPSession:
+    """One authenticated SMTP connection, kept open between messages."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.server = None
+        self.last_used = 0.0
+        self.connects = 0
+        self.sent = 0
+
+    @traced("smtp.connect")
+    def connect(self):
+        self.close()
+        s = self.settings
+        server = smtplib.SMTP(s.host, s.port, timeout=20)
+        try:
+            if s.use_tls:
+                server.starttls(context=tls_context())
+            if s.username and s.password:
+                server.login(s.username, s.password)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+        self.connects += 1
+        self.last_used = time.monotonic()
+
+    def alive(self):
+        """True if the connection can be reused; NOOPs it first if it sat idle."""
+        if self.server is None:
+            return False
+        idle = time.monotonic() - self.last_used
+        if idle > MAX_IDLE_SECONDS:
+            self.close()
+            return False
+        if idle > KEEPALIVE_SECONDS:
+            try:
+                ok = self.server.noop()[0] == 250
+            except (smtplib.SMTPException, OSError):
+                ok = False
+            if not ok:
+                self.close()
+                return False
+            self.last_used = time.monotonic()
+        return True
+
+    @traced("smtp.send")
+    def send(self, msg, recipients):
+        """Send on the open connection, reconnecting once if the server hung up."""
+        if not self.alive():
+            self.connect()
+        try:
+            self.server.sendmail(self.settings.sender, recipients, msg.as_string())
+        except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+            self.connect()
+            self.server.sendmail(self.settings.sender, recipients, msg.as_string())
+        self.last_used = time.monotonic()
+        self.sent += 1
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                self.server.close()
+            self.server = None
+
+
+class SMTPSessionPool:
+    """Thread-safe pool of SMTPSessions sharing one set of settings."""
+
+    def __init__(self, settings, size=SMTP_SESSIONS):
+        self.settings = settings
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    @contextmanager
+    def session(self):
+        try:
+            session = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            session = SMTPSession(self.settings) if create else self._idle.get()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+
+    def keepalive(self):
+        """NOOP idle connections so the server doesn't drop them between bursts."""
+        for _ in range(self._idle.qsize()):
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            session.alive()
+            self._idle.put(session)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_sessions = None
+_sessions_lock = threading.Lock()
+
+def smtp_session():
+    """Borrow a pooled SMTP session; the pool is rebuilt if the settings change."""
+    global _sessions
+    settings = smtp_settings()
+    if not settings.host:
+        raise RuntimeError("SMTP not configured (missing SMTP_HOST)")
+    with _sessions_lock:
+        if _sessions is None or _sessions.settings != settings:
+            if _sessions is not None:
+                _sessions.close()
+            _sessions = SMTPSessionPool(settings)
+        pool = _sessions
+    return pool.session()
+
+def keepalive_sessions():
+    if _sessions is not None:
+        _sessions.keepalive()
+
+def build_message(sender_addr, to_addr, subject, html_body, attachment, filename):
+    """MIME message with a PDF attachment (bytes), plus the full recipient list (To + CC_RECIPIENTS)."""
+    from email import encoders
+    from email.mime.base import MIMEBase
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    from email.utils import formataddr
+    msg = MIMEMultipart()
+    msg["From"] = formataddr(("Service Desk General Inbox", sender_addr))
+    msg["To"] = to_addr
+    msg["Subject"] = subject
+
+    cc_list = _list_secret("CC_RECIPIENTS")
+    if cc_list:
+        msg["Cc"] = ", ".join(cc_list)
+    recipients = [to_addr] + cc_list
+
+    msg.attach(MIMEText(html_body, "html"))
+
+    part = MIMEBase("application", "pdf")
+    part.set_payload(attachment)
+    encoders.encode_base64(part)
+    part.add_header("Content-Disposition", f'attachment; filename="{filename}"')
+    msg.attach(part)
+    return msg, recipients
+
+@traced("smtp.send_email_with_attachment")
+def send_email_with_attachment_smtp(to_addr, subject, html_body, attachment_path):
+    """Send one message on a pooled session; raises on any SMTP or configuration error."""
+    with open(attachment_path, "rb") as f:
+        attachment = f.read()
+    with smtp_session() as session:
+        msg, recipients = build_message(session.settings.sender, to_addr, subject, html_body,
+                                        attachment, os.path.basename(attachment_path))
+        session.send(msg, recipients)
+    return True
+
+def build_email_html(emp_name, employee_id, asset_tag, issue, check_in, check_out, cn, kind):
+    return f"""
+    <p>Hi {emp_name or 'there'},</p>
+    <p>This is a confirmation that your device was <b>{kind.lower()}</b> at the Service Desk.</p>
+    <table cellspacing="0" cellpadding="4" border="0">
+      <tr><td><b>Employee</b></td><td>{emp_name or ''} (ID: {employee_id})</td></tr>
+      <tr><td><b>Asset Tag</b></td><td>{asset_tag}</td></tr>
+      <tr><td><b>Issue Type</b></td><td>{parse_issue_type(issue)}</td></tr>
+      <tr><td><b>Check-In Time</b></td><td>{check_in}</td></tr>
+      {f'<tr><td><b>Check-Out Time</b></td><td>{check_out}</td></tr>' if (kind=='Check-Out' and check_out) else ''}
+      <tr><td><b>Confirmation #</b></td><td>{cn}</td></tr>
+    </table>
+    <p>The PDF receipt is attached for your records.</p>
+    <p>— Service Desk</p>
+    """
+
+def build_digest_html(emp_name, tx_tuples, kind):
+    rows = "".join(
+        f"<tr><td>{confirmation_code(tx_id)}</td><td>{asset_tag}</td><td>{parse_issue_type(issue)}</td>"
+        f"<td>{check_in}</td><td>{check_out or ''}</td></tr>"
+        for tx_id, _, asset_tag, issue, check_in, check_out, _ in tx_tuples
+    )
+    return f"""
+    <p>Hi {emp_name or 'there'},</p>
+    <p>This is a confirmation that {len(tx_tuples)} of your devices were <b>{kind.lower()}</b> at the Service Desk.</p>
+    <table cellspacing="0" cellpadding="4" border="1">
+      <tr><th>Confirmation #</th><th>Asset Tag</th><th>Issue Type</th><th>Check-In Time</th><th>Check-Out Time</th></tr>
+      {rows}
+    </table>
+    <p>The PDF receipt is attached for your records.</p>
+    <p>— Service Desk</p>
+    """
+
+RECEIPT_SUBJECT = "From the Service Desk General Inbox"
+
+@traced("receipt.send")
+def _send_receipt(session, transaction_id, kind):
+    if isinstance(transaction_id, tuple):
+        return _send_digest(session, transaction_id, kind)
+    tx_tuple = get_storage().get_transaction_details(transaction_id)
+    if tx_tuple is None:
+        raise LookupError(f"Transaction {transaction_id} not found")
+    tx_id, employee_id, asset_tag, issue, check_in, check_out, _ = tx_tuple
+    emp_name, emp_email = get_storage().get_employee_meta(employee_id)
+    if not emp_email:
+        raise ValueError(f"No email on file for employee {employee_id}")
+    pdf_bytes, cn = create_pdf_receipt(tx_tuple, emp_name, emp_email, kind,
+                                       signature_png(transaction_id, kind))
+    html = build_email_html(emp_name, employee_id, asset_tag, issue, check_in, check_out, cn, kind)
+    msg, recipients = build_message(session.settings.sender, emp_email, RECEIPT_SUBJECT, html,
+                                    pdf_bytes, receipt_filename(tx_id, kind))
+    session.send(msg, recipients)
+
+def _send_digest(session, transaction_ids, kind):
+    """One email and PDF for a batch of one employee's transactions."""
+    tx_tuples = []
+    for transaction_id in transaction_ids:
+        tx_tuple = get_storage().get_transaction_details(transaction_id)
+        if tx_tuple is None:
+            raise LookupError(f"Transaction {transaction_id} not found")
+        tx_tuples.append(tx_tuple)
+    employee_id = tx_tuples[0][1]
+    emp_name, emp_email = get_storage().get_employee_meta(employee_id)
+    if not emp_email:
+        raise ValueError(f"No email on file for employee {employee_id}")
+    pdf_bytes, _ = create_digest_receipt(tx_tuples, emp_name, emp_email, kind,
+                                         signature_png(transaction_ids[0], kind))
+    msg, recipients = build_message(session.settings.sender, emp_email, RECEIPT_SUBJECT,
+                                    build_digest_html(emp_name, tx_tuples, kind),
+                                    pdf_bytes, receipt_filename(transaction_ids, kind))
+    session.send(msg, recipients)
+
+def deliver_receipts(items):
+    """Send (transaction_id, kind) receipts back to back on one SMTP session.
+
+    A tuple of ids as transaction_id sends one digest receipt for them.
+    Reads each transaction and employee at send time, so a retry picks up an
+    email address corrected in the meantime.  Returns one entry per item:
+    None if it was sent, otherwise the exception it failed with.
+    """
+    results = []
+    with span("receipt.deliver_batch", size=len(items)), smtp_session() as session:
+        for transaction_id, kind in items:
+            try:
+                _send_receipt(session, transaction_id, kind)
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+    return results
+
+def deliver_receipt(transaction_id, kind="Check-In"):
+    """Render and email the receipt for one transaction (or a digest for a tuple of ids); raises on failure."""
+    error = deliver_receipts([(transaction_id, kind)])[0]
+    if error is not None:
+        raise error
+    return True
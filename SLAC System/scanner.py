@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Barcode decoding for asset tag photos.
+
+A camera_input photo is decoded in grayscale through a list of stages of
+increasing cost: a downscaled copy, a centre crop, the full frame, adaptive
+thresholding and finally a few rotations.  The first stage that finds a
+code wins.  Results are cached by image hash, so a Streamlit rerun with the
+same photo doesn't decode it again.
+
+ScannerEngine is the continuous mode for a webcam, a video file or a folder
+of images: capture, decode and display run as separate stages joined by
+small queues that drop stale frames instead of falling behind.
+"""
+import hashlib
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+import cv2
+import numpy as np
+from pyzbar.pyzbar import decode
+
+from tracing import span, traced
+
+DOWNSCALE_SIDE = 800           # long side of the first, cheap attempt
+ROI_FRACTION = 0.6             # centre crop: share of width and height kept
+ROTATIONS = (15, -15, 30, -30, 45, -45)
+CACHE_SIZE = 64
+
+FRAME_QUEUE_SIZE = 2           # frames waiting for decode/display; older ones are dropped
+DECODE_EVERY = 5               # decode every Nth frame when nothing moves...
+MOTION_THRESHOLD = 6.0         # ...or any frame whose mean pixel change exceeds this
+DEBOUNCE_SECONDS = 2.0         # the same tag is reported again only after this much quiet
+MARK_SECONDS = 0.5             # how long a decoded code stays outlined in the preview
+LATENCY_SAMPLES = 1000         # recent capture-to-decode latencies kept for stats
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+ScanResult = namedtuple("ScanResult", "value stage seconds cached")
+
+# ---------------- Image preparation ----------------
+def downscale(gray, side=DOWNSCALE_SIDE):
+    h, w = gray.shape[:2]
+    scale = side / max(h, w)
+    if scale >= 1:
+        return gray
+    return cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+def centre_crop(gray, fraction=ROI_FRACTION):
+    h, w = gray.shape[:2]
+    dh, dw = int(h * (1 - fraction) / 2), int(w * (1 - fraction) / 2)
+    return gray[dh:h - dh, dw:w - dw]
+
+def threshold(gray):
+    blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+    return cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, 31, 10)
+
+def rotate(gray, angle):
+    h, w = gray.shape[:2]
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    cos, sin = abs(m[0, 0]), abs(m[0, 1])
+    nw, nh = int(h * sin + w * cos), int(h * cos + w * sin)
+    m[0, 2] += nw / 2 - w / 2
+    m[1, 2] += nh / 2 - h / 2
+    return cv2.warpAffine(gray, m, (nw, nh), borderValue=255)
+
+# ---------------- Pipeline ----------------
+def _first(images):
+    for image in images:
+        found = decode(image)
+        if found:
+            return found[0].data.decode("utf-8")
+    return None
+
+def _stage_downscaled(gray):
+    return _first([downscale(gray)])
+
+def _stage_roi(gray):
+    return _first([centre_crop(gray)])
+
+def _stage_full(gray):
+    if max(gray.shape[:2]) <= DOWNSCALE_SIDE:
+        return None        # same image as the downscaled stage
+    return _first([gray])
+
+def _stage_threshold(gray):
+    return _first([threshold(downscale(gray)), threshold(gray)])
+
+def _stage_rotated(gray):
+    small = downscale(gray)
+    return _first(rotate(small, angle) for angle in ROTATIONS)
+
+STAGES = (
+    ("downscaled", _stage_downscaled),
+    ("roi", _stage_roi),
+    ("full", _stage_full),
+    ("threshold", _stage_threshold),
+    ("rotated", _stage_rotated),
+)
+
+def decode_gray(gray, stages=STAGES):
+    """Run the stages in order; returns (value, stage name) or (None, None)."""
+    for name, stage in stages:
+        with span("scan." + name):
+            value = stage(gray)
+        if value is not None:
+            return value, name
+    return None, None
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+@traced("scan.decode_asset_tag")
+def decode_asset_tag(image_bytes):
+    """Decode the first barcode in an encoded photo (JPEG/PNG bytes).
+
+    Returns a ScanResult; value is None when nothing was found or the bytes
+    are not an image.  Misses are cached too, so reruns stay cheap.
+    """
+    key = hashlib.blake2b(image_bytes, digest_size=16).digest()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return hit._replace(seconds=0.0, cached=True)
+
+    start = time.perf_counter()
+    gray = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+    value, stage = decode_gray(gray) if gray is not None else (None, None)
+    result = ScanResult(value, stage, time.perf_counter() - start, False)
+
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+# ---------------- Continuous scanner ----------------
+class ImageFolderSource:
+    """Reads a folder of images in name order, like a VideoCapture."""
+
+    def __init__(self, path, loop=False):
+        self.paths = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self.loop = loop
+        self.index = 0
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self):
+        if self.index >= len(self.paths):
+            if not self.loop or not self.paths:
+                return False, None
+            self.index = 0
+        frame = cv2.imread(self.paths[self.index], cv2.IMREAD_COLOR)
+        self.index += 1
+        return frame is not None, frame
+
+    def release(self):
+        self.paths = []
+
+def open_source(source):
+    """Camera index, video file or image folder -> an opened capture object."""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    if isinstance(source, int):
+        # DirectShow opens Windows webcams much faster; it doesn't exist elsewhere
+        backend = cv2.CAP_DSHOW if os.name == "nt" else cv2.CAP_ANY
+        cap = cv2.VideoCapture(source, backend)
+    elif os.path.isdir(source):
+        cap = ImageFolderSource(source)
+    else:
+        cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise OSError(f"Could not open video source {source!r}")
+    return cap
+
+def _put_latest(q, item):
+    """Non-blocking put that evicts the oldest item; returns True if one was dropped."""
+    try:
+        q.put_nowait(item)
+        return False
+    except queue.Full:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            pass
+        q.put_nowait(item)
+        return True
+
+@traced("scan.decode_frame", root=False)    # one per frame: timed, but no trace of its own
+def decode_frame(gray):
+    """Decode a live frame; returns [(text, polygon in frame coordinates)]."""
+    small = downscale(gray)
+    scale = gray.shape[1] / small.shape[1]
+    found = decode(small)
+    if not found and small is not gray:
+        found, scale = decode(gray), 1.0
+    return [
+        (obj.data.decode("utf-8"), [(int(x * scale), int(y * scale)) for x, y in obj.polygon])
+        for obj in found
+    ]
+
+
+class ScannerEngine:
+    """Capture -> decode -> (optional) display pipeline for continuous scanning.
+
+    Capture and decode each run on a thread; run_display() draws the preview
+    on the caller's thread because HighGUI windows must live there.  New
+    tags go to `on_tag(tag)` and to the `tags` queue, at most once per
+    DEBOUNCE_SECONDS while the same code stays in view.  `pace` (seconds
+    per frame) makes a file or folder play back like a live camera.
+    """
+
+    def __init__(self, source=0, on_tag=None, decode_every=DECODE_EVERY,
+                 motion_threshold=MOTION_THRESHOLD, debounce=DEBOUNCE_SECONDS,
+                 display=False, pace=None):
+        self.source = source
+        self.on_tag = on_tag
+        self.decode_every = decode_every
+        self.motion_threshold = motion_threshold
+        self.debounce = debounce
+        self.display = display
+        self.pace = pace
+        self.tags = queue.Queue()
+        self.error = None
+        self.stats = {"captured": 0, "dropped": 0, "decoded": 0, "skipped": 0, "tags": 0}
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.marks = []
+        self._frames = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+        self._preview = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+        self._last_seen = {}
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        cap = open_source(self.source)
+        self._threads = [
+            threading.Thread(target=self._capture, args=(cap,), name="scanner-capture", daemon=True),
+            threading.Thread(target=self._decode, name="scanner-decode", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def join(self, timeout=None):
+        for t in self._threads:
+            t.join(timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def poll(self):
+        """Latest new tag since the last poll, or None (drains the queue)."""
+        tag = None
+        while True:
+            try:
+                tag = self.tags.get_nowait()
+            except queue.Empty:
+                return tag
+
+    def _capture(self, cap):
+        try:
+            next_at = time.perf_counter()
+            while not self._stopping.is_set():
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                now = time.perf_counter()
+                self.stats["captured"] += 1
+                if _put_latest(self._frames, (now, frame)):
+                    self.stats["dropped"] += 1
+                if self.display:
+                    _put_latest(self._preview, frame)
+                if self.pace:
+                    next_at += self.pace
+                    time.sleep(max(0.0, next_at - time.perf_counter()))
+        except Exception as e:
+            self.error = e
+        finally:
+            cap.release()
+            _put_latest(self._frames, None)       # end of stream
+
+    def _decode(self):
+        previous, since_decode = None, self.decode_every
+        while True:
+            item = self._frames.get()
+            if item is None or self._stopping.is_set():
+                return
+            captured_at, frame = item
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+            thumb = cv2.resize(gray, (80, 60), interpolation=cv2.INTER_AREA)
+            since_decode += 1
+            moved = previous is None or cv2.absdiff(thumb, previous).mean() > self.motion_threshold
+            if not moved and since_decode < self.decode_every:
+                self.stats["skipped"] += 1
+                continue
+            previous, since_decode = thumb, 0
+            try:
+                found = decode_frame(gray)
+            except Exception as e:
+                self.error = e
+                continue
+            now = time.perf_counter()
+            self.stats["decoded"] += 1
+            self.latencies.append(now - captured_at)
+            if found:
+                self.marks = [(text, polygon, now) for text, polygon in found]
+            for text, _ in found:
+                self._report(text, now)
+
+    def _report(self, tag, now):
+        # Tags out of view longer than the debounce would be reported anyway,
+        # so they are forgotten and the map only holds what is in view
+        self._last_seen = {seen: at for seen, at in self._last_seen.items() if now - at < self.debounce}
+        last = self._last_seen.get(tag)
+        self._last_seen[tag] = now
+        if last is not None and now - last < self.debounce:
+            return
+        self.stats["tags"] += 1
+        self.tags.put(tag)
+        if self.on_tag is not None:
+            try:
+                self.on_tag(tag)
+            except Exception as e:
+                self.error = e
+
+    def run_display(self, window="Asset Tag Scanner"):
+        """Show the preview with decoded codes outlined until 'q'/Esc or end of stream."""
+        try:
+            while self.running():
+                try:
+                    frame = self._preview.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                frame = frame.copy()    # the decode thread may still be reading it
+                now = time.perf_counter()
+                for text, polygon, seen_at in self.marks:
+                    if now - seen_at > MARK_SECONDS:
+                        continue
+                    points = np.array(polygon, dtype=np.int32)
+                    if len(points) > 4:
+                        points = cv2.convexHull(points)
+                    cv2.polylines(frame, [points], True, (0, 255, 0), 2)
+                    x, y = points.reshape(-1, 2).min(axis=0)
+                    cv2.putText(frame, text, (int(x), int(y) - 10),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                cv2.imshow(window, frame)
+                key = cv2.waitKey(1)
+                if key & 0xFF == ord('q') or key == 27:
+                    break
+        finally:
+            self.stop()
+            cv2.destroyWindow(window)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def start_scanner(source=0, **kwargs):
+    """Start the process-wide background scanner once (there is one camera).
+
+    A scanner that stopped (end of file, camera error) stays around so its
+    last tags can still be polled; stop_scanner() before starting a new one.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ScannerEngine(source, **kwargs).start()
+    return _engine
+
+def stop_scanner():
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.stop()
+            _engine = None
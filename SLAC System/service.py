@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Check-in and check-out business logic, independent of any UI.
+
+The Streamlit app, the HTTP API (api.py) and kiosk scanner stations all
+call these functions, so every front end validates input, writes the
+transaction and queues the receipt email the same way against the shared
+database (see storage.py for the SQLite/PostgreSQL choice).  Bad input
+raises ValueError, unknown transactions LookupError, and checking in an
+asset that is still checked in database.AlreadyCheckedIn (a ValueError).
+Employee ids are whole numbers; asset tags are text, as printed on the label.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+
+import database
+import outbox
+from datacache import bump_data_version
+from receipts import deliver_receipt, deliver_receipts, keepalive_sessions, smtp_configured
+from signatures import save_signature
+from storage import get_storage
+from tracing import traced
+
+RECEIPT_KINDS = ("Check-In", "Check-Out")
+
+Transaction = namedtuple(
+    "Transaction", "transaction_id employee_id asset_tag issue check_in_time check_out_time status"
+)
+Receipt = namedtuple("Receipt", "queued message")     # what happened to the receipt email
+Outcome = namedtuple("Outcome", "transaction receipt")
+BatchOutcome = namedtuple("BatchOutcome", "transactions receipts skipped")
+
+
+class AlreadyCheckedOut(ValueError):
+    pass
+
+
+def start_backend():
+    """Schema setup and the receipt worker; call once per process."""
+    database.tables()           # the local outbox and signature tables, whatever the backend
+    get_storage().tables()
+    return outbox.start_worker(deliver_receipt, deliver_batch=deliver_receipts, on_idle=keepalive_sessions)
+
+def _employee_id(value):
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise ValueError("Employee ID must be a number.") from None
+
+@contextmanager
+def _one_commit():
+    """The unit of work a transaction, its signature and its receipt share.
+
+    Signatures and the receipt outbox are always in the local SQLite file;
+    when the transactions are too, all three commit together.  On
+    PostgreSQL this yields None and each commits on its own.
+    """
+    if get_storage().name != "sqlite":
+        yield None
+        return
+    with database.unit_of_work() as conn:
+        yield conn
+    bump_data_version()
+
+def get_transaction_details(transaction_id):
+    """The transaction as a Transaction, or None if there is no such id."""
+    row = get_storage().get_transaction_details(transaction_id)
+    return Transaction._make(row) if row else None
+
+def asset_status(asset_tag):
+    """The asset's current database.AssetStatus, or None if it was never checked in."""
+    return get_storage().asset_status(asset_tag)
+
+def asset_history(asset_tag, after=None, page_size=50):
+    """A page of the asset's transactions, newest first (see database.asset_history())."""
+    return get_storage().asset_history(asset_tag, after, page_size)
+
+@traced("service.queue_receipt")
+def queue_receipt(transaction, kind="Check-In", conn=None):
+    """Queue the receipt email for a transaction; the outbox worker renders and sends it.
+
+    A list of one employee's transactions gets a single digest receipt.
+    Pass `conn` to queue inside an open unit of work.
+    """
+    group = transaction if isinstance(transaction, list) else [transaction]
+    employee_id = group[0].employee_id
+    if conn is not None and get_storage().name == "sqlite":
+        name, email = database.get_employee_meta(employee_id, conn)     # sees the check-in's own upsert
+    else:
+        name, email = get_storage().get_employee_meta(employee_id)
+    if not email:
+        return Receipt(False, f"No email on file for employee {employee_id}. Skipping {kind} email.")
+    if not smtp_configured():
+        return Receipt(False, "SMTP not configured (missing SMTP_HOST). Skipping email send.")
+    if len(group) == 1:
+        outbox.enqueue(group[0].transaction_id, kind, conn)
+        return Receipt(True, f"{kind} confirmation will be emailed to {email}.")
+    outbox.enqueue(tuple(t.transaction_id for t in group), kind, conn)
+    return Receipt(True, f"{kind} confirmation for {len(group)} devices will be emailed to {email}.")
+
+def email_receipt(transaction_id, kind="Check-In"):
+    """(Re)send the receipt for an existing transaction."""
+    if kind not in RECEIPT_KINDS:
+        raise ValueError(f"Receipt kind must be one of {', '.join(RECEIPT_KINDS)}.")
+    transaction = get_transaction_details(transaction_id)
+    if transaction is None:
+        raise LookupError(f"Transaction {transaction_id} not found")
+    return queue_receipt(transaction, kind)
+
+@traced("service.check_in")
+def check_in(employee_id, asset_tag, issue, name="", email="", signature=None):
+    """Record a check-in, store its signature and queue the receipt.
+
+    `signature` is an encode_signature() result or None.  Returns an
+    Outcome of the new Transaction and the Receipt status.
+    """
+    asset_tag = str(asset_tag or "").strip()
+    issue = (issue or "").strip()
+    if not (str(employee_id or "").strip() and asset_tag and issue):
+        raise ValueError("Employee ID, Asset Tag, and Issue Details are required.")
+    employee_id = _employee_id(employee_id)
+    with _one_commit() as conn:
+        if conn is None:
+            row = get_storage().record_check_in(employee_id, asset_tag, issue, name, email)
+        else:
+            row = database.record_check_in(employee_id, asset_tag, issue, name, email, conn=conn)
+        transaction = Transaction._make(row)
+        if signature:
+            save_signature(transaction.transaction_id, "Check-In", signature, conn)
+        receipt = queue_receipt(transaction, "Check-In", conn)
+    return Outcome(transaction, receipt)
+
+@traced("service.check_out")
+def check_out(transaction_id, signature=None):
+    """Close a checked-in transaction, store its signature and queue the receipt."""
+    transaction_id = int(transaction_id)
+    with _one_commit() as conn:
+        rows = (get_storage().check_out_many([transaction_id]) if conn is None
+                else database.check_out_many([transaction_id], conn=conn))
+        if not rows:
+            if get_storage().get_transaction_details(transaction_id) is None:
+                raise LookupError(f"Transaction {transaction_id} not found")
+            raise AlreadyCheckedOut(f"Transaction {transaction_id} is already checked out")
+        transaction = Transaction._make(rows[0])
+        if signature:
+            save_signature(transaction_id, "Check-Out", signature, conn)
+        receipt = queue_receipt(transaction, "Check-Out", conn)
+    return Outcome(transaction, receipt)
+
+@traced("service.check_out_many")
+def check_out_many(transaction_ids, signature=None):
+    """Close several checked-in transactions under one signature.
+
+    They are closed in one statement, the signature is stored once, and
+    each employee gets one receipt covering all of their devices.  Returns
+    a BatchOutcome; ids that were missing or already checked out are listed
+    in `skipped`.  If none could be closed this raises like check_out().
+    """
+    ids = sorted({int(i) for i in transaction_ids})
+    if not ids:
+        raise ValueError("Select at least one device to check out.")
+    with _one_commit() as conn:
+        rows = get_storage().check_out_many(ids) if conn is None else database.check_out_many(ids, conn=conn)
+        transactions = [Transaction._make(row) for row in rows]
+        if not transactions:
+            listed = ", ".join(map(str, ids))
+            if all(get_storage().get_transaction_details(i) is None for i in ids):
+                raise LookupError(f"Transaction(s) {listed} not found")
+            raise AlreadyCheckedOut(f"Transaction(s) {listed} already checked out")
+        closed = [t.transaction_id for t in transactions]
+        if signature:
+            save_signature(closed, "Check-Out", signature, conn)
+        by_employee = {}
+        for transaction in transactions:
+            by_employee.setdefault(transaction.employee_id, []).append(transaction)
+        receipts = [queue_receipt(group, "Check-Out", conn) for group in by_employee.values()]
+    skipped = sorted(set(ids) - set(closed))
+    return BatchOutcome(transactions, receipts, skipped)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Signature capture storage.
+
+A signature is kept as the pen strokes from st_canvas json_data (zigzag
+varint deltas, zlib-compressed), or as a 1-bit PNG of the canvas when there
+are no strokes.  Blobs are stored once per content hash in SignatureBlobs
+and linked to a transaction per kind (Check-In / Check-Out).  Nothing is
+rasterised at check-in; render_signature() draws the image only when a
+receipt asks for it.  numpy and PIL are only imported for bitmaps and
+rendering, so drawn signatures are stored without loading either.
+"""
+import hashlib
+import io
+import zlib
+
+from database import database_connection
+
+STROKES = "strokes-z"       # zlib'd stroke deltas
+BITMAP = "png-1bit"         # 1-bit palette PNG of the canvas
+CANVAS_SIZE = (400, 150)
+STROKE_WIDTH = 2
+
+# ---------------- Encoding ----------------
+def canvas_strokes(json_data):
+    """Point lists from fabric.js freedraw paths (M/Q/L commands)."""
+    strokes = []
+    for obj in (json_data or {}).get("objects", []):
+        points = []
+        for command in obj.get("path") or []:
+            coords = command[1:]
+            points.extend(zip(coords[0::2], coords[1::2]))
+        if points:
+            strokes.append([(int(round(x)), int(round(y))) for x, y in points])
+    return strokes
+
+def _varint(out, n):
+    n = (n << 1) ^ (n >> 63)            # zigzag: small negatives stay small
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _varints(data):
+    n = shift = 0
+    for byte in data:
+        n |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            yield (n >> 1) ^ -(n & 1)
+            n = shift = 0
+
+def encode_strokes(strokes, stroke_width=STROKE_WIDTH):
+    out = bytearray()
+    _varint(out, stroke_width)
+    _varint(out, len(strokes))
+    for stroke in strokes:
+        _varint(out, len(stroke))
+        px = py = 0
+        for x, y in stroke:
+            _varint(out, x - px)
+            _varint(out, y - py)
+            px, py = x, y
+    return zlib.compress(bytes(out), 9)
+
+def decode_strokes(data):
+    """Inverse of encode_strokes: (stroke_width, [[(x, y), ...], ...])."""
+    values = _varints(zlib.decompress(data))
+    stroke_width = next(values)
+    strokes = []
+    for _ in range(next(values)):
+        stroke, x, y = [], 0, 0
+        for _ in range(next(values)):
+            x += next(values)
+            y += next(values)
+            stroke.append((x, y))
+        strokes.append(stroke)
+    return stroke_width, strokes
+
+def encode_bitmap(image_data):
+    """1-bit PNG of an RGBA/RGB canvas array (ink = anything darker than mid-grey)."""
+    import numpy as np
+    from PIL import Image
+    arr = np.asarray(image_data)
+    if arr.max() <= 1.0:
+        arr = arr * 255.0
+    ink = arr[:, :, :3].astype("uint8").min(axis=2) < 128
+    buf = io.BytesIO()
+    Image.fromarray(~ink).convert("1").save(buf, format="PNG")
+    return buf.getvalue()
+
+def encode_signature(json_data=None, image_data=None):
+    """(format, width, height, data) for a canvas result, or None if it is blank."""
+    strokes = canvas_strokes(json_data)
+    if strokes:
+        return STROKES, CANVAS_SIZE[0], CANVAS_SIZE[1], encode_strokes(strokes)
+    if image_data is not None:
+        import numpy as np
+        arr = np.asarray(image_data)
+        if (arr[:, :, :3] < (128 if arr.max() > 1.0 else 0.5)).any():
+            return BITMAP, arr.shape[1], arr.shape[0], encode_bitmap(arr)
+    return None
+
+def signature_digest(fmt, data):
+    return hashlib.blake2b(fmt.encode() + b"\0" + data, digest_size=16).digest()
+
+# ---------------- Storage ----------------
+def save_signature(transaction_id, kind, signature, conn=None):
+    """Store an encode_signature() result for a transaction; returns its digest.
+
+    `transaction_id` may also be a list of ids that share the signature
+    (batch check-out): the blob is stored once and linked to each.  Pass
+    `conn` to write inside an open unit of work.
+    """
+    fmt, width, height, data = signature
+    digest = signature_digest(fmt, data)
+    if conn is None:
+        with database_connection() as conn:
+            return save_signature(transaction_id, kind, signature, conn)
+    ids = transaction_id if isinstance(transaction_id, (list, tuple)) else [transaction_id]
+    conn.execute(
+        "INSERT OR IGNORE INTO SignatureBlobs (digest, format, width, height, data) VALUES (?, ?, ?, ?, ?)",
+        (digest, fmt, width, height, data)
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO TransactionSignatures (transaction_id, kind, digest) VALUES (?, ?, ?)",
+        [(int(i), kind, digest) for i in ids]
+    )
+    return digest
+
+def load_signature(transaction_id, kind="Check-In"):
+    """(format, width, height, data) stored for a transaction, or None."""
+    with database_connection() as conn:
+        return conn.execute("""
+            SELECT b.format, b.width, b.height, b.data
+            FROM TransactionSignatures s JOIN SignatureBlobs b ON b.digest = s.digest
+            WHERE s.transaction_id = ? AND s.kind = ?
+        """, (int(transaction_id), kind)).fetchone()
+
+# ---------------- Rendering ----------------
+def render_signature(signature, scale=2):
+    """Rasterise a stored signature to a PIL image (black ink on white)."""
+    from PIL import Image, ImageDraw
+    fmt, width, height, data = signature
+    if fmt == BITMAP:
+        return Image.open(io.BytesIO(data)).convert("L")
+    stroke_width, strokes = decode_strokes(data)
+    img = Image.new("L", (width * scale, height * scale), 255)
+    draw = ImageDraw.Draw(img)
+    for stroke in strokes:
+        points = [(x * scale, y * scale) for x, y in stroke]
+        if len(points) == 1:
+            points = points * 2
+        draw.line(points, fill=0, width=stroke_width * scale, joint="curve")
+    return img
+
+def signature_png(transaction_id, kind="Check-In"):
+    """PNG bytes of a transaction's signature for receipts, or None if there is none."""
+    signature = load_signature(transaction_id, kind)
+    if signature is None:
+        return None
+    buf = io.BytesIO()
+    render_signature(signature).save(buf, format="PNG")
+    return buf.getvalue()
@@ -0,0 +1,816 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Storage backends for the transaction tables: SQLite or PostgreSQL.
+
+Both classes offer the same operations with the same results: schema setup,
+employee/laptop upserts, check-in (refused while the asset is still
+checked in), check-out (one or many), replay of kiosk journal batches, the
+active/completed views, history pages, counts, search, single-row lookups
+and per-asset status and history.  get_storage() picks PostgreSQL when
+SLAC_DATABASE_URL is a postgresql:// URL, otherwise the SQLite file from
+database.py.
+
+SQLite allows one writer at a time on one machine.  PostgreSQL takes row
+locks, so several service desks (and several API nodes) can write at once.
+The receipt outbox and signatures stay in each node's local SQLite file;
+they only refer to transaction ids.  Bulk import/export (bulk.py),
+archiving (archive.py) and the change feed (changefeed.py) are SQLite only.
+"""
+import os
+import threading
+
+# pandas is imported where DataFrames are built, as in database.py
+
+import database
+from datacache import bump_data_version
+from tracing import traced
+
+DATABASE_URL = os.environ.get("SLAC_DATABASE_URL", "")
+
+FETCH_ROWS = 2000          # rows per round trip from a server-side cursor
+MIGRATION_LOCK = 0x51AC    # pg_advisory_xact_lock key serialising migrations
+
+ACTIVE_COLUMNS = database.ACTIVE_COLUMNS
+HISTORY_COLUMNS = database.HISTORY_COLUMNS
+DETAIL_COLUMNS = HISTORY_COLUMNS + ("status",)
+
+
+class SQLiteStorage:
+    """The functions in database.py, on the process-wide connection pool."""
+
+    name = "sqlite"
+
+    def __init__(self, path=None):
+        if path:
+            database.configure_pool(path)
+
+    schema_version = staticmethod(database.schema_version)
+    tables = staticmethod(database.tables)
+    ensure_laptop_exists = staticmethod(database.ensure_laptop_exists)
+    ensure_employee_exists = staticmethod(database.ensure_employee_exists)
+    upsert_employee = staticmethod(database.upsert_employee)
+    record_check_in = staticmethod(database.record_check_in)
+    check_out = staticmethod(database.check_out)
+    check_out_many = staticmethod(database.check_out_many)
+    apply_kiosk_ops = staticmethod(database.apply_kiosk_ops)
+    view_active_transactions = staticmethod(database.view_active_transactions)
+    view_completed_transactions = staticmethod(database.view_completed_transactions)
+    get_transaction_details = staticmethod(database.get_transaction_details)
+    get_employee_meta = staticmethod(database.get_employee_meta)
+    asset_status = staticmethod(database.asset_status)
+    asset_history = staticmethod(database.asset_history)
+    page_transactions = staticmethod(database.page_transactions)
+    count_transactions = staticmethod(database.count_transactions)
+    search_transactions = staticmethod(database.search_transactions)
+    checkins_per_hour = staticmethod(database.checkins_per_hour)
+    checkins_per_day = staticmethod(database.checkins_per_day)
+    turnaround_by_issue = staticmethod(database.turnaround_by_issue)
+    repeat_assets = staticmethod(database.repeat_assets)
+
+    def close(self):
+        database.get_pool().close()
+
+
+# ---------------- PostgreSQL ----------------
+# Same tables as the SQLite schema.  Times are whole-second UTC, check-ins
+# and check-outs alike (like CURRENT_TIMESTAMP), read back with ::text, so
+# rows look exactly like SQLite's ('YYYY-MM-DD HH:MM:SS').
+UTC_NOW = "date_trunc('second', now() AT TIME ZONE 'UTC')"
+
+PG_MIGRATIONS = [
+    (1, (
+        """
+        CREATE TABLE IF NOT EXISTS employees (
+            employee_id BIGINT PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS laptops (
+            asset_tag BIGINT PRIMARY KEY,
+            model TEXT NOT NULL,
+            description TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS transactions (
+            transaction_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            employee_id BIGINT NOT NULL REFERENCES employees (employee_id),
+            asset_tag BIGINT NOT NULL REFERENCES laptops (asset_tag),
+            issue TEXT NOT NULL,
+            check_in_time TIMESTAMP NOT NULL DEFAULT date_trunc('second', now() AT TIME ZONE 'UTC'),
+            check_out_time TIMESTAMP,
+            status TEXT NOT NULL DEFAULT 'Checked-In' CHECK (status IN ('Checked-In', 'Checked-Out'))
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_transactions_active
+        ON transactions (check_in_time DESC, transaction_id DESC) INCLUDE (employee_id, asset_tag, issue)
+        WHERE status = 'Checked-In'
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_transactions_completed
+        ON transactions (check_out_time DESC, transaction_id DESC) WHERE status = 'Checked-Out'
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_transactions_asset_tag ON transactions (asset_tag)",
+        "CREATE INDEX IF NOT EXISTS ix_transactions_employee_id ON transactions (employee_id)",
+    )),
+    # Dashboard analytics counters kept by a row trigger, as in SQLite
+    # migration 7.  Buckets have the same bounds as TurnaroundBuckets.
+    (2, (
+        """
+        CREATE TABLE IF NOT EXISTS checkin_hour_counts (
+            hour TEXT PRIMARY KEY,
+            n BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS asset_visit_counts (
+            asset_tag BIGINT PRIMARY KEY,
+            n BIGINT NOT NULL DEFAULT 0,
+            last_check_in TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_asset_visits_n ON asset_visit_counts (n DESC, asset_tag)",
+        """
+        CREATE TABLE IF NOT EXISTS turnaround_stats (
+            issue_type TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            n BIGINT NOT NULL DEFAULT 0,
+            total_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+            PRIMARY KEY (issue_type, bucket)
+        )
+        """,
+        f"""
+        CREATE OR REPLACE FUNCTION slac_turnaround_bucket(seconds DOUBLE PRECISION) RETURNS INTEGER
+        LANGUAGE sql IMMUTABLE AS $$
+            SELECT LEAST(100, GREATEST(0, ceil(ln(GREATEST(seconds, 60) / 60)
+                                             / ln({database.TURNAROUND_BUCKET_GROWTH}))))::integer
+        $$
+        """,
+        """
+        CREATE OR REPLACE FUNCTION slac_issue_type(issue TEXT) RETURNS TEXT
+        LANGUAGE sql IMMUTABLE AS $$
+            SELECT trim(CASE WHEN split_part(issue, ':', 1) = '' THEN 'Issue' ELSE split_part(issue, ':', 1) END)
+        $$
+        """,
+        """
+        CREATE OR REPLACE FUNCTION slac_apply_stats(r transactions, sign INTEGER, visits BOOLEAN) RETURNS void
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            seconds DOUBLE PRECISION;
+        BEGIN
+            IF visits THEN
+                INSERT INTO checkin_hour_counts (hour, n) VALUES (to_char(r.check_in_time, 'YYYY-MM-DD HH24'), sign)
+                ON CONFLICT (hour) DO UPDATE SET n = checkin_hour_counts.n + EXCLUDED.n;
+                INSERT INTO asset_visit_counts (asset_tag, n, last_check_in) VALUES (r.asset_tag, sign, r.check_in_time)
+                ON CONFLICT (asset_tag) DO UPDATE SET n = asset_visit_counts.n + EXCLUDED.n,
+                    last_check_in = CASE WHEN EXCLUDED.n > 0
+                                         THEN GREATEST(asset_visit_counts.last_check_in, EXCLUDED.last_check_in)
+                                         ELSE asset_visit_counts.last_check_in END;
+            END IF;
+            IF r.status = 'Checked-Out' AND r.check_out_time IS NOT NULL THEN
+                seconds := GREATEST(0, extract(epoch FROM r.check_out_time - r.check_in_time));
+                INSERT INTO turnaround_stats (issue_type, bucket, n, total_seconds)
+                VALUES (slac_issue_type(r.issue), slac_turnaround_bucket(seconds), sign, sign * seconds)
+                ON CONFLICT (issue_type, bucket) DO UPDATE
+                SET n = turnaround_stats.n + EXCLUDED.n,
+                    total_seconds = turnaround_stats.total_seconds + EXCLUDED.total_seconds;
+            END IF;
+        END
+        $$
+        """,
+        """
+        CREATE OR REPLACE FUNCTION slac_transaction_stats() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            visits BOOLEAN;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM slac_apply_stats(NEW, 1, true);
+            ELSIF TG_OP = 'DELETE' THEN
+                PERFORM slac_apply_stats(OLD, -1, true);
+            ELSE
+                visits := OLD.check_in_time IS DISTINCT FROM NEW.check_in_time
+                          OR OLD.asset_tag IS DISTINCT FROM NEW.asset_tag;
+                PERFORM slac_apply_stats(OLD, -1, visits);
+                PERFORM slac_apply_stats(NEW, 1, visits);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """,
+        """
+        INSERT INTO checkin_hour_counts (hour, n)
+        SELECT to_char(check_in_time, 'YYYY-MM-DD HH24'), COUNT(*) FROM transactions GROUP BY 1
+        ON CONFLICT (hour) DO UPDATE SET n = EXCLUDED.n
+        """,
+        """
+        INSERT INTO asset_visit_counts (asset_tag, n, last_check_in)
+        SELECT asset_tag, COUNT(*), MAX(check_in_time) FROM transactions GROUP BY asset_tag
+        ON CONFLICT (asset_tag) DO UPDATE SET n = EXCLUDED.n, last_check_in = EXCLUDED.last_check_in
+        """,
+        """
+        INSERT INTO turnaround_stats (issue_type, bucket, n, total_seconds)
+        SELECT slac_issue_type(issue), slac_turnaround_bucket(seconds), COUNT(*), SUM(seconds)
+        FROM (
+            SELECT issue, GREATEST(0, extract(epoch FROM check_out_time - check_in_time)) AS seconds
+            FROM transactions WHERE status = 'Checked-Out' AND check_out_time IS NOT NULL
+        ) completed
+        GROUP BY 1, 2
+        ON CONFLICT (issue_type, bucket) DO UPDATE SET n = EXCLUDED.n, total_seconds = EXCLUDED.total_seconds
+        """,
+        """
+        CREATE OR REPLACE TRIGGER trg_transactions_stats
+        AFTER INSERT OR DELETE OR UPDATE OF status, check_in_time, check_out_time, issue, asset_tag
+        ON transactions FOR EACH ROW EXECUTE FUNCTION slac_transaction_stats()
+        """,
+    )),
+    # Current state per asset, as in SQLite migration 11
+    (3, (
+        """
+        CREATE INDEX IF NOT EXISTS ix_transactions_asset_history
+        ON transactions (asset_tag, check_in_time DESC, transaction_id DESC)
+        """,
+        "DROP INDEX IF EXISTS ix_transactions_asset_tag",
+        """
+        CREATE TABLE IF NOT EXISTS asset_state (
+            asset_tag BIGINT PRIMARY KEY,
+            transaction_id BIGINT NOT NULL,
+            employee_id BIGINT NOT NULL,
+            status TEXT NOT NULL,
+            last_seen TIMESTAMP
+        )
+        """,
+        """
+        CREATE OR REPLACE FUNCTION slac_refresh_asset_state(tag BIGINT) RETURNS void
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO asset_state (asset_tag, transaction_id, employee_id, status, last_seen)
+            SELECT asset_tag, transaction_id, employee_id, status, COALESCE(check_out_time, check_in_time)
+            FROM transactions WHERE asset_tag = tag
+            ORDER BY check_in_time DESC, transaction_id DESC LIMIT 1
+            ON CONFLICT (asset_tag) DO UPDATE
+            SET transaction_id = EXCLUDED.transaction_id, employee_id = EXCLUDED.employee_id,
+                status = EXCLUDED.status, last_seen = EXCLUDED.last_seen;
+            IF NOT FOUND THEN
+                DELETE FROM asset_state WHERE asset_tag = tag;
+            END IF;
+        END
+        $$
+        """,
+        """
+        CREATE OR REPLACE FUNCTION slac_transaction_asset_state() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                PERFORM slac_refresh_asset_state(OLD.asset_tag);
+            END IF;
+            IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.asset_tag IS DISTINCT FROM OLD.asset_tag) THEN
+                PERFORM slac_refresh_asset_state(NEW.asset_tag);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """,
+        """
+        INSERT INTO asset_state (asset_tag, transaction_id, employee_id, status, last_seen)
+        SELECT DISTINCT ON (asset_tag) asset_tag, transaction_id, employee_id, status,
+               COALESCE(check_out_time, check_in_time)
+        FROM transactions ORDER BY asset_tag, check_in_time DESC, transaction_id DESC
+        ON CONFLICT (asset_tag) DO NOTHING
+        """,
+        """
+        CREATE OR REPLACE TRIGGER trg_transactions_asset_state
+        AFTER INSERT OR DELETE OR UPDATE OF asset_tag, employee_id, status, check_in_time, check_out_time
+        ON transactions FOR EACH ROW EXECUTE FUNCTION slac_transaction_asset_state()
+        """,
+    )),
+    # Applied kiosk journal entries by idempotency key, as in SQLite migration 12
+    (4, (
+        """
+        CREATE TABLE IF NOT EXISTS kiosk_ops (
+            op_key TEXT PRIMARY KEY,
+            outcome TEXT NOT NULL CHECK (outcome IN ('applied', 'adopted', 'superseded', 'conflict')),
+            transaction_id BIGINT,
+            message TEXT NOT NULL DEFAULT '',
+            applied_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'UTC')
+        )
+        """,
+    )),
+    # Asset tags are text, as SQLite stores them ('SLAC-00123' as well as
+    # 100123); they were bigint, which refused every tag with a letter in
+    # it.  The two triggers that name the column are dropped around the change.
+    (5, (
+        "DROP TRIGGER IF EXISTS trg_transactions_stats ON transactions",
+        "DROP TRIGGER IF EXISTS trg_transactions_asset_state ON transactions",
+        "ALTER TABLE transactions DROP CONSTRAINT IF EXISTS transactions_asset_tag_fkey",
+        "ALTER TABLE laptops ALTER COLUMN asset_tag TYPE TEXT USING asset_tag::text",
+        "ALTER TABLE transactions ALTER COLUMN asset_tag TYPE TEXT USING asset_tag::text",
+        """
+        ALTER TABLE transactions ADD CONSTRAINT transactions_asset_tag_fkey
+        FOREIGN KEY (asset_tag) REFERENCES laptops (asset_tag)
+        """,
+        "ALTER TABLE asset_visit_counts ALTER COLUMN asset_tag TYPE TEXT USING asset_tag::text",
+        "ALTER TABLE asset_state ALTER COLUMN asset_tag TYPE TEXT USING asset_tag::text",
+        "DROP FUNCTION IF EXISTS slac_refresh_asset_state(BIGINT)",
+        """
+        CREATE OR REPLACE FUNCTION slac_refresh_asset_state(tag TEXT) RETURNS void
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO asset_state (asset_tag, transaction_id, employee_id, status, last_seen)
+            SELECT asset_tag, transaction_id, employee_id, status, COALESCE(check_out_time, check_in_time)
+            FROM transactions WHERE asset_tag = tag
+            ORDER BY check_in_time DESC, transaction_id DESC LIMIT 1
+            ON CONFLICT (asset_tag) DO UPDATE
+            SET transaction_id = EXCLUDED.transaction_id, employee_id = EXCLUDED.employee_id,
+                status = EXCLUDED.status, last_seen = EXCLUDED.last_seen;
+            IF NOT FOUND THEN
+                DELETE FROM asset_state WHERE asset_tag = tag;
+            END IF;
+        END
+        $$
+        """,
+        """
+        CREATE TRIGGER trg_transactions_stats
+        AFTER INSERT OR DELETE OR UPDATE OF status, check_in_time, check_out_time, issue, asset_tag
+        ON transactions FOR EACH ROW EXECUTE FUNCTION slac_transaction_stats()
+        """,
+        """
+        CREATE TRIGGER trg_transactions_asset_state
+        AFTER INSERT OR DELETE OR UPDATE OF asset_tag, employee_id, status, check_in_time, check_out_time
+        ON transactions FOR EACH ROW EXECUTE FUNCTION slac_transaction_asset_state()
+        """,
+    )),
+    # Rows per status and day, as in SQLite migration 3, so the history
+    # pager's total never runs COUNT(*) over transactions.  A row is counted
+    # on the day of its check-out if completed, else on the day of its check-in.
+    (6, (
+        """
+        CREATE TABLE IF NOT EXISTS transaction_day_counts (
+            status TEXT NOT NULL,
+            day DATE NOT NULL,
+            n BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (status, day)
+        )
+        """,
+        """
+        CREATE OR REPLACE FUNCTION slac_transaction_day_counts() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                UPDATE transaction_day_counts SET n = n - 1
+                WHERE status = OLD.status
+                  AND day = (CASE OLD.status WHEN 'Checked-Out' THEN OLD.check_out_time
+                                             ELSE OLD.check_in_time END)::date;
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                INSERT INTO transaction_day_counts (status, day, n)
+                VALUES (NEW.status, (CASE NEW.status WHEN 'Checked-Out' THEN NEW.check_out_time
+                                                     ELSE NEW.check_in_time END)::date, 1)
+                ON CONFLICT (status, day) DO UPDATE SET n = transaction_day_counts.n + 1;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """,
+        # Taking the trigger's lock first keeps writers out until the backfill commits
+        """
+        CREATE OR REPLACE TRIGGER trg_transactions_day_counts
+        AFTER INSERT OR DELETE OR UPDATE OF status, check_in_time, check_out_time
+        ON transactions FOR EACH ROW EXECUTE FUNCTION slac_transaction_day_counts()
+        """,
+        """
+        INSERT INTO transaction_day_counts (status, day, n)
+        SELECT status, (CASE status WHEN 'Checked-Out' THEN check_out_time ELSE check_in_time END)::date, COUNT(*)
+        FROM transactions GROUP BY 1, 2
+        ON CONFLICT (status, day) DO UPDATE SET n = EXCLUDED.n
+        """,
+    )),
+]
+
+PG_SCHEMA_VERSION = PG_MIGRATIONS[-1][0]
+
+_SELECT_COLUMNS = {
+    "transaction_id": "t.transaction_id", "employee_id": "t.employee_id", "asset_tag": "t.asset_tag",
+    "issue": "t.issue", "check_in_time": "t.check_in_time::text AS check_in_time",
+    "check_out_time": "t.check_out_time::text AS check_out_time", "status": "t.status",
+}
+
+def _select(columns):
+    return ", ".join(_SELECT_COLUMNS[c] for c in columns)
+
+def _psycopg_pool():
+    try:
+        import psycopg_pool
+    except ImportError:
+        raise RuntimeError("PostgreSQL storage needs psycopg: pip install 'psycopg[binary,pool]'") from None
+    return psycopg_pool
+
+
+class PostgresStorage:
+    """Transaction tables in PostgreSQL, on a psycopg connection pool.
+
+    Each pooled connection runs one transaction per `with pool.connection()`
+    block.  Check-in sends its three statements as one pipeline, and the
+    full views stream through a server-side cursor.
+    """
+
+    name = "postgresql"
+
+    def __init__(self, url, size=database.POOL_SIZE):
+        self.url = url
+        self.pool = _psycopg_pool().ConnectionPool(url, min_size=1, max_size=size, open=True,
+                                                   name="slac-storage")
+
+    def close(self):
+        self.pool.close()
+
+    def _frame(self, sql, params, columns):
+        """Run a read on a server-side cursor and collect it FETCH_ROWS at a time."""
+        import pandas as pd
+        with self.pool.connection() as conn:
+            with conn.cursor(name="slac_view") as cur:
+                cur.execute(sql, params)
+                frames = []
+                while rows := cur.fetchmany(FETCH_ROWS):
+                    frames.append(pd.DataFrame(rows, columns=list(columns)))
+        if not frames:
+            return pd.DataFrame(columns=list(columns))
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    # ---------------- Schema ----------------
+    def schema_version(self):
+        with self.pool.connection() as conn:
+            if conn.execute("SELECT to_regclass('schema_version')").fetchone()[0] is None:
+                return 0
+            return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+    def migrate(self, target=None):
+        """Apply pending PG_MIGRATIONS in one transaction; concurrent callers wait on a lock."""
+        target = PG_SCHEMA_VERSION if target is None else target
+        if self.schema_version() >= target:
+            return target
+        with self.pool.connection() as conn:
+            conn.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK,))
+            conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+            version = conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+            for number, statements in PG_MIGRATIONS:
+                if version < number <= target:
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute("INSERT INTO schema_version (version) VALUES (%s)", (number,))
+                    version = number
+        return version
+
+    def tables(self):
+        self.migrate()
+
+    # ---------------- Writes ----------------
+    @traced("db.ensure_laptop_exists")
+    def ensure_laptop_exists(self, asset_tag):
+        with self.pool.connection() as conn:
+            conn.execute("INSERT INTO laptops (asset_tag, model, description) VALUES (%s, '', '') "
+                         "ON CONFLICT DO NOTHING", (str(asset_tag).strip(),))
+        bump_data_version()
+
+    @traced("db.ensure_employee_exists")
+    def ensure_employee_exists(self, employee_id, name="", email=""):
+        with self.pool.connection() as conn:
+            conn.execute("INSERT INTO employees (employee_id, name, email) VALUES (%s, %s, %s) "
+                         "ON CONFLICT DO NOTHING", (int(employee_id), name or "", email or ""))
+        bump_data_version()
+
+    @traced("db.upsert_employee")
+    def upsert_employee(self, employee_id, name, email):
+        name = (name or "").strip()
+        email = (email or "").strip()
+        if not email:
+            return
+        with self.pool.connection() as conn:
+            conn.execute("""
+                INSERT INTO employees (employee_id, name, email) VALUES (%s, %s, %s)
+                ON CONFLICT (employee_id) DO UPDATE SET name = EXCLUDED.name, email = EXCLUDED.email
+            """, (int(employee_id), name, email))
+        bump_data_version()
+
+    @traced("db.record_check_in")
+    def record_check_in(self, employee_id, asset_tag, issue, name="", email=""):
+        with self.pool.connection() as conn:
+            row = self._insert_check_in(conn, employee_id, asset_tag, issue, name, email)
+        bump_data_version()
+        return row
+
+    def _insert_check_in(self, conn, employee_id, asset_tag, issue, name="", email="", check_in_time=None):
+        name = (name or "").strip()
+        email = (email or "").strip()
+        employee_id, asset_tag = int(employee_id), str(asset_tag).strip()
+        with conn.pipeline():
+            conn.execute("""
+                INSERT INTO employees (employee_id, name, email) VALUES (%s, %s, %s)
+                ON CONFLICT (employee_id) DO UPDATE SET name = EXCLUDED.name, email = EXCLUDED.email
+                WHERE EXCLUDED.email <> ''
+            """, (employee_id, name, email))
+            conn.execute("INSERT INTO laptops (asset_tag, model, description) VALUES (%s, '', '') "
+                         "ON CONFLICT DO NOTHING", (asset_tag,))
+            # The laptop row lock serialises check-ins of one asset; the
+            # next statement then reads asset_state as of after the wait
+            conn.execute("SELECT 1 FROM laptops WHERE asset_tag = %s FOR UPDATE", (asset_tag,))
+            held = conn.execute("SELECT transaction_id, employee_id FROM asset_state "
+                                "WHERE asset_tag = %s AND status = 'Checked-In'", (asset_tag,))
+        held = held.fetchone()
+        if held:
+            raise database.AlreadyCheckedIn(asset_tag, *held)
+        return conn.execute(f"""
+            INSERT INTO transactions AS t (employee_id, asset_tag, issue, check_in_time)
+            VALUES (%s, %s, %s, COALESCE(%s::timestamp, {UTC_NOW}))
+            RETURNING {_select(DETAIL_COLUMNS)}
+        """, (employee_id, asset_tag, issue, check_in_time)).fetchone()
+
+    @traced("db.check_out")
+    def check_out(self, transaction_id):
+        with self.pool.connection() as conn:
+            closed = conn.execute(f"""
+                UPDATE transactions SET check_out_time = {UTC_NOW}, status = 'Checked-Out'
+                WHERE transaction_id = %s AND status = 'Checked-In'
+            """, (int(transaction_id),)).rowcount == 1
+        bump_data_version()
+        return closed
+
+    @traced("db.check_out_many")
+    def check_out_many(self, transaction_ids):
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"""
+                UPDATE transactions AS t SET check_out_time = {UTC_NOW}, status = 'Checked-Out'
+                WHERE transaction_id = ANY(%s) AND status = 'Checked-In'
+                RETURNING {_select(DETAIL_COLUMNS)}
+            """, (sorted({int(i) for i in transaction_ids}),)).fetchall()
+        bump_data_version()
+        return sorted(rows)
+
+    @traced("db.apply_kiosk_ops")
+    def apply_kiosk_ops(self, ops):
+        """Apply kiosk journal entries in one transaction, like database.apply_kiosk_ops()."""
+        with self.pool.connection() as conn:
+            results = [self._apply_kiosk_op(conn, op) for op in ops]
+        bump_data_version()
+        return results
+
+    def _detail(self, conn, transaction_id):
+        return conn.execute(f"SELECT {_select(DETAIL_COLUMNS)} FROM transactions t WHERE transaction_id = %s",
+                            (int(transaction_id),)).fetchone()
+
+    def _apply_kiosk_op(self, conn, op):
+        done = conn.execute("SELECT outcome, transaction_id, message FROM kiosk_ops WHERE op_key = %s",
+                            (op.key,)).fetchone()
+        if done:
+            outcome, transaction_id, message = done
+            row = self._detail(conn, transaction_id) if transaction_id else None
+            return database.KioskResult(op.key, outcome, row, message, True)
+        if op.kind == "check_in":
+            at = conn.execute("SELECT GREATEST(%s::timestamp, MAX(check_in_time)) FROM transactions "
+                              "WHERE asset_tag = %s", (op.at, str(op.asset_tag).strip())).fetchone()[0]
+            try:
+                outcome, row, message = "applied", self._insert_check_in(
+                    conn, op.employee_id, op.asset_tag, op.issue, op.name, op.email, at), ""
+            except database.AlreadyCheckedIn as e:
+                row = self._detail(conn, e.transaction_id)
+                if e.employee_id == int(op.employee_id):
+                    outcome, message = "adopted", f"Already checked in as Tx#{e.transaction_id}; kept that transaction."
+                else:
+                    outcome, row, message = "conflict", None, str(e)
+        else:
+            outcome, row, message = self._kiosk_check_out(conn, op)
+        conn.execute("INSERT INTO kiosk_ops (op_key, outcome, transaction_id, message) VALUES (%s, %s, %s, %s)",
+                     (op.key, outcome, row[0] if row else None, message))
+        return database.KioskResult(op.key, outcome, row, message, False)
+
+    def _kiosk_check_out(self, conn, op):
+        transaction_id = op.transaction_id
+        if transaction_id is None:
+            ref = conn.execute("SELECT transaction_id FROM kiosk_ops WHERE op_key = %s", (op.ref,)).fetchone()
+            if not (ref and ref[0]):
+                return "conflict", None, "Its check-in was not recorded by the service desk."
+            transaction_id = ref[0]
+        row = conn.execute(f"""
+            UPDATE transactions AS t SET check_out_time = GREATEST(%s::timestamp, check_in_time),
+                                         status = 'Checked-Out'
+            WHERE transaction_id = %s AND status = 'Checked-In'
+            RETURNING {_select(DETAIL_COLUMNS)}
+        """, (op.at, int(transaction_id))).fetchone()
+        if row:
+            return "applied", row, ""
+        row = self._detail(conn, transaction_id)
+        if row is None:
+            return "conflict", None, f"Transaction {transaction_id} not found."
+        return "superseded", row, f"Already checked out elsewhere at {row[5]}."
+
+    # ---------------- Reads ----------------
+    @traced("db.view_active_transactions")
+    def view_active_transactions(self):
+        return self._frame(f"""
+            SELECT {_select(ACTIVE_COLUMNS)} FROM transactions t
+            WHERE status = 'Checked-In' ORDER BY t.check_in_time DESC
+        """, (), ACTIVE_COLUMNS)
+
+    @traced("db.view_completed_transactions")
+    def view_completed_transactions(self):
+        return self._frame(f"""
+            SELECT {_select(HISTORY_COLUMNS)} FROM transactions t
+            WHERE status = 'Checked-Out' ORDER BY t.check_out_time DESC
+        """, (), HISTORY_COLUMNS)
+
+    @traced("db.get_transaction_details")
+    def get_transaction_details(self, transaction_id):
+        with self.pool.connection() as conn:
+            return conn.execute(f"SELECT {_select(DETAIL_COLUMNS)} FROM transactions t WHERE transaction_id = %s",
+                                (int(transaction_id),)).fetchone()
+
+    @traced("db.get_employee_meta")
+    def get_employee_meta(self, employee_id):
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT name, email FROM employees WHERE employee_id = %s",
+                               (int(employee_id),)).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    @traced("db.asset_status")
+    def asset_status(self, asset_tag):
+        with self.pool.connection() as conn:
+            row = conn.execute("""
+                SELECT s.asset_tag, s.transaction_id, s.employee_id, COALESCE(e.name, ''), s.status, s.last_seen::text
+                FROM asset_state s LEFT JOIN employees e ON e.employee_id = s.employee_id
+                WHERE s.asset_tag = %s
+            """, (str(asset_tag).strip(),)).fetchone()
+        return database.AssetStatus._make(row) if row else None
+
+    @traced("db.asset_history")
+    def asset_history(self, asset_tag, after=None, page_size=50):
+        """Keyset page of one asset's transactions, like database.asset_history()."""
+        import pandas as pd
+        clauses, params = ["asset_tag = %s"], [str(asset_tag).strip()]
+        if after:
+            clauses.append("(check_in_time, transaction_id) < (%s::timestamp, %s)")
+            params.extend(after)
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT {_select(DETAIL_COLUMNS)} FROM transactions t
+                WHERE {" AND ".join(clauses)}
+                ORDER BY t.check_in_time DESC, t.transaction_id DESC
+                LIMIT %s
+            """, params + [int(page_size)]).fetchall()
+        return pd.DataFrame(rows, columns=list(DETAIL_COLUMNS))
+
+    def _history_clauses(self, status, start, end):
+        column = database.HISTORY_TIME_COLUMN.get(status, "check_in_time")
+        low, high = database.history_range(start, end)
+        clauses, params = [], []
+        if status:
+            clauses.append("status = %s")
+            params.append(status)
+        if low:
+            clauses.append(f"{column} >= %s::timestamp")
+            params.append(low)
+        if high:
+            clauses.append(f"{column} <= %s::timestamp")
+            params.append(high)
+        return clauses, params
+
+    @traced("db.page_transactions")
+    def page_transactions(self, status="Checked-Out", start=None, end=None, after=None, page_size=50):
+        """Keyset page of history, like database.page_transactions()."""
+        import pandas as pd
+        column = database.HISTORY_TIME_COLUMN[status]
+        clauses, params = self._history_clauses(status, start, end)
+        if after:
+            clauses.append(f"({column}, transaction_id) < (%s::timestamp, %s)")
+            params.extend(after)
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT {_select(HISTORY_COLUMNS)} FROM transactions t
+                WHERE {" AND ".join(clauses)}
+                ORDER BY t.{column} DESC, t.transaction_id DESC
+                LIMIT %s
+            """, params + [int(page_size)]).fetchall()
+        return pd.DataFrame(rows, columns=list(HISTORY_COLUMNS))
+
+    @traced("db.count_transactions")
+    def count_transactions(self, status="Checked-Out", start=None, end=None):
+        """Row count from the trigger-maintained day counters, like database.count_transactions()."""
+        clauses, params = ["status = %s"], [status]
+        if start:
+            clauses.append("day >= %s::date")
+            params.append(str(start))
+        if end:
+            clauses.append("day <= %s::date")
+            params.append(str(end))
+        with self.pool.connection() as conn:
+            return conn.execute(
+                f"SELECT COALESCE(SUM(n), 0)::bigint FROM transaction_day_counts WHERE {' AND '.join(clauses)}",
+                params
+            ).fetchone()[0]
+
+    @traced("db.search_transactions")
+    def search_transactions(self, query, status=None, columns=database.SEARCH_COLUMNS, limit=200):
+        """Substring search; id/tag prefix hits first, then newest check-in first."""
+        import pandas as pd
+        columns_out = database.result_columns(status)
+        terms = query.split()
+        if not terms:
+            return pd.DataFrame(columns=list(columns_out))
+        fields = {
+            "transaction_id": "t.transaction_id::text", "asset_tag": "t.asset_tag::text",
+            "employee_id": "t.employee_id::text", "issue": "t.issue", "name": "COALESCE(e.name, '')",
+        }
+        clauses, params = [], []
+        for term in terms:
+            clauses.append("(" + " OR ".join(f"{fields[c]} ILIKE %s ESCAPE '\\'" for c in columns) + ")")
+            params.extend([f"%{database.like_escape(term)}%"] * len(columns))
+        if status:
+            clauses.append("t.status = %s")
+            params.append(status)
+        prefix = database.like_escape(terms[0]) + "%"
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT {_select(columns_out)}
+                FROM transactions t LEFT JOIN employees e ON e.employee_id = t.employee_id
+                WHERE {" AND ".join(clauses)}
+                ORDER BY (t.transaction_id::text LIKE %s ESCAPE '\\' OR t.asset_tag::text LIKE %s ESCAPE '\\'
+                          OR t.employee_id::text LIKE %s ESCAPE '\\') DESC, t.check_in_time DESC
+                LIMIT %s
+            """, params + [prefix, prefix, prefix, int(limit) if limit else None]).fetchall()
+        return pd.DataFrame(rows, columns=list(columns_out))
+
+    # ---------------- Analytics ----------------
+    @traced("db.checkins_per_hour")
+    def checkins_per_hour(self, hours=24):
+        import pandas as pd
+        index = database.recent_hours(hours)
+        with self.pool.connection() as conn:
+            counts = dict(conn.execute("SELECT hour, n FROM checkin_hour_counts WHERE hour >= %s",
+                                       (index[0],)).fetchall())
+        return pd.DataFrame({"hour": index, "checkins": [counts.get(h, 0) for h in index]})
+
+    @traced("db.checkins_per_day")
+    def checkins_per_day(self, days=30):
+        import pandas as pd
+        index = database.recent_days(days)
+        with self.pool.connection() as conn:
+            counts = dict(conn.execute("""
+                SELECT substr(hour, 1, 10), SUM(n)::bigint FROM checkin_hour_counts
+                WHERE hour >= %s GROUP BY 1
+            """, (index[0],)).fetchall())
+        return pd.DataFrame({"day": index, "checkins": [counts.get(d, 0) for d in index]})
+
+    @traced("db.turnaround_by_issue")
+    def turnaround_by_issue(self):
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT issue_type,
+                       CASE WHEN bucket = 100 THEN 1e18
+                            ELSE 60 * power({database.TURNAROUND_BUCKET_GROWTH}::float8, bucket) END,
+                       n, total_seconds
+                FROM turnaround_stats WHERE n > 0 ORDER BY issue_type, bucket
+            """).fetchall()
+        return database.turnaround_frame(rows)
+
+    @traced("db.repeat_assets")
+    def repeat_assets(self, limit=10, min_visits=2):
+        import pandas as pd
+        with self.pool.connection() as conn:
+            rows = conn.execute("""
+                SELECT asset_tag, n, last_check_in::text FROM asset_visit_counts
+                WHERE n >= %s ORDER BY n DESC, asset_tag LIMIT %s
+            """, (int(min_visits), int(limit))).fetchall()
+        return pd.DataFrame(rows, columns=["asset_tag", "visits", "last_check_in"])
+
+
+# ---------------- Selection ----------------
+_storage = None
+_storage_lock = threading.Lock()
+
+def open_storage(url=None):
+    """A backend for a postgresql:// URL, or SQLite for a file path / empty URL."""
+    url = DATABASE_URL if url is None else url
+    if url.startswith(("postgresql://", "postgres://")):
+        return PostgresStorage(url)
+    return SQLiteStorage(url or None)
+
+def get_storage():
+    """Process-wide backend, chosen from SLAC_DATABASE_URL on first use."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = open_storage()
+    return _storage
+
+def configure_storage(url=None):
+    """Switch the process-wide backend (scripts, benchmarks)."""
+    global _storage
+    with _storage_lock:
+        if _storage is not None and _storage.name != "sqlite":
+            _storage.close()
+        _storage = open_storage(url)
+    return _storage
@@ -0,0 +1,64 @@
+"""
+History imports (bulk.py), which run on the SQLite database only.
+"""
+import io
+
+import pytest
+
+import bulk
+import database
+import service
+
+HEADER = "transaction_id,employee_id,asset_tag,issue,check_in_time,check_out_time,status\n"
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+    path = str(tmp_path / "checkin_system.db")
+    database.configure_pool(path)
+    database.tables()
+    return path
+
+
+def import_history(*lines):
+    return bulk.import_file("transactions", io.StringIO(HEADER + "".join(line + "\n" for line in lines)), "csv")
+
+
+def open_transactions(asset_tag):
+    with database.database_connection() as conn:
+        return [i for (i,) in conn.execute("""
+            SELECT transaction_id FROM Transactions WHERE asset_tag = ? AND status = 'Checked-In'
+            ORDER BY transaction_id
+        """, (str(asset_tag),))]
+
+
+def test_check_in_of_a_checked_in_asset_is_skipped(db):
+    held = service.check_in(1001, 100123, "Hardware Failure: screen").transaction.transaction_id
+    result = import_history(
+        ",1002,100123,Other: imported,2025-01-02 09:00:00,,Checked-In",
+        ",1002,SLAC-7,Other: imported,2025-01-02 09:00:00,,",
+        ",1003,SLAC-7,Other: imported,2025-01-03 09:00:00,,Checked-In",
+        ",1003,100123,Other: earlier visit,2025-01-01 09:00:00,2025-01-01 17:00:00,Checked-Out",
+    )
+    assert (result.rows, result.skipped) == (2, 2)
+    assert open_transactions(100123) == [held]
+    assert len(open_transactions("SLAC-7")) == 1
+    assert service.asset_status(100123).transaction_id == held
+
+
+def test_checked_out_row_without_check_out_time_is_skipped(db):
+    result = import_history(
+        "500,1001,100123,Other: imported,2025-01-01 09:00:00,,Checked-Out",
+        "501,1001,100124,Other: imported,2025-01-01 09:00:00,2025-01-01 17:00:00,Checked-Out",
+    )
+    assert (result.rows, result.skipped) == (1, 1)
+    with database.database_connection() as conn:
+        assert conn.execute("SELECT transaction_id FROM Transactions").fetchall() == [(501,)]
+
+
+def test_reimporting_an_open_check_in_is_harmless(db):
+    line = "600,1001,100123,Other: imported,2025-01-01 09:00:00,,Checked-In"
+    assert import_history(line).skipped == 0
+    assert import_history(line).skipped == 0
+    assert open_transactions(100123) == [600]
@@ -0,0 +1,188 @@
+"""
+The storage interface and the service rules on it, once per backend (see conftest.py).
+"""
+import time
+
+import pytest
+
+import database
+import outbox
+import service
+from database import KioskOp
+from signatures import encode_signature, load_signature
+
+SIGNATURE = encode_signature({"objects": [{"path": [["M", 20, 30], ["Q", 60, 90, 120, 40], ["L", 300, 110]]}]})
+
+
+def check_in(employee_id, asset_tag, issue="Hardware Failure: screen", **kwargs):
+    return service.check_in(employee_id, asset_tag, issue, **kwargs).transaction
+
+
+def test_check_in_returns_the_stored_row(store):
+    transaction = check_in(1001, 100123, name="Ada", email="ada@example.com")
+    assert transaction == service.get_transaction_details(transaction.transaction_id)
+    assert (transaction.employee_id, str(transaction.asset_tag), transaction.status) == (1001, "100123", "Checked-In")
+    assert store.get_employee_meta(1001) == ("Ada", "ada@example.com")
+
+
+def test_blank_email_keeps_the_stored_employee(store):
+    check_in(1001, 100123, name="Ada", email="ada@example.com")
+    check_in(1001, 100124, name="", email="")
+    assert store.get_employee_meta(1001) == ("Ada", "ada@example.com")
+
+
+def test_text_asset_tags_round_trip(store):
+    transaction = check_in(1001, "SLAC-00123")
+    assert transaction.asset_tag == "SLAC-00123"
+    status = service.asset_status("SLAC-00123")
+    assert (status.asset_tag, status.transaction_id) == ("SLAC-00123", transaction.transaction_id)
+    assert list(service.asset_history("SLAC-00123")["asset_tag"]) == ["SLAC-00123"]
+    assert list(store.search_transactions("SLAC-00123")["asset_tag"]) == ["SLAC-00123"]
+    with pytest.raises(database.AlreadyCheckedIn):
+        check_in(1002, "SLAC-00123")
+    service.check_out(transaction.transaction_id)
+    assert service.asset_status("SLAC-00123").status == "Checked-Out"
+
+
+def test_blank_asset_tag_is_refused(store):
+    with pytest.raises(ValueError):
+        check_in(1001, "  ")
+    assert store.count_transactions("Checked-In") == 0
+
+
+def test_asset_tag_text_is_normalised(store):
+    transaction = check_in(" 1001 ", " 100123 ")
+    assert (transaction.employee_id, str(transaction.asset_tag)) == (1001, "100123")
+    assert service.asset_status("100123").transaction_id == transaction.transaction_id
+
+
+def test_second_check_in_of_an_asset_is_refused(store):
+    first = check_in(1001, 100123)
+    with pytest.raises(database.AlreadyCheckedIn) as refused:
+        check_in(1002, 100123)
+    assert refused.value.transaction_id == first.transaction_id
+    service.check_out(first.transaction_id)
+    assert check_in(1002, 100123).employee_id == 1002
+
+
+def test_check_out(store):
+    transaction = check_in(1001, 100123)
+    outcome = service.check_out(transaction.transaction_id, SIGNATURE)
+    assert outcome.transaction.status == "Checked-Out"
+    assert outcome.transaction.check_out_time is not None
+    assert load_signature(transaction.transaction_id, "Check-Out") is not None
+    with pytest.raises(service.AlreadyCheckedOut):
+        service.check_out(transaction.transaction_id)
+    with pytest.raises(LookupError):
+        service.check_out(999999)
+
+
+def test_check_out_many_skips_closed_and_missing(store):
+    a, b, c = (check_in(1001, 100120 + i, email="ada@example.com") for i in range(3))
+    service.check_out(c.transaction_id)
+    outcome = service.check_out_many([a.transaction_id, b.transaction_id, c.transaction_id, 999999], SIGNATURE)
+    assert [t.transaction_id for t in outcome.transactions] == [a.transaction_id, b.transaction_id]
+    assert outcome.skipped == [c.transaction_id, 999999]
+    assert len(outcome.receipts) == 1 and outcome.receipts[0].queued
+
+
+def test_signature_and_receipt_commit_with_the_check_in(store, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("outbox unavailable")
+    monkeypatch.setattr(outbox, "enqueue", fail)
+    with pytest.raises(RuntimeError):
+        check_in(1001, 100123, email="ada@example.com", signature=SIGNATURE)
+    if store.name == "sqlite":         # one unit of work; PostgreSQL commits the row on its own
+        assert store.count_transactions("Checked-In") == 0
+        assert service.asset_status(100123) is None
+
+
+def test_views_and_history_pages(store):
+    ids = [check_in(1000 + i, 100100 + i).transaction_id for i in range(5)]
+    service.check_out_many(ids[:3])
+    assert sorted(store.view_active_transactions()["transaction_id"]) == ids[3:]
+    assert sorted(store.view_completed_transactions()["transaction_id"]) == ids[:3]
+    assert store.count_transactions("Checked-Out") == 3
+    first = store.page_transactions("Checked-Out", page_size=2)
+    rest = store.page_transactions("Checked-Out", after=database.page_cursor(first, "Checked-Out"), page_size=2)
+    assert sorted(list(first["transaction_id"]) + list(rest["transaction_id"])) == ids[:3]
+
+
+def test_counts_by_status_and_day(store):
+    ids = [check_in(1000 + i, 100100 + i).transaction_id for i in range(3)]
+    closed = service.check_out(ids[0]).transaction
+    day = str(closed.check_out_time)[:10]
+    assert store.count_transactions("Checked-In") == 2
+    assert store.count_transactions("Checked-Out", day, day) == 1
+    assert store.count_transactions("Checked-Out", "2000-01-01", "2000-01-31") == 0
+
+
+def test_search(store):
+    check_in(1001, 100123, "Software Request: VPN", name="Grace Hopper")
+    check_in(1002, 200456, "Hardware Failure: keyboard")
+    assert list(store.search_transactions("100123")["asset_tag"].astype(str)) == ["100123"]
+    assert list(store.search_transactions("hopper")["employee_id"]) == [1001]
+    assert store.search_transactions("keyboard", "Checked-Out").empty
+
+
+def test_search_wildcards_are_literal(store):
+    check_in(1001, 100123, "Software Request: vpn_client")
+    check_in(1002, 100124, "Software Request: vpnXclient 100%")
+    assert list(store.search_transactions("_")["employee_id"]) == [1001]
+    assert list(store.search_transactions("n_c")["employee_id"]) == [1001]
+    assert list(store.search_transactions("%")["employee_id"]) == [1002]
+
+
+def test_asset_status_and_history(store):
+    first = check_in(1001, 100123)
+    service.check_out(first.transaction_id)
+    second = check_in(1002, 100123)
+    status = service.asset_status(100123)
+    assert (status.transaction_id, status.employee_id, status.status) == (second.transaction_id, 1002, "Checked-In")
+    history = service.asset_history(100123)
+    assert list(history["transaction_id"]) == [second.transaction_id, first.transaction_id]
+    assert service.asset_status(100999) is None
+
+
+def test_analytics(store):
+    for i in range(3):
+        service.check_out(check_in(1001, 100123, "Hardware Failure: screen").transaction_id)
+    check_in(1002, 100456, "Software Request: VPN")
+    repeats = store.repeat_assets()
+    assert list(zip(repeats["asset_tag"].astype(str), repeats["visits"])) == [("100123", 3)]
+    turnaround = store.turnaround_by_issue()
+    assert list(turnaround["issue_type"]) == ["Hardware Failure"]
+    assert turnaround["completed"][0] == 3 and turnaround["mean_hours"][0] >= 0
+    assert store.checkins_per_day(2)["checkins"].sum() == 4
+
+
+def test_turnaround_is_measured_on_one_clock(store, monkeypatch):
+    monkeypatch.setenv("TZ", "Asia/Tokyo")       # ahead of UTC: a local check-out would add 9 hours
+    time.tzset()
+    try:
+        service.check_out(check_in(1001, 100123).transaction_id)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    assert store.turnaround_by_issue()["mean_hours"][0] < 0.1
+
+
+def test_kiosk_ops_outcomes_and_replay(store):
+    held = check_in(1009, 100500)
+    closed = check_in(1009, 100501)
+    service.check_out(closed.transaction_id)
+    ops = [
+        KioskOp("k1", "check_in", 1001, 100300, "Other: kiosk", "", "", None, None, "2026-01-01 10:00:00"),
+        KioskOp("k2", "check_out", None, None, None, "", "", None, "k1", "2026-01-01 11:00:00"),
+        KioskOp("k3", "check_in", 1009, 100500, "Other: kiosk", "", "", None, None, "2026-01-01 10:00:00"),
+        KioskOp("k4", "check_in", 1002, 100500, "Other: kiosk", "", "", None, None, "2026-01-01 10:00:00"),
+        KioskOp("k5", "check_out", None, None, None, "", "", closed.transaction_id, None, "2026-01-01 12:00:00"),
+        KioskOp("k6", "check_out", None, None, None, "", "", 999999, None, "2026-01-01 12:00:00"),
+    ]
+    results = store.apply_kiosk_ops(ops)
+    assert [r.outcome for r in results] == ["applied", "applied", "adopted", "conflict", "superseded", "conflict"]
+    assert results[2].transaction[0] == held.transaction_id
+    assert not any(r.replayed for r in results)
+    replayed = store.apply_kiosk_ops(ops)
+    assert [r.outcome for r in replayed] == [r.outcome for r in results] and all(r.replayed for r in replayed)
+    assert store.count_transactions("Checked-In") + store.count_transactions("Checked-Out") == 3
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lightweight timing spans for the request paths.
+
+span() and @traced wrap a block or function in a span timed with the
+monotonic perf_counter.  Spans opened inside another span (same thread,
+or an executor call run with contextvars.copy_context()) become its
+children, so one Streamlit rerun or API request yields one tree: the page
+or handler at the root, the database, scanner, PDF and SMTP calls below.
+
+Finished trees go to a ring buffer (recent(), slowest()), are logged as
+one JSON line each on the "slac.trace" logger (SLAC_TRACE_LOG=file writes
+them there), and every span feeds a per-name latency histogram exported
+by prometheus_text(); @traced(root=False) calls outside a tree feed only
+the histogram.  SLAC_TRACING=0 turns it all off; span() then hands
+back a shared no-op and @traced costs one flag check per call.
+"""
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RING_SIZE = 200            # finished root spans kept for the admin view
+MAX_CHILDREN = 500         # per span; a runaway loop should not grow a tree without bound
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+log = logging.getLogger("slac.trace")
+
+_enabled = os.environ.get("SLAC_TRACING", "1").strip().lower() not in ("0", "false", "no", "off")
+_current = contextvars.ContextVar("slac_span", default=None)
+_lock = threading.Lock()
+_ring = deque(maxlen=RING_SIZE)
+_metrics = {}              # span name -> [count, total seconds, errors, per-bucket counts]
+
+def enabled():
+    return _enabled
+
+def enable(on=True):
+    """Turn tracing on or off for this process (spans already open still finish)."""
+    global _enabled
+    _enabled = bool(on)
+
+# ---------------- Spans ----------------
+class Span:
+    __slots__ = ("name", "attrs", "started_at", "start", "seconds", "error",
+                 "children", "dropped", "_token")
+
+    def __init__(self, name, attrs=None):
+        self.name = name
+        self.attrs = attrs
+        self.seconds = None
+        self.error = None
+        self.children = []
+        self.dropped = 0
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        parent = self._token.old_value
+        _current.reset(self._token)
+        # Streamlit's stop/rerun are BaseExceptions used for control flow, not failures.
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.error = exc_type.__name__
+        _finish(self, None if parent is contextvars.Token.MISSING else parent)
+        return False
+
+    def annotate(self, name=None, **attrs):
+        if name:
+            self.name = name
+        if attrs:
+            self.attrs = {**(self.attrs or {}), **attrs}
+
+    def to_dict(self):
+        tree = {"name": self.name, "ms": round(self.seconds * 1000, 3),
+                "started_at": round(self.started_at, 6)}
+        if self.attrs:
+            tree["attrs"] = self.attrs
+        if self.error:
+            tree["error"] = self.error
+        if self.children:
+            tree["children"] = [child.to_dict() for child in self.children]
+        if self.dropped:
+            tree["dropped_children"] = self.dropped
+        return tree
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def annotate(self, name=None, **attrs):
+        pass
+
+_NOOP = _NoopSpan()
+
+def span(name, **attrs):
+    """Context manager timing a block as a span named `name`."""
+    if not _enabled:
+        return _NOOP
+    return Span(name, attrs or None)
+
+def traced(name=None, root=True):
+    """Decorator: time every call of the function as a span (default name: module.qualname).
+
+    root=False is for hot loops that run outside any request, like the
+    scanner's per-frame decode: a call with no span open only feeds the
+    latency histogram, instead of a tree of its own in the ring and the log.
+    """
+    def decorate(fn):
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            if not root and _current.get() is None:
+                start, error = time.perf_counter(), None
+                try:
+                    return fn(*args, **kwargs)
+                except Exception as e:
+                    error = type(e).__name__
+                    raise
+                finally:
+                    with _lock:
+                        _observe(label, time.perf_counter() - start, error)
+            with Span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def annotate(name=None, **attrs):
+    """Rename the innermost open span and/or add attributes to it."""
+    current = _current.get()
+    if current is not None:
+        current.annotate(name, **attrs)
+
+def _observe(name, seconds, error):
+    """Count one call in the name's histogram; the caller holds _lock."""
+    entry = _metrics.get(name)
+    if entry is None:
+        entry = _metrics[name] = [0, 0.0, 0, [0] * (len(BUCKETS) + 1)]
+    entry[0] += 1
+    entry[1] += seconds
+    entry[2] += error is not None
+    entry[3][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+def _finish(finished, parent):
+    with _lock:
+        _observe(finished.name, finished.seconds, finished.error)
+        if parent is not None:
+            if len(parent.children) < MAX_CHILDREN:
+                parent.children.append(finished)
+            else:
+                parent.dropped += 1
+            return
+        _ring.append(finished)
+    if log.isEnabledFor(logging.INFO):
+        log.info(json.dumps(finished.to_dict(), default=str))
+
+# ---------------- Reading ----------------
+def recent(limit=None):
+    """Finished root spans as dicts, newest first."""
+    with _lock:
+        roots = list(_ring)
+    roots.reverse()
+    return [root.to_dict() for root in roots[:limit]]
+
+def _walk(node, root, depth=0):
+    yield node, root, depth
+    for child in node.children:
+        yield from _walk(child, root, depth + 1)
+
+def slowest(limit=20, root=None):
+    """The slowest spans (any depth) among the recent trees, slowest first.
+
+    Returns dicts of name, ms, root (the tree's root span name), depth,
+    started_at, attrs and error.  `root` keeps only trees whose root name
+    starts with it.
+    """
+    with _lock:
+        roots = list(_ring)
+    spans = [
+        (node, top, depth)
+        for top in roots if root is None or top.name.startswith(root)
+        for node, top, depth in _walk(top, top)
+    ]
+    spans.sort(key=lambda item: item[0].seconds, reverse=True)
+    return [
+        {"name": node.name, "ms": round(node.seconds * 1000, 3), "root": top.name, "depth": depth,
+         "started_at": node.started_at, "attrs": node.attrs or {}, "error": node.error}
+        for node, top, depth in spans[:limit]
+    ]
+
+def summary():
+    """Per span name: count, mean_ms, total_ms and errors since start (or reset())."""
+    with _lock:
+        items = [(name, entry[0], entry[1], entry[2]) for name, entry in _metrics.items()]
+    return sorted(
+        ({"name": name, "count": count, "mean_ms": round(total / count * 1000, 3),
+          "total_ms": round(total * 1000, 3), "errors": errors}
+         for name, count, total, errors in items),
+        key=lambda row: row["total_ms"], reverse=True,
+    )
+
+def reset():
+    with _lock:
+        _ring.clear()
+        _metrics.clear()
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def prometheus_text():
+    """Span latencies in the Prometheus text exposition format."""
+    with _lock:
+        items = sorted((name, entry[0], entry[1], entry[2], list(entry[3]))
+                       for name, entry in _metrics.items())
+    lines = ["# HELP slac_span_seconds Time spent in traced operations.",
+             "# TYPE slac_span_seconds histogram"]
+    for name, count, total, _, buckets in items:
+        label = _label(name)
+        running = 0
+        for bound, n in zip(BUCKETS, buckets):
+            running += n
+            lines.append(f'slac_span_seconds_bucket{{name="{label}",le="{bound}"}} {running}')
+        lines.append(f'slac_span_seconds_bucket{{name="{label}",le="+Inf"}} {count}')
+        lines.append(f'slac_span_seconds_sum{{name="{label}"}} {total:.6f}')
+        lines.append(f'slac_span_seconds_count{{name="{label}"}} {count}')
+    lines += ["# HELP slac_span_errors_total Traced operations that raised.",
+              "# TYPE slac_span_errors_total counter"]
+    lines += [f'slac_span_errors_total{{name="{_label(name)}"}} {errors}'
+              for name, _, _, errors, _ in items]
+    return "\n".join(lines) + "\n"
+
+# ---------------- Export ----------------
+_log_handler = None
+
+def log_to_file(path):
+    """Append each finished tree to `path` as one JSON line."""
+    global _log_handler
+    if _log_handler is not None:
+        log.removeHandler(_log_handler)
+        _log_handler.close()
+    _log_handler = logging.FileHandler(path, encoding="utf-8")
+    _log_handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_log_handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+if os.environ.get("SLAC_TRACE_LOG"):
+    log_to_file(os.environ["SLAC_TRACE_LOG"])
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0].rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        data = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+_server = None
+_server_lock = threading.Lock()
+
+def serve_metrics(port, host="127.0.0.1"):
+    """Serve GET /metrics from a daemon thread (for processes without api.py); idempotent."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="slac-metrics", daemon=True).start()
+        return _server